@@ -2,14 +2,16 @@ import eventlet
 eventlet.monkey_patch()
 
 import os
+from datetime import timedelta
 
-from flask import Flask, render_template, request, redirect, url_for, flash, jsonify
+import click
+from flask import Flask, render_template, request, redirect, url_for, flash, jsonify, has_request_context
 from werkzeug.middleware.proxy_fix import ProxyFix
 from flask_migrate import Migrate
 from flask_login import LoginManager, current_user
 from config import Config
-from models import db, User
-from extensions import socketio
+from models import db, User, get_bogota_time
+from extensions import socketio, presence, realtime, signaling, roster
 
 def create_app(config_class=Config):
     # Forzamos a Flask a buscar en la carpeta correcta
@@ -22,7 +24,11 @@ def create_app(config_class=Config):
     migrate = Migrate(app, db)
     login_manager = LoginManager(app)
     login_manager.login_view = 'auth.login'
-    socketio.init_app(app)
+    socketio.init_app(app, message_queue=app.config.get('SOCKETIO_MESSAGE_QUEUE'))
+    presence.init_app(app, socketio)
+    realtime.init_app(app, socketio)
+    signaling.init_app(app, socketio)
+    roster.init_app(app, socketio)
 
     @login_manager.user_loader
     def load_user(user_id):
@@ -44,6 +50,11 @@ def create_app(config_class=Config):
     from routes.training import training_bp
     app.register_blueprint(training_bp, url_prefix='/training')
 
+    from routes.uploads import uploads_bp
+    app.register_blueprint(uploads_bp, url_prefix='/uploads')
+    from routes.jobs import jobs_bp
+    app.register_blueprint(jobs_bp, url_prefix='/jobs')
+
     # Root route redirect
     @app.route('/')
     def index():
@@ -51,13 +62,86 @@ def create_app(config_class=Config):
 
     @app.context_processor
     def inject_unread_count():
-        if current_user.is_authenticated:
-            # Import Message here to avoid circular dependencies if any, though model is safe
-            from models import Message
-            unread_count = Message.query.filter_by(recipient_id=current_user.id, is_read=False).count()
+        # Jobs render templates outside any request (flask run-jobs): no user, no badge
+        if has_request_context() and current_user.is_authenticated:
+            # Import here to avoid circular dependencies
+            from services.unread_counter_service import UnreadCounterService
+            unread_count = UnreadCounterService.get(current_user.id)
             return dict(unread_count=unread_count)
         return dict(unread_count=0)
 
+    @app.cli.command('rebuild-unread-counters')
+    def rebuild_unread_counters():
+        """Recalcula los contadores de no leídos desde las marcas de lectura."""
+        from services.unread_counter_service import UnreadCounterService
+        total = UnreadCounterService.rebuild_all()
+        print(f"Contadores recalculados para {total} usuarios")
+
+    @app.cli.command('rebuild-attendance')
+    @click.option('--days', type=int, default=None, help='Solo los últimos N días.')
+    @click.option('--if-empty', is_flag=True, help='Solo si la tabla está vacía (relleno inicial).')
+    def rebuild_attendance(days, if_empty):
+        """Reconstruye el resumen diario de asistencia desde TimeLog."""
+        from models import DailyAttendance
+        from services.attendance_service import AttendanceService
+        if if_empty and DailyAttendance.query.first() is not None:
+            print("DailyAttendance ya tiene datos; nada que hacer")
+            return
+        since = None
+        if days is not None:
+            since = get_bogota_time().date() - timedelta(days=days)
+        total = AttendanceService.rebuild(since=since)
+        print(f"Resumen diario reconstruido: {total} filas")
+
+    @app.cli.command('run-jobs')
+    @click.option('--once', is_flag=True, help='Vacía la cola y termina.')
+    def run_jobs(once):
+        """Worker local de la cola de trabajos (PDFs de nómina, certificados)."""
+        from services.job_queue import JobQueue
+        JobQueue.run_worker(once=once)
+
+    @app.cli.command('purge-jobs')
+    @click.option('--days', type=int, default=7, help='Antigüedad mínima de los trabajos terminados.')
+    def purge_jobs(days):
+        """Borra trabajos terminados y los archivos temporales que dejaron."""
+        from services.job_queue import JobQueue
+        from services.certificate_service import CertificateService
+        from services.payroll_service import PayrollService
+        total = JobQueue.purge(days)
+        print(f"{total} trabajos eliminados")
+        if CertificateService.purge_legacy_cache():
+            print("Caché pública de certificados eliminada")
+        if PayrollService.purge_legacy_cache():
+            print("Caché pública de nóminas eliminada")
+
+    @app.cli.command('purge-presence')
+    def purge_presence():
+        """Limpia la presencia y salas de video de este nodo (backend SQL)."""
+        if hasattr(presence.backend, 'purge_node'):
+            presence.purge_node()
+            print(f"Presencia limpiada para el nodo {presence.node_id}")
+
+    @app.cli.command('purge-upload-sessions')
+    def purge_upload_sessions():
+        """Elimina las subidas por partes abandonadas."""
+        from services.upload_service import UploadService
+        total = UploadService.purge_expired()
+        print(f"Sesiones de subida eliminadas: {total}")
+
+    @app.cli.command('dedupe-uploads')
+    def dedupe_uploads():
+        """Migra static/uploads al almacén deduplicado por SHA-256."""
+        from services.blob_store import BlobStore
+        processed, freed = BlobStore.dedupe_tree()
+        print(f"Archivos procesados: {processed}. Espacio liberado: {freed / (1024 * 1024):.1f} MB")
+
+    @app.cli.command('setup-search')
+    def setup_search():
+        """Crea el índice de búsqueda de mensajes (tsvector+GIN en Postgres, FTS5 en SQLite)."""
+        from services.search_service import SearchService
+        SearchService.ensure_index()
+        print("Índice de búsqueda listo")
+
     # Global Error Handlers
     @app.errorhandler(404)
     def page_not_found(e):
@@ -74,6 +158,8 @@ app = create_app()
 if __name__ == '__main__':
     with app.app_context():
         db.create_all()
+        from services.search_service import SearchService
+        SearchService.ensure_index()
         # Create a default admin if none exists
         if not User.query.filter_by(email='admin@portal.com').first():
             admin = User(
@@ -6,5 +6,39 @@ class Config:
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     UPLOAD_FOLDER = os.path.join(os.path.abspath(os.path.dirname(__file__)), 'static/uploads')
     MAX_CONTENT_LENGTH = 500 * 1024 * 1024  # 500MB max upload size
+    # Chunked (resumable) uploads. Temp files stay on the uploads volume so finishing is a rename
+    UPLOAD_TMP_FOLDER = os.path.join(UPLOAD_FOLDER, '.incoming')
+    UPLOAD_CHUNK_SIZE = 5 * 1024 * 1024  # 5MB per chunk
+    UPLOAD_SESSION_MAX_AGE_HOURS = 24
+    # Socket.IO across workers/nodes: a shared message queue (e.g. redis://...) and a shared presence backend
+    SOCKETIO_MESSAGE_QUEUE = os.environ.get('SOCKETIO_MESSAGE_QUEUE')
+    PRESENCE_BACKEND = os.environ.get('PRESENCE_BACKEND', 'memory')  # 'memory' (single worker) or 'sql'
+    PRESENCE_NODE_ID = os.environ.get('PRESENCE_NODE_ID')  # Stable name for purge-presence; defaults to the hostname
+    PRESENCE_HEARTBEAT_SECONDS = float(os.environ.get('PRESENCE_HEARTBEAT_SECONDS', 30))  # SQL presence rows not renewed for 3 beats expire
+    VIDEO_ROOM_IDLE_TTL = int(os.environ.get('VIDEO_ROOM_IDLE_TTL', 4 * 3600))  # Abandoned call rooms expire after this
+    CONVERSATIONS_CACHE_TTL = int(os.environ.get('CONVERSATIONS_CACHE_TTL', 60))  # Upper bound on the per-process /chat/api/conversations cache; invalidation is via conversation_list_version
+    PRESENCE_BATCH_TICK = float(os.environ.get('PRESENCE_BATCH_TICK', 2.0))  # Seconds between user_status_batch emits
+    TYPING_TIMEOUT = float(os.environ.get('TYPING_TIMEOUT', 5.0))  # Idle seconds before the server closes a typing burst
+    SIGNAL_BATCH_WINDOW_MS = int(os.environ.get('SIGNAL_BATCH_WINDOW_MS', 50))  # ICE candidates per peer are coalesced within this window
+    SIGNALING_TELEMETRY_SIZE = 2000  # Events kept in the in-memory signaling ring buffer
+    SIGNALING_TELEMETRY_MAX_ROOMS = 500  # Call rooms with live counters (least recently used are dropped)
+    # Rendered documents with personal data; kept out of static/ so nothing serves them without a login check
+    CACHE_FOLDER = os.environ.get('CACHE_FOLDER') or os.path.join(os.path.abspath(os.path.dirname(__file__)), 'instance', 'cache')
+    PAYROLL_WORKERS = int(os.environ.get('PAYROLL_WORKERS', 0)) or None  # PDF render processes for batch payroll (default: CPU count)
+    PAYROLL_RENDER_MODE = os.environ.get('PAYROLL_RENDER_MODE', 'eager')  # 'eager' (PDF stored at creation) or 'lazy' (rendered on first download)
+    PAYROLL_CACHE_FOLDER = os.path.join(CACHE_FOLDER, 'payrolls')
+    PAYROLL_CACHE_MAX_BYTES = int(os.environ.get('PAYROLL_CACHE_MAX_BYTES', 500 * 1024 * 1024))  # Disk bound for lazily rendered payroll PDFs (LRU)
+    # Digital signature of payroll PDFs (pyHanko): PEM/DER key and certificate, optional PEM chain
+    PAYROLL_SIGNING_KEY = os.environ.get('PAYROLL_SIGNING_KEY')
+    PAYROLL_SIGNING_CERT = os.environ.get('PAYROLL_SIGNING_CERT')
+    PAYROLL_SIGNING_CHAIN = os.environ.get('PAYROLL_SIGNING_CHAIN')
+    PAYROLL_SIGNING_PASSPHRASE = os.environ.get('PAYROLL_SIGNING_PASSPHRASE')
+    JOB_POLL_INTERVAL = float(os.environ.get('JOB_POLL_INTERVAL', 1.0))  # Idle seconds between job queue polls
+    JOB_STALE_SECONDS = int(os.environ.get('JOB_STALE_SECONDS', 900))  # Running jobs older than this are requeued (dead worker)
+    JOB_MAX_ATTEMPTS = int(os.environ.get('JOB_MAX_ATTEMPTS', 3))
+    CERTIFICATE_CACHE_FOLDER = os.path.join(CACHE_FOLDER, 'certificates')
+    CERTIFICATE_CACHE_MAX_BYTES = int(os.environ.get('CERTIFICATE_CACHE_MAX_BYTES', 200 * 1024 * 1024))  # Disk bound for cached certificate PDFs (LRU)
+    ROSTER_RESEED_SECONDS = int(os.environ.get('ROSTER_RESEED_SECONDS', 300))  # Full reseed of a worker's in-memory time-tracking board (safety net)
+    ROSTER_DEBT_REFRESH_SECONDS = int(os.environ.get('ROSTER_DEBT_REFRESH_SECONDS', 60))  # The board re-polls live fortnight debts this often
     
     # Ensure database connection handles Unicode characters (emojis) correctly
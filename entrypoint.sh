@@ -10,8 +10,25 @@ echo "PostgreSQL listo"
 # Crear las tablas automáticamente (Versión corregida para una sola línea)
 python3 -c "from app import app, db; app.app_context().push(); db.create_all()"
 
+# Índice de búsqueda de mensajes (idempotente)
+flask --app app setup-search
+
 # Crear el admin por defecto
 python3 seed_admin.py
 
+# Reconstruir los contadores de mensajes no leídos (corrige deriva)
+flask --app app rebuild-unread-counters
+
+# Relleno inicial del resumen diario de asistencia (solo si está vacío)
+flask --app app rebuild-attendance --if-empty
+
+# Limpiar la presencia que dejó este nodo antes de reiniciar (backend SQL)
+flask --app app purge-presence
+
+# Worker de la cola de trabajos (PDFs) en segundo plano
+flask --app app purge-jobs
+flask --app app run-jobs &
+
 # Iniciar la app con Eventlet
-exec gunicorn --worker-class eventlet -w 1 --bind 0.0.0.0:8000 app:app
+# Con más de un worker se requiere PRESENCE_BACKEND=sql y SOCKETIO_MESSAGE_QUEUE
+exec gunicorn --worker-class eventlet -w "${GUNICORN_WORKERS:-1}" --bind 0.0.0.0:8000 app:app
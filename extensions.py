@@ -1,3 +1,11 @@
 from flask_socketio import SocketIO
+from services.presence_registry import PresenceRegistry
+from services.realtime_batcher import RealtimeBatcher
+from services.signaling import SignalRelay
+from services.status_roster import StatusRoster
 
 socketio = SocketIO()
+presence = PresenceRegistry()
+realtime = RealtimeBatcher()
+signaling = SignalRelay()
+roster = StatusRoster()
@@ -0,0 +1,33 @@
+"""Add video_room table for call sessions
+
+Revision ID: 0b7e4d2a9c58
+Revises: f1a8d3b5e726
+Create Date: 2026-10-16 17:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0b7e4d2a9c58'
+down_revision = 'f1a8d3b5e726'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('video_room',
+    sa.Column('room_id', sa.String(length=100), nullable=False),
+    sa.Column('last_activity', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('room_id')
+    )
+    with op.batch_alter_table('video_room', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_video_room_last_activity'), ['last_activity'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('video_room', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_video_room_last_activity'))
+
+    op.drop_table('video_room')
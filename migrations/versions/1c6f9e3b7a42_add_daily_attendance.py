@@ -0,0 +1,39 @@
+"""Add daily_attendance rollup table
+
+Revision ID: 1c6f9e3b7a42
+Revises: 0b7e4d2a9c58
+Create Date: 2026-10-16 18:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '1c6f9e3b7a42'
+down_revision = '0b7e4d2a9c58'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('daily_attendance',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('date', sa.Date(), nullable=False),
+    sa.Column('active_s', sa.Float(), nullable=False),
+    sa.Column('break_s', sa.Float(), nullable=False),
+    sa.Column('lunch_s', sa.Float(), nullable=False),
+    sa.Column('first_active', sa.DateTime(), nullable=True),
+    sa.Column('last_event', sa.DateTime(), nullable=True),
+    sa.Column('last_status', sa.String(length=20), nullable=True),
+    sa.Column('debt_s', sa.Float(), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('user_id', 'date', name='uq_daily_attendance_user_date')
+    )
+    # Reconstruir con: flask --app app rebuild-attendance
+
+
+def downgrade():
+    op.drop_table('daily_attendance')
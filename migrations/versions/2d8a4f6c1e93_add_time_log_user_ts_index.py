@@ -0,0 +1,32 @@
+"""Add (user_id, timestamp, id) index on time_log
+
+Revision ID: 2d8a4f6c1e93
+Revises: 1c6f9e3b7a42
+Create Date: 2026-10-16 18:30:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '2d8a4f6c1e93'
+down_revision = '1c6f9e3b7a42'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # time_log la crea db.create_all() (no tiene migración propia); si aún no existe,
+    # create_all la creará ya con el índice declarado en el modelo.
+    if not sa.inspect(op.get_bind()).has_table('time_log'):
+        return
+    with op.batch_alter_table('time_log', schema=None) as batch_op:
+        batch_op.create_index('ix_time_log_user_ts_id', ['user_id', 'timestamp', 'id'], unique=False)
+
+
+def downgrade():
+    if not sa.inspect(op.get_bind()).has_table('time_log'):
+        return
+    with op.batch_alter_table('time_log', schema=None) as batch_op:
+        batch_op.drop_index('ix_time_log_user_ts_id')
@@ -0,0 +1,28 @@
+"""Add composite indexes for message keyset pagination
+
+Revision ID: 3f1c9a7d2b10
+Revises: b55beee373ad
+Create Date: 2026-10-16 09:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3f1c9a7d2b10'
+down_revision = 'b55beee373ad'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('message', schema=None) as batch_op:
+        batch_op.create_index('ix_message_group_ts_id', ['group_id', 'timestamp', 'id'], unique=False)
+        batch_op.create_index('ix_message_dm_ts', ['sender_id', 'recipient_id', 'timestamp'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('message', schema=None) as batch_op:
+        batch_op.drop_index('ix_message_dm_ts')
+        batch_op.drop_index('ix_message_group_ts_id')
@@ -0,0 +1,30 @@
+"""Allow payroll_doc.filename to be NULL until the deferred PDF render
+
+Revision ID: 4a2c8e6f1b37
+Revises: 3e9b5a7d2f61
+Create Date: 2026-10-16 19:30:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '4a2c8e6f1b37'
+down_revision = '3e9b5a7d2f61'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('payroll_doc', schema=None) as batch_op:
+        batch_op.alter_column('filename',
+               existing_type=sa.String(length=255),
+               nullable=True)
+
+
+def downgrade():
+    with op.batch_alter_table('payroll_doc', schema=None) as batch_op:
+        batch_op.alter_column('filename',
+               existing_type=sa.String(length=255),
+               nullable=False)
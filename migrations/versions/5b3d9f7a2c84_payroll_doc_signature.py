@@ -0,0 +1,28 @@
+"""Add payroll_doc.signature_digest and signed_at for digitally signed stubs
+
+Revision ID: 5b3d9f7a2c84
+Revises: 4a2c8e6f1b37
+Create Date: 2026-10-16 21:10:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5b3d9f7a2c84'
+down_revision = '4a2c8e6f1b37'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('payroll_doc', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('signature_digest', sa.String(length=64), nullable=True))
+        batch_op.add_column(sa.Column('signed_at', sa.DateTime(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('payroll_doc', schema=None) as batch_op:
+        batch_op.drop_column('signed_at')
+        batch_op.drop_column('signature_digest')
@@ -0,0 +1,28 @@
+"""Add presence_connection.last_seen for heartbeat expiry
+
+Revision ID: 6e2a9c4d8b15
+Revises: 5b3d9f7a2c84
+Create Date: 2026-10-17 09:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '6e2a9c4d8b15'
+down_revision = '5b3d9f7a2c84'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('presence_connection', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('last_seen', sa.DateTime(), nullable=True))
+        batch_op.create_index(batch_op.f('ix_presence_connection_last_seen'), ['last_seen'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('presence_connection', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_presence_connection_last_seen'))
+        batch_op.drop_column('last_seen')
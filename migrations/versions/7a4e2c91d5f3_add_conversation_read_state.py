@@ -0,0 +1,53 @@
+"""Add conversation read watermarks
+
+Revision ID: 7a4e2c91d5f3
+Revises: 3f1c9a7d2b10
+Create Date: 2026-10-16 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7a4e2c91d5f3'
+down_revision = '3f1c9a7d2b10'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('conversation_read_state',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('conversation_key', sa.String(length=50), nullable=False),
+    sa.Column('last_read_message_id', sa.Integer(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('user_id', 'conversation_key', name='uq_read_state_user_conversation')
+    )
+    with op.batch_alter_table('message', schema=None) as batch_op:
+        batch_op.create_index('ix_message_inbox_id', ['recipient_id', 'sender_id', 'id'], unique=False)
+        batch_op.create_index('ix_message_group_id_id', ['group_id', 'id'], unique=False)
+
+    # Seed DM watermarks from the legacy is_read flags
+    op.execute("""
+        INSERT INTO conversation_read_state (user_id, conversation_key, last_read_message_id)
+        SELECT recipient_id,
+               'dm:' || CAST(CASE WHEN sender_id < recipient_id THEN sender_id ELSE recipient_id END AS TEXT)
+                     || ':' ||
+                     CAST(CASE WHEN sender_id < recipient_id THEN recipient_id ELSE sender_id END AS TEXT),
+               MAX(id)
+        FROM message
+        WHERE group_id IS NULL AND recipient_id IS NOT NULL AND is_read = TRUE
+        GROUP BY recipient_id, sender_id
+    """)
+
+
+def downgrade():
+    with op.batch_alter_table('message', schema=None) as batch_op:
+        batch_op.drop_index('ix_message_group_id_id')
+        batch_op.drop_index('ix_message_inbox_id')
+
+    op.drop_table('conversation_read_state')
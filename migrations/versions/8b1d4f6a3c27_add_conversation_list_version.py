@@ -0,0 +1,29 @@
+"""Add conversation_list_version for cross-worker cache invalidation
+
+Revision ID: 8b1d4f6a3c27
+Revises: 6e2a9c4d8b15
+Create Date: 2026-10-17 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8b1d4f6a3c27'
+down_revision = '6e2a9c4d8b15'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('conversation_list_version',
+    sa.Column('user_id', sa.Integer(), autoincrement=False, nullable=False),
+    sa.Column('version', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+    sa.PrimaryKeyConstraint('user_id')
+    )
+
+
+def downgrade():
+    op.drop_table('conversation_list_version')
@@ -0,0 +1,30 @@
+"""Add unread counter table
+
+Revision ID: 9c3d5e8f1a27
+Revises: 7a4e2c91d5f3
+Create Date: 2026-10-16 11:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9c3d5e8f1a27'
+down_revision = '7a4e2c91d5f3'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Existing users get their row from `flask rebuild-unread-counters`; new users are seeded on creation
+    op.create_table('unread_counter',
+    sa.Column('user_id', sa.Integer(), autoincrement=False, nullable=False),
+    sa.Column('count', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+    sa.PrimaryKeyConstraint('user_id')
+    )
+
+
+def downgrade():
+    op.drop_table('unread_counter')
@@ -0,0 +1,53 @@
+"""Add shared presence registry tables
+
+Revision ID: b8e1f4a6c392
+Revises: 9c3d5e8f1a27
+Create Date: 2026-10-16 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b8e1f4a6c392'
+down_revision = '9c3d5e8f1a27'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('presence_connection',
+    sa.Column('sid', sa.String(length=64), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('node_id', sa.String(length=120), nullable=False),
+    sa.Column('connected_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+    sa.PrimaryKeyConstraint('sid')
+    )
+    with op.batch_alter_table('presence_connection', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_presence_connection_user_id'), ['user_id'], unique=False)
+        batch_op.create_index(batch_op.f('ix_presence_connection_node_id'), ['node_id'], unique=False)
+
+    op.create_table('video_participant',
+    sa.Column('room_id', sa.String(length=100), nullable=False),
+    sa.Column('sid', sa.String(length=64), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('joined_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+    sa.PrimaryKeyConstraint('room_id', 'sid')
+    )
+    with op.batch_alter_table('video_participant', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_video_participant_sid'), ['sid'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('video_participant', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_video_participant_sid'))
+
+    op.drop_table('video_participant')
+    with op.batch_alter_table('presence_connection', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_presence_connection_node_id'))
+        batch_op.drop_index(batch_op.f('ix_presence_connection_user_id'))
+
+    op.drop_table('presence_connection')
@@ -0,0 +1,28 @@
+"""Add client_msg_id idempotency key to Message
+
+Revision ID: c4a7d9e2f815
+Revises: b8e1f4a6c392
+Create Date: 2026-10-16 13:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c4a7d9e2f815'
+down_revision = 'b8e1f4a6c392'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('message', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('client_msg_id', sa.String(length=64), nullable=True))
+        batch_op.create_unique_constraint('uq_message_sender_client_msg', ['sender_id', 'client_msg_id'])
+
+
+def downgrade():
+    with op.batch_alter_table('message', schema=None) as batch_op:
+        batch_op.drop_constraint('uq_message_sender_client_msg', type_='unique')
+        batch_op.drop_column('client_msg_id')
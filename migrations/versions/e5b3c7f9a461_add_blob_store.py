@@ -0,0 +1,47 @@
+"""Add content-addressed blob store tables
+
+Revision ID: e5b3c7f9a461
+Revises: d2f6b8a1c934
+Create Date: 2026-10-16 15:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e5b3c7f9a461'
+down_revision = 'd2f6b8a1c934'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Existing files are moved into the store with `flask dedupe-uploads`
+    op.create_table('blob',
+    sa.Column('sha256', sa.String(length=64), nullable=False),
+    sa.Column('size', sa.BigInteger(), nullable=False),
+    sa.Column('ref_count', sa.Integer(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('sha256')
+    )
+    op.create_table('stored_file',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('kind', sa.String(length=20), nullable=False),
+    sa.Column('filename', sa.String(length=255), nullable=False),
+    sa.Column('blob_sha256', sa.String(length=64), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['blob_sha256'], ['blob.sha256'], ),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('kind', 'filename', name='uq_stored_file_kind_filename')
+    )
+    with op.batch_alter_table('stored_file', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_stored_file_blob_sha256'), ['blob_sha256'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('stored_file', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_stored_file_blob_sha256'))
+
+    op.drop_table('stored_file')
+    op.drop_table('blob')
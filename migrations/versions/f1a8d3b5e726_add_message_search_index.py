@@ -0,0 +1,40 @@
+"""Add full-text search index over message content
+
+Revision ID: f1a8d3b5e726
+Revises: e5b3c7f9a461
+Create Date: 2026-10-16 16:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f1a8d3b5e726'
+down_revision = 'e5b3c7f9a461'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    from services.search_service import POSTGRES_DDL, SQLITE_DDL
+
+    dialect = op.get_bind().dialect.name
+    if dialect == 'postgresql':
+        for ddl in POSTGRES_DDL:
+            op.execute(ddl)
+    elif dialect == 'sqlite':
+        for ddl in SQLITE_DDL:
+            op.execute(ddl)
+        op.execute("INSERT INTO message_fts(message_fts) VALUES ('rebuild')")
+
+
+def downgrade():
+    dialect = op.get_bind().dialect.name
+    if dialect == 'postgresql':
+        op.execute("DROP INDEX IF EXISTS ix_message_search_vector")
+        op.execute("ALTER TABLE message DROP COLUMN IF EXISTS search_vector")
+    elif dialect == 'sqlite':
+        for trigger in ('message_fts_ai', 'message_fts_ad', 'message_fts_au'):
+            op.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+        op.execute("DROP TABLE IF EXISTS message_fts")
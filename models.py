@@ -74,6 +74,32 @@ class TimeLog(db.Model):
     new_status = db.Column(db.String(20), nullable=False)
     timestamp = db.Column(db.DateTime, default=get_bogota_time)
 
+    __table_args__ = (
+        # LEAD()/LAG() por usuario y paginación keyset del historial
+        db.Index('ix_time_log_user_ts_id', 'user_id', 'timestamp', 'id'),
+    )
+
+class DailyAttendance(db.Model):
+    """
+    Resumen diario por empleado mantenido en cada cambio de estado.
+    Los segundos de cada estado son de intervalos cerrados; el estado abierto (last_status desde last_event)
+    se suma al leer. debt_s es la deuda del día si la jornada terminara en last_event.
+    """
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    date = db.Column(db.Date, nullable=False)
+    active_s = db.Column(db.Float, nullable=False, default=0.0)
+    break_s = db.Column(db.Float, nullable=False, default=0.0)
+    lunch_s = db.Column(db.Float, nullable=False, default=0.0)
+    first_active = db.Column(db.DateTime, nullable=True)
+    last_event = db.Column(db.DateTime, nullable=True)
+    last_status = db.Column(db.String(20), nullable=True)
+    debt_s = db.Column(db.Float, nullable=False, default=0.0)
+
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'date', name='uq_daily_attendance_user_date'),
+    )
+
 # Association table for Group Members
 group_members = db.Table('group_members',
     db.Column('user_id', db.Integer, db.ForeignKey('user.id'), primary_key=True),
@@ -99,7 +125,130 @@ class Message(db.Model):
     content = db.Column(db.Text, nullable=True)
     filename = db.Column(db.String(255), nullable=True) # For attached files
     timestamp = db.Column(db.DateTime, index=True, default=get_bogota_time)
-    is_read = db.Column(db.Boolean, default=False)
+    is_read = db.Column(db.Boolean, default=False) # Legacy, read state now lives in ConversationReadState
+    client_msg_id = db.Column(db.String(64), nullable=True) # Idempotency key sent by the client
+
+    # Composite indexes for keyset (cursor) pagination on (timestamp, id)
+    __table_args__ = (
+        db.Index('ix_message_group_ts_id', 'group_id', 'timestamp', 'id'),
+        db.Index('ix_message_dm_ts', 'sender_id', 'recipient_id', 'timestamp'),
+        # Range scans for unread counts (id > last_read_message_id)
+        db.Index('ix_message_inbox_id', 'recipient_id', 'sender_id', 'id'),
+        db.Index('ix_message_group_id_id', 'group_id', 'id'),
+        db.UniqueConstraint('sender_id', 'client_msg_id', name='uq_message_sender_client_msg'),
+    )
+
+
+class ConversationReadState(db.Model):
+    """Read watermark per user and conversation ('dm:<a>:<b>' or 'group:<id>')."""
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    conversation_key = db.Column(db.String(50), nullable=False)
+    last_read_message_id = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=get_bogota_time, onupdate=get_bogota_time)
+
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'conversation_key', name='uq_read_state_user_conversation'),
+    )
+
+
+class PresenceConnection(db.Model):
+    """Socket conectado (backend SQL del registro de presencia)."""
+    sid = db.Column(db.String(64), primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
+    node_id = db.Column(db.String(120), nullable=False, index=True)
+    connected_at = db.Column(db.DateTime, default=get_bogota_time)
+    last_seen = db.Column(db.DateTime, default=get_bogota_time, index=True) # Renewed by the node's heartbeat
+
+
+class VideoRoom(db.Model):
+    """Sala de video activa; su fila se bloquea para aplicar el cupo de forma atómica."""
+    room_id = db.Column(db.String(100), primary_key=True)
+    last_activity = db.Column(db.DateTime, default=get_bogota_time, index=True)
+
+
+class VideoParticipant(db.Model):
+    """Participante de una sala de video (backend SQL del registro de presencia)."""
+    room_id = db.Column(db.String(100), primary_key=True)
+    sid = db.Column(db.String(64), primary_key=True, index=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    joined_at = db.Column(db.DateTime, default=get_bogota_time)
+
+
+class UploadSession(db.Model):
+    """Subida por partes (reanudable) de un archivo grande."""
+    id = db.Column(db.String(36), primary_key=True) # uuid4
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    purpose = db.Column(db.String(20), nullable=False) # 'chat', 'training', 'comunicado'
+    filename = db.Column(db.String(255), nullable=False) # Original client filename
+    total_size = db.Column(db.BigInteger, nullable=False)
+    received_bytes = db.Column(db.BigInteger, nullable=False, default=0)
+    expected_sha256 = db.Column(db.String(64), nullable=True)
+    sha256 = db.Column(db.String(64), nullable=True) # Set once the upload is verified
+    status = db.Column(db.String(20), nullable=False, default='uploading') # 'uploading', 'complete'
+    created_at = db.Column(db.DateTime, default=get_bogota_time)
+    updated_at = db.Column(db.DateTime, default=get_bogota_time, onupdate=get_bogota_time)
+
+
+class Job(db.Model):
+    """Trabajo en segundo plano (PDFs y otras tareas lentas) que ejecuta `flask run-jobs`."""
+    id = db.Column(db.String(36), primary_key=True) # uuid4
+    kind = db.Column(db.String(50), nullable=False) # Handler name, e.g. 'payroll_batch', 'certificate'
+    payload = db.Column(db.Text, nullable=True) # JSON
+    status = db.Column(db.String(20), nullable=False, default='queued') # 'queued', 'running', 'done', 'failed'
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    max_attempts = db.Column(db.Integer, nullable=False, default=3)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=True) # Who enqueued it (gets the progress events)
+    run_after = db.Column(db.DateTime, nullable=False, default=get_bogota_time) # Retry backoff
+    locked_by = db.Column(db.String(100), nullable=True)
+    locked_at = db.Column(db.DateTime, nullable=True)
+    progress = db.Column(db.Text, nullable=True) # JSON: {'done', 'total', 'message', ...}
+    result = db.Column(db.Text, nullable=True) # JSON
+    error = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, default=get_bogota_time)
+    updated_at = db.Column(db.DateTime, default=get_bogota_time, onupdate=get_bogota_time)
+
+    __table_args__ = (
+        db.Index('ix_job_status_run_after', 'status', 'run_after'),
+    )
+
+
+class Blob(db.Model):
+    """Contenido único de un archivo subido, direccionado por su SHA-256."""
+    sha256 = db.Column(db.String(64), primary_key=True)
+    size = db.Column(db.BigInteger, nullable=False)
+    ref_count = db.Column(db.Integer, nullable=False, default=0)
+    created_at = db.Column(db.DateTime, default=get_bogota_time)
+
+
+class StoredFile(db.Model):
+    """
+    Relaciona un nombre de archivo ya usado por los modelos (Message.filename, Training.filename,
+    Comunicado.archivo, PayrollDoc.filename, User.foto_perfil) con su blob.
+    """
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(20), nullable=False) # 'chat', 'training', 'comunicado', 'payroll', 'profile'
+    filename = db.Column(db.String(255), nullable=False)
+    blob_sha256 = db.Column(db.String(64), db.ForeignKey('blob.sha256'), nullable=False, index=True)
+    created_at = db.Column(db.DateTime, default=get_bogota_time)
+
+    blob = db.relationship('Blob', lazy=True)
+
+    __table_args__ = (
+        db.UniqueConstraint('kind', 'filename', name='uq_stored_file_kind_filename'),
+    )
+
+
+class ConversationListVersion(db.Model):
+    """Versión de la lista de conversaciones de un usuario; subirla invalida el caché de todos los workers."""
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True, autoincrement=False)
+    version = db.Column(db.Integer, nullable=False, default=0)
+
+
+class UnreadCounter(db.Model):
+    """Contador de mensajes no leídos por usuario, mantenido al enviar y al leer."""
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True, autoincrement=False)
+    count = db.Column(db.Integer, nullable=False, default=0)
 
 
 class PayrollDoc(db.Model):
@@ -108,7 +257,7 @@ class PayrollDoc(db.Model):
     mes = db.Column(db.String(20), nullable=False)
     anio = db.Column(db.Integer, nullable=False)
     periodo = db.Column(db.String(20), nullable=False, default='Mensual') # 'Primera Quincena', 'Segunda Quincena'
-    filename = db.Column(db.String(255), nullable=False) # Path to PDF
+    filename = db.Column(db.String(255), nullable=True) # Path to PDF (None until the deferred render runs)
     created_at = db.Column(db.DateTime, default=get_bogota_time)
     
     # Financial Data
@@ -122,6 +271,10 @@ class PayrollDoc(db.Model):
     otros_descuentos = db.Column(db.Float, default=0.0)
     neto_pagar = db.Column(db.Float, default=0.0)
 
+    # Digital signature: sha256 of the signed PDF (None = not signed yet)
+    signature_digest = db.Column(db.String(64), nullable=True)
+    signed_at = db.Column(db.DateTime, nullable=True)
+
 class Comunicado(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     titulo = db.Column(db.String(200), nullable=False)
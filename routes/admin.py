@@ -1,8 +1,15 @@
 import os
-from flask import Blueprint, render_template, redirect, url_for, flash, request, current_app
+from flask import Blueprint, render_template, redirect, url_for, flash, request, current_app, jsonify, Response, stream_with_context
 from flask_login import login_required, current_user
 from werkzeug.utils import secure_filename
-from models import db, User, PayrollDoc, TimeLog, Comunicado, get_bogota_time
+from models import db, User, PayrollDoc, Comunicado, get_bogota_time
+from services.blob_store import BlobStore
+from extensions import roster
+from services.attendance_service import AttendanceService
+from services.time_log_service import TimeLogService
+from services.certificate_service import CertificateService
+from services.export_service import ExportService, EXPORT_REPORTS
+from services.unread_counter_service import UnreadCounterService
 from datetime import datetime, timedelta, date, time
 import pytz
 import calendar
@@ -15,15 +22,7 @@ admin_bp = Blueprint('admin', __name__)
 
 def get_fortnight_range():
     """Returns start and end datetime for the current fortnight cycle."""
-    now = get_bogota_time()
-    if now.day <= 15:
-        start_date = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-        end_date = now.replace(day=15, hour=23, minute=59, second=59, microsecond=999999)
-    else:
-        start_date = now.replace(day=16, hour=0, minute=0, second=0, microsecond=0)
-        last_day = calendar.monthrange(now.year, now.month)[1]
-        end_date = now.replace(day=last_day, hour=23, minute=59, second=59, microsecond=999999)
-    return start_date, end_date
+    return AttendanceService.fortnight_range()
 
 def fmt_duration(seconds):
     """Format seconds into Xh Ym."""
@@ -34,136 +33,38 @@ def fmt_duration(seconds):
         return f"{h}h {m}m"
     return f"{m}m"
 
-def augment_logs_with_duration(logs):
-    """
-    Takes a list of TimeLog objects (sorted DESC or ASC? usually fetching DESC for display, 
-    but for calculation ASC is easier).
-    We will sort them ASC internally for calculation, then return them in original order (DESC).
-    """
-    if not logs:
-        return []
-
-    # Work with ASC order for logical diffs
-    sorted_logs = sorted(logs, key=lambda x: x.timestamp)
-    processed = []
-    
-    now_bogota = get_bogota_time().replace(tzinfo=None)
-
-    for i, log in enumerate(sorted_logs):
-        duration_seconds = 0
-        is_excess = False
-        excess_str = ""
-        
-        # Calculate Duration
-        if i < len(sorted_logs) - 1:
-            next_log = sorted_logs[i+1]
-            duration_seconds = (next_log.timestamp - log.timestamp).total_seconds()
-        else:
-            # Last log (most recent)
-            # If it's from today and not 'Inactivo', assume duration until now
-            # Note: log.timestamp from DB might be naive or aware depending on driver.
-            # We assume it matches get_bogota_time()'s nature (naive after strip) 
-            # OR we try to handle both. simpler to make now_bogota match log.timestamp.tzinfo
-            
-            log_tz = log.timestamp.tzinfo
-            current_now = get_bogota_time()
-            if log_tz is None:
-                current_now = current_now.replace(tzinfo=None)
-            
-            if log.timestamp.date() == current_now.date():
-                if log.new_status != 'Inactivo':
-                     duration_seconds = (current_now - log.timestamp).total_seconds()
-            else:
-                duration_seconds = 0 # Day closed without explicit logout
-
-        # Determine Excess (Visual Only)
-        # Rules: Break > 15m, Lunch > 60m
-        if log.new_status == 'En Break' and duration_seconds > 15 * 60:
-             is_excess = True
-             excess = duration_seconds - (15*60)
-             excess_str = f"+{int(excess//60)}m"
-        elif log.new_status == 'En Almuerzo' and duration_seconds > 60 * 60:
-             is_excess = True
-             excess = duration_seconds - (60*60)
-             excess_str = f"+{int(excess//60)}m"
-
-        processed.append({
-            'log': log,
-            'duration_str': fmt_duration(duration_seconds),
-            'duration_seconds': duration_seconds,
-            'is_excess': is_excess,
-            'excess_str': excess_str,
-            'timestamp': log.timestamp
+def format_history_items(page):
+    """Adapts TimeLogService.history_page rows to what admin/time_history.html renders (DESC order)."""
+    items = []
+    for entry in page:
+        row = entry['row']
+        excess = entry['excess_seconds']
+        items.append({
+            'log': row,
+            'duration_str': fmt_duration(entry['duration_seconds']),
+            'duration_seconds': entry['duration_seconds'],
+            'is_excess': excess > 0,
+            'excess_str': f"+{int(excess//60)}m" if excess > 0 else "",
+            'timestamp': row.timestamp
         })
-
-    # Return in reverse order (DESC) as expected by template usually
-    return processed[::-1]
-
-def calculate_fortnight_debt(user_id):
-    """Calculates total debt for the current fortnight."""
+    return items
+
+def parse_date_arg(name, end_of_day=False):
+    """Reads a YYYY-MM-DD query arg as a naive datetime (None if missing or invalid)."""
+    value = request.args.get(name)
+    if not value:
+        return None
+    try:
+        day = datetime.strptime(value, '%Y-%m-%d').date()
+    except ValueError:
+        return None
+    return datetime.combine(day, time.max if end_of_day else time.min)
+
+def calculate_fortnight_debts(user_ids):
+    """Calculates total debt for the current fortnight for many users at once (from DailyAttendance)."""
     start_date, end_date = get_fortnight_range()
-    
-    logs = TimeLog.query.filter(
-        TimeLog.user_id == user_id,
-        TimeLog.timestamp >= start_date,
-        TimeLog.timestamp <= end_date
-    ).order_by(TimeLog.timestamp).all()
-    
-    if not logs:
-        return "0m"
-
-    # We reuse the logic effectively, but we must group by day
-    # First, get durations
-    augmented = augment_logs_with_duration(logs) 
-    # augmented is DESC, let's reverse to ASC for daily processing
-    daily_items = augmented[::-1] 
-    
-    logs_by_date = {}
-    for item in daily_items:
-        d = item['timestamp'].date()
-        if d not in logs_by_date: logs_by_date[d] = []
-        logs_by_date[d].append(item)
-    
-    total_debt_seconds = 0
-    now_date = get_bogota_time().date()
-
-    for d, items in logs_by_date.items():
-        # 1. Late Start (> 8:30 AM)
-        first_active = next((x for x in items if x['log'].new_status == 'Activo'), None)
-        if first_active:
-            # Construct 8:30 on that day. careful with timezones.
-            # item['timestamp'] has the tz info of the log.
-            limit_830 = item['timestamp'].replace(hour=8, minute=30, second=0, microsecond=0)
-            if item['timestamp'] > limit_830:
-                total_debt_seconds += (item['timestamp'] - limit_830).total_seconds()
-        
-        # 2. Early Departure (< 4:30 PM) - Only for past days
-        if d < now_date:
-            last_item = items[-1] # Last log of the day
-            # If they didn't logout, last item is whatever status. 
-            # If they did logout, last status is Inactivo.
-            # We assume the END of the last event is the 'departure time'.
-            # If last event was 'Inactivo', departure was at timestamp.
-            # If last event was 'Activo' (forgot to logout), technically they left at ??? 
-            # Let's assume strict rule: Reference point is the timestamp of the LAST log entry.
-            
-            limit_1630 = last_item['timestamp'].replace(hour=16, minute=30, second=0, microsecond=0)
-            
-            # If the last log happened before 16:30
-            if last_item['timestamp'] < limit_1630:
-                total_debt_seconds += (limit_1630 - last_item['timestamp']).total_seconds()
-
-        # 3. Cumulative Break Debt
-        total_break = sum(x['duration_seconds'] for x in items if x['log'].new_status == 'En Break')
-        if total_break > 15 * 60:
-            total_debt_seconds += (total_break - 15 * 60)
-
-        # 4. Cumulative Lunch Debt
-        total_lunch = sum(x['duration_seconds'] for x in items if x['log'].new_status == 'En Almuerzo')
-        if total_lunch > 60 * 60:
-            total_debt_seconds += (total_lunch - 60 * 60)
-
-    return fmt_duration(total_debt_seconds)
+    debts = AttendanceService.debts_between(user_ids, start_date, end_date)
+    return {uid: fmt_duration(seconds) for uid, seconds in debts.items()}
 
 
 # Middleware to ensure only admins can access these routes
@@ -177,7 +78,8 @@ def admin_required():
 @admin_bp.route('/dashboard')
 def dashboard():
     users = User.query.filter(User.rol != 'Admin').all()
-    return render_template('admin/dashboard.html', users=users)
+    # ?job=<id> after create_payroll: the page follows the job until the PDF is ready or fails
+    return render_template('admin/dashboard.html', users=users, job_id=request.args.get('job'))
 
 @admin_bp.route('/create_user', methods=['GET', 'POST'])
 def create_user():
@@ -218,6 +120,7 @@ def create_user():
                 save_path = os.path.join(current_app.config['UPLOAD_FOLDER'], 'profile_pics')
                 os.makedirs(save_path, exist_ok=True)
                 file.save(os.path.join(save_path, filename))
+                BlobStore.ingest('profile', filename)
                 foto_perfil = filename
 
         fecha_ingreso = None
@@ -251,7 +154,11 @@ def create_user():
         new_user.set_password(password)
         
         db.session.add(new_user)
+        db.session.flush()
+        # Seeded with the user, so the navbar badge never has to write during a render
+        UnreadCounterService.rebuild_user(new_user.id)
         db.session.commit()
+        roster.invalidate()
         flash('Usuario creado exitosamente con todos los datos.', 'success')
         return redirect(url_for('admin.dashboard'))
 
@@ -266,6 +173,8 @@ def edit_user(user_id):
     user = User.query.get_or_404(user_id)
     
     if request.method == 'POST':
+        old_certificate = CertificateService.fingerprint(user)
+
         # Retrieve form data
         user.nombre = request.form.get('nombre')
         user.email = request.form.get('email')
@@ -308,9 +217,20 @@ def edit_user(user_id):
                 save_path = os.path.join(current_app.config['UPLOAD_FOLDER'], 'profile_pics')
                 os.makedirs(save_path, exist_ok=True)
                 file.save(os.path.join(save_path, filename))
+                BlobStore.ingest('profile', filename)
+                old_foto = user.foto_perfil
                 user.foto_perfil = filename
+                # The replaced picture is no longer referenced by anyone
+                if old_foto and old_foto != filename and not User.query.filter(
+                    User.foto_perfil == old_foto, User.id != user.id
+                ).first():
+                    BlobStore.release('profile', old_foto)
                 
         db.session.commit()
+        roster.invalidate()
+        # The cached certificate no longer matches the employee's data
+        if CertificateService.fingerprint(user) != old_certificate:
+            CertificateService.invalidate(old_certificate)
         flash('Empleado actualizado exitosamente.', 'success')
         return redirect(url_for('admin.dashboard'))
         
@@ -328,25 +248,9 @@ def view_employee_profile(user_id):
     payrolls = PayrollDoc.query.filter_by(user_id=user.id).order_by(PayrollDoc.created_at.desc()).all()
     comunicados = Comunicado.query.order_by(Comunicado.fecha_publicacion.desc()).all()
     
-    # 1. Calculate Hours Worked Today for the target user
-    today_start = get_bogota_time().replace(hour=0, minute=0, second=0, microsecond=0, tzinfo=None)
-    logs_today = TimeLog.query.filter(TimeLog.user_id == user.id, TimeLog.timestamp >= today_start).order_by(TimeLog.timestamp).all()
-    
-    total_seconds = 0
-    start_time = None
-    
-    for log in logs_today:
-        if log.new_status == 'Activo':
-            if start_time is None:
-                start_time = log.timestamp
-        else:
-            if start_time:
-                total_seconds += (log.timestamp - start_time).total_seconds()
-                start_time = None
-                
-    if start_time and user.current_status == 'Activo':
-         total_seconds += (get_bogota_time().replace(tzinfo=None) - start_time).total_seconds()
-         
+    # 1. Calculate Hours Worked Today for the target user (una fila de DailyAttendance)
+    total_seconds = AttendanceService.worked_seconds_today(user.id)
+
     hours = int(total_seconds // 3600)
     minutes = int((total_seconds % 3600) // 60)
     hours_worked_str = f"{hours}h {minutes}m"
@@ -374,23 +278,81 @@ def view_employee_profile(user_id):
                            user=user,
                            is_admin_view=True)
 
+@admin_bp.route('/signaling_stats')
+def signaling_stats():
+    """Per-room WebRTC signaling counters and recent events from the in-memory ring buffer."""
+    from extensions import signaling
+    room_id = request.args.get('room_id')
+    limit = min(request.args.get('limit', 200, type=int), 2000)
+    return jsonify(signaling.telemetry.snapshot(room_id=room_id, limit=limit))
+
 @admin_bp.route('/time_tracking')
 @login_required
 def time_tracking():
     if current_user.rol != 'Admin':
          return redirect(url_for('employee.dashboard'))
          
-    # Get all employees
-    employees = User.query.filter(User.rol != 'Admin').all()
-    
-    # Calculate Debt for each employee
+    # Statuses and recent changes come from the in-memory roster; the page then updates over Socket.IO
+    employees, recent_logs = roster.snapshot()
+
+    # Debt for all employees in one batch (DailyAttendance)
+    debts = calculate_fortnight_debts([emp['id'] for emp in employees])
     for emp in employees:
-        emp.debt_str = calculate_fortnight_debt(emp.id)
+        emp['debt_str'] = debts[emp['id']]
     
-    # Get recent logs (optional, could be passed to view for history tab)
-    recent_logs = TimeLog.query.order_by(TimeLog.timestamp.desc()).limit(50).all()
-    
-    return render_template('admin/time_tracking.html', employees=employees, logs=recent_logs)
+    start_date, end_date = get_fortnight_range()
+    return render_template('admin/time_tracking.html', employees=employees, logs=recent_logs,
+                           export_start=start_date.strftime('%Y-%m-%d'), export_end=end_date.strftime('%Y-%m-%d'),
+                           debt_refresh_seconds=current_app.config['ROSTER_DEBT_REFRESH_SECONDS'])
+
+@admin_bp.route('/time_tracking/debts')
+@login_required
+def time_tracking_debts():
+    """Live fortnight debt per employee (seconds); late/break debt keeps growing between status changes."""
+    if current_user.rol != 'Admin':
+        return jsonify({'error': 'Acceso no autorizado'}), 403
+    employees, _ = roster.snapshot()
+    start_date, end_date = get_fortnight_range()
+    debts = AttendanceService.debts_between([emp['id'] for emp in employees], start_date, end_date)
+    return jsonify({'debts': {str(uid): seconds for uid, seconds in debts.items()}})
+
+@admin_bp.route('/export/attendance')
+@login_required
+def export_attendance():
+    if current_user.rol != 'Admin':
+         return redirect(url_for('employee.dashboard'))
+
+    fmt = request.args.get('format', 'xlsx')
+    report = request.args.get('report', 'daily')
+    if fmt not in ('xlsx', 'csv') or report not in EXPORT_REPORTS:
+        flash('Formato de exportación inválido.', 'danger')
+        return redirect(url_for('admin.time_tracking'))
+
+    # Default: current fortnight
+    start = parse_date_arg('start')
+    end = parse_date_arg('end', end_of_day=True)
+    if start is None or end is None:
+        fortnight_start, fortnight_end = get_fortnight_range()
+        start = start or fortnight_start.replace(tzinfo=None)
+        end = end or fortnight_end.replace(tzinfo=None)
+    if start > end:
+        flash('La fecha inicial debe ser anterior a la final.', 'danger')
+        return redirect(url_for('admin.time_tracking'))
+
+    rows = ExportService.log_rows(start, end) if report == 'logs' else ExportService.daily_rows(start, end)
+    header = EXPORT_REPORTS[report]
+    filename = f"asistencia_{report}_{start:%Y%m%d}_{end:%Y%m%d}.{fmt}"
+    if fmt == 'csv':
+        body = ExportService.iter_csv(header, rows)
+        mimetype = 'text/csv; charset=utf-8'
+    else:
+        body = ExportService.iter_xlsx(header, rows)
+        mimetype = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+    # No Content-Length: the body goes out chunked as it is produced
+    response = Response(stream_with_context(body), mimetype=mimetype)
+    response.headers['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
 
 @admin_bp.route('/time_history/<int:user_id>')
 @login_required
@@ -399,15 +361,21 @@ def time_history(user_id):
          return redirect(url_for('employee.dashboard'))
     
     user = User.query.get_or_404(user_id)
-    # Get All logs for history
-    logs = TimeLog.query.filter_by(user_id=user_id).order_by(TimeLog.timestamp.desc()).all()
-    
-    # Augment with duration
-    processed_logs = augment_logs_with_duration(logs)
-    
-    return render_template('admin/time_history.html', user=user, logs=processed_logs)
+    start = parse_date_arg('start')
+    end = parse_date_arg('end', end_of_day=True)
+    cursor = request.args.get('cursor')
+
+    # One page at a time; durations come from a window function (LAG) in the database
+    page, next_cursor = TimeLogService.history_page(user.id, start=start, end=end, cursor=cursor)
+    processed_logs = format_history_items(page)
+
+    return render_template('admin/time_history.html', user=user, logs=processed_logs,
+                           next_cursor=next_cursor,
+                           start=request.args.get('start', ''), end=request.args.get('end', ''))
 
 from services.payroll_service import PayrollService
+from services.upload_service import UploadService, UploadError
+from services.payroll_import_service import PayrollImportService, PayrollImportError
 
 @admin_bp.route('/create_payroll', methods=['GET', 'POST'])
 @login_required
@@ -429,23 +397,142 @@ def create_payroll():
             'otros_descuentos': float(request.form.get('otros_descuentos') or 0.0)
         }
         
-        success = PayrollService.create_payroll_record(
-            user_id=user_id,
-            mes=request.form.get('mes'),
-            anio=int(request.form.get('anio') or 0),
-            periodo=request.form.get('periodo'),
-            financial_data=financial_data
-        )
-            
-        if success:
-            flash('Nómina generada exitosamente.', 'success')
-            return redirect(url_for('admin.dashboard'))
+        mes = request.form.get('mes')
+        anio = int(request.form.get('anio') or 0)
+        periodo = request.form.get('periodo')
+        if not User.query.get(user_id):
+            flash('Empleado no encontrado.', 'danger')
+        elif PayrollService.existing_user_ids(mes, anio, periodo, [user_id]):
+            flash('Ya existe una nómina de este empleado para el período.', 'warning')
         else:
-            flash('Error al generar el PDF o guardar el registro.', 'danger')
+            # PDF rendering runs in the job worker; the request returns right away
+            job = PayrollService.enqueue_payroll(
+                user_id=user_id,
+                mes=mes,
+                anio=anio,
+                periodo=periodo,
+                financial_data=financial_data,
+                requested_by=current_user.id
+            )
+            flash('Nómina en proceso. El PDF estará disponible en unos segundos.', 'success')
+            return redirect(url_for('admin.dashboard', job=job.id))
             
     users: list[User] = User.query.filter(User.rol != 'Admin').all()
     return render_template('admin/create_payroll.html', users=users)
 
+@admin_bp.route('/payroll/batch', methods=['GET', 'POST'])
+@login_required
+def payroll_batch():
+    if current_user.rol != 'Admin':
+         return redirect(url_for('employee.dashboard'))
+
+    if request.method == 'POST':
+        data = request.get_json(silent=True) or {}
+        mes = data.get('mes')
+        periodo = data.get('periodo')
+        try:
+            anio = int(data.get('anio') or 0)
+            rows = [
+                {'user_id': int(row['user_id']), **PayrollService.build_financial_data(
+                    salario_base=float(row.get('salario_base') or 0.0),
+                    auxilio_transporte=float(row.get('auxilio_transporte') or 0.0),
+                    bonificaciones=float(row.get('bonificaciones') or 0.0),
+                    dias_injustificados=int(row.get('dias_injustificados') or 0),
+                    otros_descuentos=float(row.get('otros_descuentos') or 0.0)
+                )}
+                for row in data.get('rows') or []
+            ]
+        except (KeyError, TypeError, ValueError):
+            return jsonify({'error': 'Datos de nómina inválidos'}), 400
+        if not mes or not anio or not periodo or not rows:
+            return jsonify({'error': 'Mes, año, período y al menos un empleado son obligatorios'}), 400
+        if len({row['user_id'] for row in rows}) != len(rows):
+            return jsonify({'error': 'Un empleado aparece más de una vez en el lote'}), 400
+
+        job = PayrollService.enqueue_batch(mes, anio, periodo, rows, requested_by=current_user.id)
+        return jsonify({'job_id': job.id, 'total': len(rows)}), 202
+
+    users: list[User] = User.query.filter(User.rol != 'Admin').order_by(User.nombre).all()
+    return render_template('admin/payroll_batch.html', users=users, anio=get_bogota_time().year)
+
+@admin_bp.route('/payroll/sign', methods=['POST'])
+@login_required
+def payroll_sign():
+    if current_user.rol != 'Admin':
+        return jsonify({'error': 'Acceso denegado'}), 403
+
+    data = request.get_json(silent=True) or {}
+    mes = data.get('mes')
+    periodo = data.get('periodo')
+    try:
+        anio = int(data.get('anio') or 0)
+    except (TypeError, ValueError):
+        anio = 0
+    if not mes or not anio or not periodo:
+        return jsonify({'error': 'Mes, año y período son obligatorios'}), 400
+    if not current_app.config.get('PAYROLL_SIGNING_KEY') or not current_app.config.get('PAYROLL_SIGNING_CERT'):
+        return jsonify({'error': 'La firma de nóminas no está configurada'}), 400
+
+    total = PayrollDoc.query.filter_by(mes=mes, anio=anio, periodo=periodo, signature_digest=None).count()
+    if not total:
+        return jsonify({'error': 'No hay nóminas sin firmar en ese período'}), 400
+
+    job = PayrollService.enqueue_sign(mes, anio, periodo, requested_by=current_user.id)
+    return jsonify({'job_id': job.id, 'total': total}), 202
+
+@admin_bp.route('/payroll/bundle')
+@login_required
+def payroll_bundle():
+    if current_user.rol != 'Admin':
+         return redirect(url_for('employee.dashboard'))
+
+    mes = request.args.get('mes')
+    periodo = request.args.get('periodo')
+    anio = request.args.get('anio', type=int)
+    if not mes or not anio or not periodo:
+        flash('Mes, año y período son obligatorios.', 'danger')
+        return redirect(url_for('admin.payroll_batch'))
+    if not PayrollDoc.query.filter_by(mes=mes, anio=anio, periodo=periodo).first():
+        flash(f'No hay nóminas de {mes} {anio} ({periodo}).', 'warning')
+        return redirect(url_for('admin.payroll_batch'))
+
+    # No Content-Length: the archive is assembled while it is being sent
+    response = Response(stream_with_context(PayrollService.iter_bundle(mes, anio, periodo)), mimetype='application/zip')
+    response.headers['Content-Disposition'] = f'attachment; filename="{PayrollService.bundle_name(mes, anio, periodo)}"'
+    return response
+
+@admin_bp.route('/payroll/import', methods=['GET', 'POST'])
+@login_required
+def payroll_import():
+    if current_user.rol != 'Admin':
+         return redirect(url_for('employee.dashboard'))
+
+    errors = []
+    if request.method == 'POST':
+        mes = request.form.get('mes')
+        periodo = request.form.get('periodo')
+        anio = request.form.get('anio', type=int)
+        file = request.files.get('registro')
+        if not mes or not periodo or not anio or not file or file.filename == '':
+            flash('Mes, año, período y el archivo son obligatorios.', 'danger')
+        else:
+            try:
+                total = PayrollImportService.import_register(file, mes, anio, periodo)
+            except PayrollImportError as e:
+                db.session.rollback()
+                flash(e.message, 'danger')
+                errors = e.errors
+            else:
+                if PayrollService.lazy_render():
+                    flash(f'{total} nóminas importadas.', 'success')
+                else:
+                    # PDFs are rendered later by the job worker
+                    PayrollService.enqueue_render_pending(mes, anio, periodo, requested_by=current_user.id)
+                    flash(f'{total} nóminas importadas. Los PDF se están generando en segundo plano.', 'success')
+                return redirect(url_for('admin.payroll_import'))
+
+    return render_template('admin/payroll_import.html', errors=errors, anio=get_bogota_time().year)
+
 @admin_bp.route('/crear_comunicado', methods=['GET', 'POST'])
 @login_required
 def crear_comunicado():
@@ -456,14 +543,27 @@ def crear_comunicado():
         titulo = request.form.get('titulo')
         contenido = request.form.get('contenido')
         file = request.files.get('archivo')
+        upload_id = request.form.get('upload_id') # Finished chunked upload (see routes/uploads.py)
         
         archivo_filename = None
-        if file and file.filename != '':
+        if upload_id:
+            try:
+                session = UploadService.get_session(upload_id, current_user.id)
+                if not session.filename.endswith('.pdf'):
+                    flash('Solo se permiten archivos PDF.', 'danger')
+                    return redirect(request.url)
+                archivo_filename = secure_filename(f"comunicado_{int(datetime.now().timestamp())}_{session.filename}")
+                UploadService.claim(upload_id, current_user.id, 'comunicado', archivo_filename)
+            except UploadError as e:
+                flash(e.message, 'danger')
+                return redirect(request.url)
+        elif file and file.filename != '':
             if file.filename.endswith('.pdf'):
                 archivo_filename = secure_filename(f"comunicado_{int(datetime.now().timestamp())}_{file.filename}")
                 save_path = os.path.join(current_app.config['UPLOAD_FOLDER'], 'comunicados')
                 os.makedirs(save_path, exist_ok=True)
                 file.save(os.path.join(save_path, archivo_filename))
+                BlobStore.ingest('comunicado', archivo_filename)
             else:
                 flash('Solo se permiten archivos PDF.', 'danger')
                 return redirect(request.url)
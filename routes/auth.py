@@ -1,6 +1,8 @@
 from flask import Blueprint, render_template, redirect, url_for, flash, request
 from flask_login import login_user, logout_user, login_required, current_user
-from models import User, TimeLog, db
+from models import User, db
+from services.attendance_service import AttendanceService
+from extensions import roster
 
 auth_bp = Blueprint('auth', __name__)
 
@@ -27,10 +29,9 @@ def login():
             
             # --- TIME TRACKING START ---
             if user.rol != 'Admin':
-                user.current_status = 'Activo'
-                new_log = TimeLog(user_id=user.id, new_status='Activo')
-                db.session.add(new_log)
+                since = AttendanceService.log_status(user, 'Activo')
                 db.session.commit()
+                roster.status_changed(user, 'Activo', since)
             # --- TIME TRACKING END ---
 
             if user.rol == 'Admin':
@@ -47,10 +48,9 @@ def login():
 def logout():
     # --- TIME TRACKING STOP ---
     if current_user.rol != 'Admin':
-        current_user.current_status = 'Inactivo'
-        new_log = TimeLog(user_id=current_user.id, new_status='Inactivo')
-        db.session.add(new_log)
+        since = AttendanceService.log_status(current_user, 'Inactivo')
         db.session.commit()
+        roster.status_changed(current_user, 'Inactivo', since)
     # --- TIME TRACKING END ---
     
     logout_user()
@@ -1,37 +1,58 @@
 import os
+import base64
+import binascii
 from flask import Blueprint, render_template, request, jsonify, current_app, send_from_directory
 from flask_login import login_required, current_user
 from werkzeug.utils import secure_filename
 from models import db, Message, User, Group
 from datetime import datetime
 import pytz
-from extensions import socketio
+from sqlalchemy import or_, and_
+from sqlalchemy.exc import IntegrityError
+from extensions import socketio, presence, realtime, signaling
+from services.read_state_service import ReadStateService
+from services.unread_counter_service import UnreadCounterService
+from services.upload_service import UploadService, UploadError
+from services.blob_store import BlobStore
+from services.conversation_service import ConversationService
+from services.search_service import SearchService
+from services.status_roster import ADMINS_ROOM
 from flask_socketio import emit, join_room
 
 chat_bp = Blueprint('chat', __name__)
 
-online_users = set()
+# Online users and video rooms live in the shared presence registry (extensions.presence)
+MAX_VIDEO_PARTICIPANTS = 8
 
 @socketio.on('connect')
 def handle_connect():
     if current_user.is_authenticated:
-        online_users.add(current_user.id)
+        became_online = presence.add_connection(current_user.id, request.sid)
         # Join user room
         join_room(str(current_user.id))
         # Join all group rooms the user is part of
         for group in current_user.groups:
             join_room(f"group_{group.id}")
+        # Admins receive live time-tracking changes
+        if current_user.rol == 'Admin':
+            join_room(ADMINS_ROOM)
             
-        # Broadcast online status
-        emit('user_status', {'user_id': current_user.id, 'status': 'online'}, broadcast=True)
+        # Online status goes out in the next batched user_status_batch (only on the first open socket/tab)
+        if became_online:
+            realtime.status_changed(current_user.id, 'online')
 
 @socketio.on('disconnect')
 def handle_disconnect():
+    # Single disconnect path: leave only the video rooms this socket is actually in
+    for room_id in presence.leave_all_video_rooms(request.sid):
+        signaling.telemetry.record(room_id, 'leave', sid=request.sid)
+        emit('user_left', {'sid': request.sid}, room=room_id)
+
     if current_user.is_authenticated:
-        if current_user.id in online_users:
-            online_users.remove(current_user.id)
-        # Broadcast offline status
-        emit('user_status', {'user_id': current_user.id, 'status': 'offline'}, broadcast=True)
+        went_offline = presence.remove_connection(current_user.id, request.sid)
+        # Offline status goes out in the next batched user_status_batch (only when the last socket/tab closes)
+        if went_offline:
+            realtime.status_changed(current_user.id, 'offline')
 
 @socketio.on('typing')
 def handle_typing(data):
@@ -44,10 +65,11 @@ def handle_typing(data):
         'group_id': group_id
     }
     
+    # Debounced: only the first event of a burst is relayed
     if group_id:
-        emit('typing', payload, room=f"group_{group_id}", include_self=False)
+        realtime.typing_started(f"group_{group_id}", current_user.id, request.sid, payload)
     elif recipient_id:
-        emit('typing', payload, room=str(recipient_id))
+        realtime.typing_started(str(recipient_id), current_user.id, request.sid, payload)
 
 @socketio.on('stop_typing')
 def handle_stop_typing(data):
@@ -60,16 +82,13 @@ def handle_stop_typing(data):
     }
     
     if group_id:
-        emit('stop_typing', payload, room=f"group_{group_id}", include_self=False)
+        realtime.typing_stopped(f"group_{group_id}", current_user.id, payload)
     elif recipient_id:
-        emit('stop_typing', payload, room=str(recipient_id))
+        realtime.typing_stopped(str(recipient_id), current_user.id, payload)
 
 # --- Video Call Signaling ---
 # --- Advanced Group Video Call Signaling (Mesh Network) ---
 
-# Track active call occupancy: room_id -> set(socket_id)
-video_rooms = {}
-
 @socketio.on('join_video_call')
 def handle_join_video(data):
     room = data.get('room_id') # ID del grupo o chat
@@ -102,24 +121,18 @@ def handle_join_video_room(data):
     User actually joins the WebRTC mesh room.
     """
     room_id = data.get('room_id')
+    presence.sweep_video_rooms()
     
-    if room_id not in video_rooms:
-        video_rooms[room_id] = set()
-        
-    # Limit to 8 participants
-    if len(video_rooms[room_id]) >= 8:
-        emit('call_error', {'message': 'Sala llena (Máx. 8 participantes)'})
+    # Limit to 8 participants (checked and registered in one step by the registry)
+    # Returns the socket IDs of the other users already in the room, so the new user can initiate offers
+    peers = presence.join_video_room(room_id, request.sid, current_user.id, MAX_VIDEO_PARTICIPANTS)
+    if peers is None:
+        emit('call_error', {'message': f'Sala llena (Máx. {MAX_VIDEO_PARTICIPANTS} participantes)'})
         return
 
     # Join the socket room
     join_room(room_id)
-    video_rooms[room_id].add(request.sid)
-    
-    # Get list of other users currently in the room (to connect with them)
-    # We send their socket IDs so the new user can initiate offers
-    # We filter out self
-    peers = list(video_rooms[room_id])
-    peers.remove(request.sid)
+    signaling.telemetry.record(room_id, 'join', sid=request.sid, user_id=current_user.id)
     
     # 1. Tell existing users that a new user joined (so they prepare to receive offer/create offer)
     # For Mesh, often the new user initiates offers to existing.
@@ -138,52 +151,32 @@ def handle_join_video_room(data):
 def handle_signal(data):
     """
     Relays WebRTC signals (Offers, Answers, ICE Candidates) directly to a specific peer.
+    Accepts a single 'candidate' or a 'candidates' batch; candidates are coalesced per target.
     """
     target_sid = data.get('target')
-    payload = data.get('payload')
+    payload = data.get('payload') or {}
     
-    # Relay the signal to the specific target socket
     # We include sender's socket ID so target knows who sent it
-    emit('signal_received', {
-        'sender': request.sid,
-        'payload': payload,
+    signaling.relay(data.get('room_id'), request.sid, target_sid, payload, {
         'sender_db_id': current_user.id, # Useful for UI labels
         'sender_name': current_user.nombre
-    }, room=target_sid)
+    })
+
+@socketio.on('call_connected')
+def handle_call_connected(data):
+    """Client reports a peer connection reached 'connected' (join-to-connected latency)."""
+    signaling.telemetry.record(data.get('room_id'), 'connected', sid=request.sid, target=data.get('target'))
 
 @socketio.on('leave_video_room')
 def handle_leave_video_room(data):
     room_id = data.get('room_id')
-    if room_id and room_id in video_rooms:
-        if request.sid in video_rooms[room_id]:
-            video_rooms[room_id].remove(request.sid)
-            if not video_rooms[room_id]:
-                del video_rooms[room_id]
-                
+    if room_id:
+        presence.leave_video_room(room_id, request.sid)
+        signaling.telemetry.record(room_id, 'leave', sid=request.sid)
+
     # Notify others so they remove the video element
     emit('user_left', {'sid': request.sid}, room=room_id)
 
-@socketio.on('disconnect')
-def handle_disconnect_video():
-    # Check if user was in any video room
-    # This is expensive O(N) but necessary if we don't track room in session
-    # Optimized: We can store room_id in socket session if needed
-    for room_id, members in list(video_rooms.items()):
-        if request.sid in members:
-            members.remove(request.sid)
-            emit('user_left', {'sid': request.sid}, room=room_id)
-            if not members:
-                del video_rooms[room_id]
-    
-    # Call original disconnect logic manually if needed or let the other handler run (SocketIO runs all handlers for event)
-    # The other handle_disconnect is decorated too, Flask-SocketIO runs both? 
-    # Usually only one handler per event is best practice. 
-    # I will merge this logic into the main disconnect handler below or separate it carefully.
-    # Since I am replacing the block, I will rely on the global disconnect handler I saw earlier? 
-    # Wait, simple separate handler might cause conflict if not designed well.
-    # Better to just use 'leave_video_room' explicitly on frontend unload.
-    pass
-
 @chat_bp.route('/video_room/<room_id>')
 @login_required
 def video_room(room_id):
@@ -196,7 +189,40 @@ def index():
     users = User.query.filter(User.id != current_user.id).all()
     # List of groups the user belongs to
     my_groups = current_user.groups
-    return render_template('chat/index.html', users=users, groups=my_groups, online_users=list(online_users))
+    return render_template('chat/index.html', users=users, groups=my_groups, online_users=presence.online_user_ids(),
+                           video_rooms=presence.room_occupancy())
+
+@chat_bp.route('/api/conversations')
+@login_required
+def api_conversations():
+    """Sidebar data: conversations by recent activity with last message and unread count."""
+    page = max(request.args.get('page', 1, type=int), 1)
+    per_page = min(max(request.args.get('per_page', 20, type=int), 1), 100)
+    return jsonify(ConversationService.list_for_user(current_user.id, page, per_page))
+
+@chat_bp.route('/api/search')
+@login_required
+def api_search():
+    """Full-text search over the messages the user can see. Paginate with before_id."""
+    term = (request.args.get('q') or '').strip()
+    if len(term) < 2:
+        return jsonify({'error': 'La búsqueda requiere al menos 2 caracteres'}), 400
+    limit = min(max(request.args.get('limit', 20, type=int), 1), 100)
+    before_id = request.args.get('before_id', type=int)
+
+    messages = SearchService.search(current_user.id, term, limit=limit, before_id=before_id)
+    results = []
+    for msg in messages:
+        data = serialize_message(msg)
+        data['group_id'] = msg.group_id
+        data['recipient_id'] = msg.recipient_id
+        data['date'] = msg.timestamp.isoformat()
+        results.append(data)
+
+    return jsonify({
+        'results': results,
+        'next_before_id': messages[-1].id if len(messages) == limit else None
+    })
 
 @chat_bp.route('/create_group', methods=['POST'])
 @login_required
@@ -242,13 +268,33 @@ def delete_group(group_id):
         return jsonify({'error': 'No tienes permiso para eliminar este grupo'}), 403
 
     try:
-        # Delete associated messages first
+        member_ids = [m.id for m in group.members]
+
+        # Attachments only used by this group's messages go with them
+        filenames = {f for (f,) in db.session.query(Message.filename).filter(
+            Message.group_id == group.id, Message.filename != None
+        ).distinct()}
+        if filenames:
+            shared = {f for (f,) in db.session.query(Message.filename).filter(
+                Message.filename.in_(filenames), or_(Message.group_id != group.id, Message.group_id == None)
+            ).distinct()}
+            for filename in filenames - shared:
+                BlobStore.release('chat', filename)
+
+        # Delete associated messages and read watermarks first
         Message.query.filter_by(group_id=group.id).delete()
+        ReadStateService.delete_conversation(ReadStateService.group_key(group.id))
         
         # Remove members association (managed by secondary table, but standard delete usually handles cascades if set, 
         # but let's be safe. Actually SQLAlchemy handles secondary table clean up typically).
         # But we need to delete the group itself.
         db.session.delete(group)
+        db.session.flush()
+
+        # Deleted messages may have been unread for some members
+        for member_id in member_ids:
+            UnreadCounterService.rebuild_user(member_id)
+        ConversationService.invalidate(member_ids)
         db.session.commit()
         
         return jsonify({'status': 'success'})
@@ -256,12 +302,38 @@ def delete_group(group_id):
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
 
+def encode_cursor(direction, msg):
+    """Opaque keyset cursor over (timestamp, id). direction: 'b' (older) or 'a' (newer)."""
+    raw = f"{direction}|{msg.timestamp.isoformat()}|{msg.id}"
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii')
+
+def decode_cursor(cursor):
+    """Returns (direction, timestamp, id) or None if the cursor is malformed."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8')
+        direction, ts_str, msg_id = raw.split('|')
+        if direction not in ('a', 'b'):
+            return None
+        return direction, datetime.fromisoformat(ts_str), int(msg_id)
+    except (ValueError, UnicodeError, binascii.Error):
+        return None
+
+def serialize_message(msg):
+    return {
+        'id': msg.id,
+        'sender_id': msg.sender_id,
+        'sender_name': msg.sender.nombre if msg.group_id else None,
+        'content': msg.content,
+        'filename': msg.filename,
+        'timestamp': msg.timestamp.strftime('%H:%M'),
+        'is_me': msg.sender_id == current_user.id
+    }
+
 @chat_bp.route('/get_messages')
 @login_required
 def get_messages():
     recipient_id = request.args.get('recipient_id', type=int)
     group_id = request.args.get('group_id', type=int)
-    page = request.args.get('page', 1, type=int)
     per_page = 20
     
     query = None
@@ -283,73 +355,132 @@ def get_messages():
     else:
         return jsonify({'messages': []})
 
-    # Order by DESC for pagination (get latest first), then reverse for display
-    pagination = query.order_by(Message.timestamp.desc()).paginate(page=page, per_page=per_page, error_out=False)
-    messages = pagination.items[::-1] # Reverse to show oldest first
+    if 'page' in request.args:
+        # Legacy OFFSET/LIMIT mode (kept for old clients)
+        page = request.args.get('page', 1, type=int)
+        pagination = query.order_by(Message.timestamp.desc(), Message.id.desc()).paginate(page=page, per_page=per_page, error_out=False)
+        messages = pagination.items[::-1] # Reverse to show oldest first
+        has_more = pagination.has_next
+        next_cursor = None
+    else:
+        # Keyset mode on (timestamp, id): same cost for the first page and the 5000th.
+        # Cursor may come as an opaque 'cursor' or as a reference message id.
+        direction, key = 'b', None
+        cursor = request.args.get('cursor')
+        before_id = request.args.get('before_id', type=int)
+        after_id = request.args.get('after_id', type=int)
+
+        if cursor:
+            decoded = decode_cursor(cursor)
+            if decoded is None:
+                return jsonify({'error': 'Cursor inválido'}), 400
+            direction, key_ts, key_id = decoded
+            key = (key_ts, key_id)
+        elif before_id or after_id:
+            direction = 'b' if before_id else 'a'
+            ref_id = before_id or after_id
+            key_ts = db.session.query(Message.timestamp).filter(Message.id == ref_id).scalar()
+            if key_ts is None:
+                return jsonify({'error': 'Mensaje de referencia no encontrado'}), 404
+            key = (key_ts, ref_id)
+
+        if direction == 'b':
+            if key:
+                query = query.filter(or_(
+                    Message.timestamp < key[0],
+                    and_(Message.timestamp == key[0], Message.id < key[1])
+                ))
+            rows = query.order_by(Message.timestamp.desc(), Message.id.desc()).limit(per_page + 1).all()
+            has_more = len(rows) > per_page
+            rows = rows[:per_page]
+            messages = rows[::-1] # Oldest first
+            next_cursor = encode_cursor('b', messages[0]) if has_more else None
+        else:
+            query = query.filter(or_(
+                Message.timestamp > key[0],
+                and_(Message.timestamp == key[0], Message.id > key[1])
+            ))
+            rows = query.order_by(Message.timestamp.asc(), Message.id.asc()).limit(per_page + 1).all()
+            has_more = len(rows) > per_page
+            messages = rows[:per_page]
+            next_cursor = encode_cursor('a', messages[-1]) if has_more else None
     
-    # Mark received messages as read (only if looking at first page or all loaded)
-    # Ideally should only mark those visible, but for simplicity mark loaded ones.
-    for msg in messages:
-        if msg.recipient_id == current_user.id and not msg.is_read:
-            msg.is_read = True
-    db.session.commit()
+    # Mark as read: move the conversation watermark up to the newest loaded message.
+    # One upsert on conversation_read_state, no writes to the message table.
+    if messages:
+        conversation_key = ReadStateService.group_key(group_id) if group_id else ReadStateService.dm_key(current_user.id, recipient_id)
+        newly_read = ReadStateService.mark_read(current_user.id, conversation_key, max(msg.id for msg in messages))
+        UnreadCounterService.decrement(current_user.id, newly_read)
+        if newly_read:
+            ConversationService.invalidate([current_user.id])
+        db.session.commit()
     
     # Get remaining unread count for the navbar badge
-    unread_count = Message.query.filter_by(recipient_id=current_user.id, is_read=False).count()
+    unread_count = UnreadCounterService.get(current_user.id)
     
-    messages_data = []
-    for msg in messages:
-        sender_name = msg.sender.nombre if msg.group_id else None
-        
-        # Prepare content
-        messages_data.append({
-            'id': msg.id,
-            'sender_id': msg.sender_id,
-            'sender_name': sender_name,
-            'content': msg.content,
-            'filename': msg.filename,
-            'timestamp': msg.timestamp.strftime('%H:%M'),
-            'is_me': msg.sender_id == current_user.id
-        })
+    messages_data = [serialize_message(msg) for msg in messages]
         
-    return jsonify({
+    response = {
         'messages': messages_data, 
         'unread_count': unread_count,
-        'has_more': pagination.has_next,
-        'page': page
-    })
+        'has_more': has_more,
+        'next_cursor': next_cursor
+    }
+    if 'page' in request.args:
+        response['page'] = page
+    return jsonify(response)
+
+def deliver_message(recipient_id, group_id, content, filename=None, client_msg_id=None):
+    """
+    Persists a message and fans it out over Socket.IO. Shared by the HTTP route and the socket event.
+    With a client_msg_id, retries of the same message return the stored row instead of duplicating it.
+    Returns (message, error).
+    """
+    group = None
+    if group_id:
+        group = Group.query.get(int(group_id))
+        if not group or current_user not in group.members:
+            return None, 'No eres miembro de este grupo'
+
+    if client_msg_id:
+        existing = Message.query.filter_by(sender_id=current_user.id, client_msg_id=client_msg_id).first()
+        if existing:
+            return existing, None
 
-@chat_bp.route('/send_message', methods=['POST'])
-@login_required
-def send_message():
-    recipient_id = request.form.get('recipient_id') # Optional if group_id is present
-    group_id = request.form.get('group_id') # Optional
-    content = request.form.get('content')
-    file = request.files.get('file')
-    filename = None
-    
-    
-    if (not recipient_id and not group_id) or (not content and not file):
-        return jsonify({'error': 'Datos faltantes'}), 400
-        
-    if file:
-        filename = secure_filename(f"chat_{current_user.id}_{int(datetime.now().timestamp())}_{file.filename}")
-        save_path = os.path.join(current_app.config['UPLOAD_FOLDER'], 'chat_files')
-        os.makedirs(save_path, exist_ok=True)
-        file.save(os.path.join(save_path, filename))
-        
     new_msg = Message(
         sender_id=current_user.id,
         recipient_id=recipient_id if recipient_id else None,
         group_id=group_id if group_id else None,
         content=content,
-        filename=filename
+        filename=filename,
+        client_msg_id=client_msg_id
     )
     db.session.add(new_msg)
-    db.session.commit()
+
+    # Keep recipients' unread counters in step with the insert
+    if group:
+        recipients = [m.id for m in group.members if m.id != current_user.id]
+    else:
+        recipients = [int(recipient_id)]
+    UnreadCounterService.increment(recipients)
+    ConversationService.invalidate(recipients + [current_user.id])
+
+    try:
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()
+        if not client_msg_id:
+            raise
+        # A concurrent retry with the same client_msg_id won the insert
+        existing = Message.query.filter_by(sender_id=current_user.id, client_msg_id=client_msg_id).first()
+        if existing:
+            return existing, None
+        raise
 
     # Emit Logic
     msg_payload = {
+        'id': new_msg.id,
+        'client_msg_id': client_msg_id,
         'sender_id': current_user.id,
         'sender_name': current_user.nombre,
         'recipient_id': recipient_id,
@@ -371,8 +502,95 @@ def send_message():
         # Emit to sender (so it appears immediately)
         msg_payload['is_me'] = True
         socketio.emit('new_message', msg_payload, room=str(current_user.id))
+
+    return new_msg, None
+
+@chat_bp.route('/send_message', methods=['POST'])
+@login_required
+def send_message():
+    recipient_id = request.form.get('recipient_id') # Optional if group_id is present
+    group_id = request.form.get('group_id') # Optional
+    content = request.form.get('content')
+    client_msg_id = request.form.get('client_msg_id') or None
+    upload_id = request.form.get('upload_id') # Finished chunked upload (see routes/uploads.py)
+    file = request.files.get('file')
+    filename = None
+    
+    
+    if (not recipient_id and not group_id) or (not content and not file and not upload_id):
+        return jsonify({'error': 'Datos faltantes'}), 400
+
+    # Validate the destination before claiming the upload or storing the file
+    try:
+        recipient_id = int(recipient_id) if recipient_id else None
+        group_id = int(group_id) if group_id else None
+    except ValueError:
+        return jsonify({'error': 'Destinatario inválido'}), 400
+    if group_id:
+        group = db.session.get(Group, group_id)
+        if not group or current_user not in group.members:
+            return jsonify({'error': 'No eres miembro de este grupo'}), 403
+    elif db.session.get(User, recipient_id) is None:
+        return jsonify({'error': 'Destinatario no encontrado'}), 404
+        
+    if upload_id:
+        try:
+            session = UploadService.get_session(upload_id, current_user.id)
+            filename = secure_filename(f"chat_{current_user.id}_{int(datetime.now().timestamp())}_{session.filename}")
+            UploadService.claim(upload_id, current_user.id, 'chat', filename)
+        except UploadError as e:
+            return jsonify({'error': e.message}), e.status_code
+    elif file:
+        filename = secure_filename(f"chat_{current_user.id}_{int(datetime.now().timestamp())}_{file.filename}")
+        save_path = os.path.join(current_app.config['UPLOAD_FOLDER'], 'chat_files')
+        os.makedirs(save_path, exist_ok=True)
+        file.save(os.path.join(save_path, filename))
+        BlobStore.ingest('chat', filename)
+
+    new_msg, error = deliver_message(recipient_id, group_id, content, filename, client_msg_id)
+    if error:
+        return jsonify({'error': error}), 403
     
-    return jsonify({'status': 'success'})
+    return jsonify({'status': 'success', 'id': new_msg.id})
+
+@socketio.on('send_message')
+def handle_send_message(data):
+    """
+    Text messages over the already open socket. The return value is sent back as the ack:
+    {'status', 'id', 'client_msg_id', 'timestamp'}. Attachments still go through the HTTP route.
+    """
+    if not current_user.is_authenticated:
+        return {'status': 'error', 'error': 'No autenticado'}
+
+    if not isinstance(data, dict):
+        return {'status': 'error', 'error': 'Datos faltantes'}
+    client_msg_id = data.get('client_msg_id') or None
+    if client_msg_id is not None and (not isinstance(client_msg_id, str) or len(client_msg_id) > 64):
+        return {'status': 'error', 'error': 'client_msg_id inválido'}
+
+    content = data.get('content')
+    content = content.strip() if isinstance(content, str) else ''
+    try:
+        recipient_id = int(data['recipient_id']) if data.get('recipient_id') else None
+        group_id = int(data['group_id']) if data.get('group_id') else None
+    except (TypeError, ValueError):
+        return {'status': 'error', 'error': 'Destinatario inválido', 'client_msg_id': client_msg_id}
+
+    if (not recipient_id and not group_id) or not content:
+        return {'status': 'error', 'error': 'Datos faltantes', 'client_msg_id': client_msg_id}
+    if not group_id and db.session.get(User, recipient_id) is None:
+        return {'status': 'error', 'error': 'Destinatario no encontrado', 'client_msg_id': client_msg_id}
+
+    new_msg, error = deliver_message(recipient_id, group_id, content, client_msg_id=client_msg_id)
+    if error:
+        return {'status': 'error', 'error': error, 'client_msg_id': client_msg_id}
+
+    return {
+        'status': 'success',
+        'id': new_msg.id,
+        'client_msg_id': client_msg_id,
+        'timestamp': new_msg.timestamp.isoformat()
+    }
 
 @chat_bp.route('/download_chat_file/<filename>')
 @login_required
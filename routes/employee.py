@@ -1,9 +1,12 @@
 import os
-from flask import Blueprint, render_template, make_response, current_app, send_from_directory, flash, request, redirect, url_for
+import json
+from flask import Blueprint, render_template, current_app, send_from_directory, send_file, flash, request, redirect, url_for
 from flask_login import login_required, current_user
-from xhtml2pdf import pisa
-from io import BytesIO
-from models import PayrollDoc, TimeLog, Comunicado, db
+from models import PayrollDoc, Comunicado, Job, db
+from services.attendance_service import AttendanceService
+from services.certificate_service import CertificateService
+from services.payroll_service import PayrollService
+from extensions import roster
 from datetime import datetime, date, timedelta
 import calendar
 import pytz
@@ -20,10 +23,9 @@ def change_status():
         flash('Estado inválido.', 'danger')
         return redirect(url_for('employee.dashboard'))
         
-    current_user.current_status = new_status
-    new_log = TimeLog(user_id=current_user.id, new_status=new_status)
-    db.session.add(new_log)
+    since = AttendanceService.log_status(current_user, new_status)
     db.session.commit()
+    roster.status_changed(current_user, new_status, since)
     
     flash(f'Estado actualizado a: {new_status}', 'success')
     return redirect(url_for('employee.dashboard'))
@@ -34,33 +36,9 @@ def dashboard():
     payrolls = PayrollDoc.query.filter_by(user_id=current_user.id).order_by(PayrollDoc.created_at.desc()).all()
     comunicados = Comunicado.query.order_by(Comunicado.fecha_publicacion.desc()).all()
     
-    # 1. Calculate Hours Worked Today
-    today_start = datetime.now(pytz.timezone('America/Bogota')).replace(hour=0, minute=0, second=0, microsecond=0, tzinfo=None)
-    logs_today = TimeLog.query.filter(TimeLog.user_id == current_user.id, TimeLog.timestamp >= today_start).order_by(TimeLog.timestamp).all()
-    
-    total_seconds = 0
-    start_time = None
-    
-    # If the user started the day 'Activo' (unlikely but possible if carry over, though simple logic assumes start from first log)
-    # Actually, let's just look at transitions today.
-    # If first log is NOT 'Activo', we assume they weren't working before.
-    # If no logs, but current status is 'Activo' (maybe logged in yesterday and never logged out? Edge case), we count from 00:00? 
-    # Let's stick to simple: iterate logs.
-    
-    for log in logs_today:
-        if log.new_status == 'Activo':
-            if start_time is None:
-                start_time = log.timestamp
-        else:
-            # If we were active, add time
-            if start_time:
-                total_seconds += (log.timestamp - start_time).total_seconds()
-                start_time = None
-                
-    # If still active right now
-    if start_time and current_user.current_status == 'Activo':
-         total_seconds += (datetime.now(pytz.timezone('America/Bogota')).replace(tzinfo=None) - start_time).total_seconds()
-         
+    # 1. Calculate Hours Worked Today (una fila de DailyAttendance)
+    total_seconds = AttendanceService.worked_seconds_today(current_user.id)
+
     hours = int(total_seconds // 3600)
     minutes = int((total_seconds % 3600) // 60)
     hours_worked_str = f"{hours}h {minutes}m"
@@ -86,6 +64,7 @@ def dashboard():
 
     return render_template('employee/dashboard.html', 
                            payrolls=payrolls, 
+                           payroll_years=sorted({doc.anio for doc in payrolls}, reverse=True),
                            comunicados=comunicados,
                            hours_worked=hours_worked_str,
                            next_payment=next_payment_str,
@@ -96,36 +75,28 @@ def dashboard():
 @employee_bp.route('/download_certificate')
 @login_required
 def download_certificate():
-    # Helper to convert HTML to PDF
-    def create_pdf(pdf_data):
-        pdf = BytesIO()
-        pisa_status = pisa.CreatePDF(BytesIO(pdf_data.encode('utf-8')), dest=pdf)
-        if pisa_status.err:
-            return None
-        return pdf.getvalue()
+    # Served from the fingerprint cache when the certificate data hasn't changed
+    path = CertificateService.cached(current_user)
+    if path:
+        return send_file(path, as_attachment=True, download_name=CertificateService.download_name(current_user))
 
-    # Data for the certificate
-    context = {
-        'nombre': current_user.nombre,
-        'cargo': current_user.cargo,
-        'fecha_ingreso': current_user.fecha_ingreso.strftime('%d of %B, %Y'), # Format as needed
-        'salario': f"${current_user.salario:,.2f}",
-        'tipo_contrato': current_user.tipo_contrato
-    }
-    
-    # Render HTML template for PDF
-    html_content = render_template('employee/certificate_template.html', **context)
-    
-    pdf_content = create_pdf(html_content)
-    
-    if pdf_content:
-        response = make_response(pdf_content)
-        response.headers['Content-Type'] = 'application/pdf'
-        response.headers['Content-Disposition'] = f'attachment; filename=Certificado_Laboral_{current_user.nombre}.pdf'
-        return response
-    
-    flash("Error generando el certificado.", "danger")
-    return redirect(url_for('employee.dashboard'))
+    # Otherwise rendering runs in the job worker and the wait page comes back here once it's done
+    job_id = request.args.get('job')
+    job = db.session.get(Job, job_id) if job_id else None
+    if job is not None and (job.user_id != current_user.id or job.kind != 'certificate'):
+        job = None
+    if job is not None and job.status == 'failed':
+        flash("Error generando el certificado.", "danger")
+        return redirect(url_for('employee.dashboard'))
+    if job is not None and job.status == 'done':
+        path = CertificateService.cache_path(json.loads(job.result)['fingerprint'])
+        if os.path.exists(path):
+            return send_file(path, as_attachment=True, download_name=CertificateService.download_name(current_user))
+        job = None
+    if job is None:
+        # First click, or the rendered file was evicted meanwhile: render again
+        job = CertificateService.enqueue(current_user.id)
+    return render_template('employee/certificate_wait.html', job_id=job.id)
 
 @employee_bp.route('/download_payroll/<int:doc_id>')
 @login_required
@@ -134,9 +105,30 @@ def download_payroll(doc_id):
     if doc.user_id != current_user.id:
         flash("Acceso denegado.", "danger")
         return redirect(url_for('employee.dashboard'))
-    
-    directory = os.path.join(current_app.config['UPLOAD_FOLDER'], 'payrolls')
-    return send_from_directory(directory, doc.filename, as_attachment=True)
+
+    # Stored file if there is one, otherwise rendered from the PayrollDoc row (cached)
+    try:
+        path = PayrollService.pdf_path(doc)
+    except Exception:
+        current_app.logger.exception("Payroll render error (doc %s)", doc.id)
+        flash("No se pudo generar el PDF de la nómina. Intenta de nuevo.", "danger")
+        return redirect(url_for('employee.dashboard'))
+    return send_file(path, as_attachment=True, download_name=PayrollService.download_name(doc))
+
+@employee_bp.route('/download_payroll/year/<int:anio>')
+@login_required
+def download_payroll_year(anio):
+    # All of the year's stubs merged into one PDF, cached until a new one appears
+    try:
+        path = PayrollService.statement(current_user.id, anio)
+    except Exception:
+        current_app.logger.exception("Payroll statement error (user %s, %s)", current_user.id, anio)
+        flash("No se pudo generar el consolidado de nómina. Intenta de nuevo.", "danger")
+        return redirect(url_for('employee.dashboard'))
+    if path is None:
+        flash(f"No tienes nóminas en {anio}.", "warning")
+        return redirect(url_for('employee.dashboard'))
+    return send_file(path, as_attachment=True, download_name=PayrollService.statement_download_name(current_user, anio))
 
 @employee_bp.route('/download_comunicado/<int:comunicado_id>')
 @login_required
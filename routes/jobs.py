@@ -0,0 +1,16 @@
+from flask import Blueprint, jsonify
+from flask_login import login_required, current_user
+from models import db, Job
+from services.job_queue import JobQueue
+
+jobs_bp = Blueprint('jobs', __name__)
+
+
+@jobs_bp.route('/<job_id>')
+@login_required
+def job_status(job_id):
+    """Estado de un trabajo (respaldo por polling de los eventos job_progress/job_done)."""
+    job = db.session.get(Job, job_id)
+    if job is None or (job.user_id != current_user.id and current_user.rol != 'Admin'):
+        return jsonify({'error': 'Trabajo no encontrado'}), 404
+    return jsonify(JobQueue.to_dict(job))
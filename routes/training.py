@@ -4,6 +4,8 @@ from flask import Blueprint, render_template, request, redirect, url_for, flash,
 from flask_login import login_required, current_user
 from werkzeug.utils import secure_filename
 from models import db, Training
+from services.upload_service import UploadService, UploadError
+from services.blob_store import BlobStore
 
 training_bp = Blueprint('training', __name__)
 
@@ -34,13 +36,41 @@ def upload():
         return redirect(url_for('training.index'))
 
     if request.method == 'POST':
+        title = request.form.get('title')
+        description = request.form.get('description')
+
+        # Large files arrive through a chunked upload session (see routes/uploads.py)
+        upload_id = request.form.get('upload_id')
+        if upload_id:
+            try:
+                session = UploadService.get_session(upload_id, current_user.id)
+                if not allowed_file(session.filename):
+                    flash('Tipo de archivo no permitido', 'danger')
+                    return redirect(request.url)
+                filename = datetime.now().strftime("%Y%m%d_%H%M%S_") + secure_filename(session.filename)
+                UploadService.claim(upload_id, current_user.id, 'training', filename)
+            except UploadError as e:
+                flash(e.message, 'danger')
+                return redirect(request.url)
+
+            new_training = Training(
+                title=title,
+                description=description,
+                filename=filename,
+                file_type=get_file_type(filename),
+                user_id=current_user.id
+            )
+            db.session.add(new_training)
+            db.session.commit()
+
+            flash('Capacitación subida exitosamente.', 'success')
+            return redirect(url_for('training.index'))
+
         if 'file' not in request.files:
             flash('No se seleccionó ningún archivo', 'danger')
             return redirect(request.url)
             
         file = request.files['file']
-        title = request.form.get('title')
-        description = request.form.get('description')
 
         if file.filename == '':
             flash('No se seleccionó ningún archivo', 'danger')
@@ -57,6 +87,7 @@ def upload():
             os.makedirs(upload_dir, exist_ok=True)
             
             file.save(os.path.join(upload_dir, filename))
+            BlobStore.ingest('training', filename)
             
             file_type = get_file_type(filename)
             
@@ -0,0 +1,99 @@
+from flask import Blueprint, request, jsonify, current_app
+from flask_login import login_required, current_user
+from services.upload_service import UploadService, UploadError
+
+uploads_bp = Blueprint('uploads', __name__)
+
+# Purposes that only admins may upload to
+ADMIN_PURPOSES = {'training', 'comunicado'}
+
+
+@uploads_bp.errorhandler(UploadError)
+def handle_upload_error(e):
+    return jsonify({'error': e.message}), e.status_code
+
+
+def session_payload(session):
+    return {
+        'upload_id': session.id,
+        'offset': session.received_bytes,
+        'total_size': session.total_size,
+        'chunk_size': current_app.config['UPLOAD_CHUNK_SIZE'],
+        'status': session.status
+    }
+
+
+def parse_size(value) -> int:
+    """Tamaño declarado por el cliente: entero (o float/cadena con valor entero) positivo."""
+    if isinstance(value, bool):
+        raise UploadError('Tamaño del archivo inválido')
+    try:
+        size = int(value)
+    except (TypeError, ValueError):
+        raise UploadError('Tamaño del archivo inválido')
+    if isinstance(value, float) and value != size:
+        raise UploadError('Tamaño del archivo inválido')
+    return size
+
+
+def parse_sha256(value) -> str | None:
+    if value is None:
+        return None
+    if not isinstance(value, str) or len(value) != 64 or any(c not in '0123456789abcdefABCDEF' for c in value):
+        raise UploadError('SHA-256 del archivo inválido')
+    return value
+
+
+@uploads_bp.route('/sessions', methods=['POST'])
+@login_required
+def create_session():
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        raise UploadError('Se esperaba un objeto JSON')
+    purpose = data.get('purpose')
+    filename = data.get('filename')
+    if not isinstance(filename, str):
+        raise UploadError('Nombre y tamaño del archivo requeridos')
+    if purpose in ADMIN_PURPOSES and current_user.rol != 'Admin':
+        return jsonify({'error': 'Acceso no autorizado'}), 403
+
+    session = UploadService.create_session(
+        user_id=current_user.id,
+        filename=filename,
+        total_size=parse_size(data.get('size')),
+        purpose=purpose,
+        sha256=parse_sha256(data.get('sha256'))
+    )
+    return jsonify(session_payload(session)), 201
+
+
+@uploads_bp.route('/sessions/<upload_id>', methods=['GET'])
+@login_required
+def session_status(upload_id):
+    """Offset from which the client should resume."""
+    session = UploadService.get_session(upload_id, current_user.id)
+    return jsonify(session_payload(session))
+
+
+@uploads_bp.route('/sessions/<upload_id>', methods=['PUT'])
+@login_required
+def upload_chunk(upload_id):
+    """Raw chunk body (application/octet-stream) written at ?offset=."""
+    session = UploadService.get_session(upload_id, current_user.id)
+    UploadService.write_chunk(
+        session,
+        offset=request.args.get('offset', type=int),
+        stream=request.stream,
+        chunk_sha256=request.headers.get('X-Chunk-SHA256')
+    )
+    return jsonify(session_payload(session))
+
+
+@uploads_bp.route('/sessions/<upload_id>/complete', methods=['POST'])
+@login_required
+def complete_session(upload_id):
+    session = UploadService.get_session(upload_id, current_user.id)
+    sha256 = UploadService.complete(session)
+    payload = session_payload(session)
+    payload['sha256'] = sha256
+    return jsonify(payload)
@@ -0,0 +1,211 @@
+import calendar
+from datetime import datetime, time
+import pandas as pd
+from sqlalchemy import func
+from models import db, DailyAttendance, TimeLog, get_bogota_time
+from services.sql_utils import dialect_insert
+from services.time_debt_service import TimeDebtService, START_LIMIT, END_LIMIT, BREAK_ALLOWANCE, LUNCH_ALLOWANCE
+
+# Estado -> columna del resumen donde se acumula su duración ('Inactivo' no suma)
+STATUS_COLUMNS = {
+    'Activo': 'active_s',
+    'En Break': 'break_s',
+    'En Almuerzo': 'lunch_s',
+}
+
+
+class AttendanceService:
+    """
+    Mantiene DailyAttendance al día: cada cambio de estado cierra el intervalo abierto
+    (en el día donde empezó, igual que el cálculo por TimeLog) y abre el nuevo.
+    """
+
+    @staticmethod
+    def _now():
+        return get_bogota_time().replace(tzinfo=None)
+
+    @staticmethod
+    def fortnight_range(now=None):
+        """Inicio y fin de la quincena en curso (1-15 o 16-fin de mes)."""
+        now = now or get_bogota_time()
+        if now.day <= 15:
+            start_date = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+            end_date = now.replace(day=15, hour=23, minute=59, second=59, microsecond=999999)
+        else:
+            start_date = now.replace(day=16, hour=0, minute=0, second=0, microsecond=0)
+            last_day = calendar.monthrange(now.year, now.month)[1]
+            end_date = now.replace(day=last_day, hour=23, minute=59, second=59, microsecond=999999)
+        return start_date, end_date
+
+    @staticmethod
+    def _closed_debt(row):
+        """Deuda del día si la jornada terminara en last_event (llegada tarde + salida temprana + excesos)."""
+        early = 0.0
+        if row.last_event:
+            day_end = datetime.combine(row.date, time()) + END_LIMIT.to_pytimedelta()
+            early = max((day_end - row.last_event).total_seconds(), 0.0)
+        return AttendanceService._late(row) + early + AttendanceService._excess(row.break_s, row.lunch_s)
+
+    @staticmethod
+    def _late(row):
+        if not row.first_active:
+            return 0.0
+        day_start = datetime.combine(row.date, time()) + START_LIMIT.to_pytimedelta()
+        return max((row.first_active - day_start).total_seconds(), 0.0)
+
+    @staticmethod
+    def _excess(break_s, lunch_s):
+        return max(break_s - BREAK_ALLOWANCE, 0.0) + max(lunch_s - LUNCH_ALLOWANCE, 0.0)
+
+    @staticmethod
+    def _open_seconds(row, now):
+        """Segundos del estado abierto; solo cuenta si el último registro es de hoy y no es 'Inactivo'."""
+        if not row.last_event or row.last_status == 'Inactivo' or row.date != now.date():
+            return 0.0
+        return max((now - row.last_event).total_seconds(), 0.0)
+
+    @staticmethod
+    def log_status(user, new_status, now=None):
+        """Registra el cambio de estado en TimeLog y actualiza el resumen diario. No hace commit; devuelve la hora del evento."""
+        now = now or AttendanceService._now()
+        user.current_status = new_status
+        db.session.add(TimeLog(user_id=user.id, new_status=new_status, timestamp=now))
+        AttendanceService.apply_event(user.id, new_status, now)
+        return now
+
+    @staticmethod
+    def apply_event(user_id, new_status, now):
+        while True:
+            last = DailyAttendance.query.filter_by(user_id=user_id).order_by(
+                DailyAttendance.date.desc()
+            ).with_for_update().populate_existing().first()
+            if last and last.date == now.date():
+                row = last
+                break
+            row = AttendanceService._insert_day(user_id, now.date())
+            if row is not None:
+                break
+            # A concurrent first event of the day (e.g. a double-submitted login) created the row: start over from it
+
+        # Cerrar el intervalo abierto en el día donde empezó
+        if last and last.last_event and now >= last.last_event:
+            column = STATUS_COLUMNS.get(last.last_status)
+            if column:
+                setattr(last, column, getattr(last, column) + (now - last.last_event).total_seconds())
+            last.debt_s = AttendanceService._closed_debt(last)
+
+        if new_status == 'Activo' and row.first_active is None:
+            row.first_active = now
+        row.last_event = now
+        row.last_status = new_status
+        row.debt_s = AttendanceService._closed_debt(row)
+        return row
+
+    @staticmethod
+    def _insert_day(user_id, day):
+        """Fila vacía del día con ON CONFLICT DO NOTHING. None si otra transacción ya la creó."""
+        values = {'user_id': user_id, 'date': day, 'active_s': 0.0, 'break_s': 0.0, 'lunch_s': 0.0, 'debt_s': 0.0}
+        stmt = dialect_insert(DailyAttendance)
+        if stmt is None:
+            row = DailyAttendance(**values)
+            db.session.add(row)
+            return row
+        stmt = stmt.values(**values).on_conflict_do_nothing(index_elements=['user_id', 'date'])
+        if not db.session.execute(stmt).rowcount:
+            return None
+        return DailyAttendance.query.filter_by(user_id=user_id, date=day).with_for_update().one()
+
+    @staticmethod
+    def worked_seconds_today(user_id, now=None):
+        """Tiempo 'Activo' de hoy: una sola fila más el intervalo abierto."""
+        now = now or AttendanceService._now()
+        row = DailyAttendance.query.filter_by(user_id=user_id, date=now.date()).first()
+        if row is None:
+            return 0.0
+        open_s = AttendanceService._open_seconds(row, now) if row.last_status == 'Activo' else 0.0
+        return row.active_s + open_s
+
+    @staticmethod
+    def _live_debt(row, now):
+        """Deuda de hoy hasta ahora: sin salida temprana y con el intervalo abierto sumado a su estado."""
+        open_s = AttendanceService._open_seconds(row, now)
+        break_s = row.break_s + (open_s if row.last_status == 'En Break' else 0.0)
+        lunch_s = row.lunch_s + (open_s if row.last_status == 'En Almuerzo' else 0.0)
+        return AttendanceService._late(row) + AttendanceService._excess(break_s, lunch_s)
+
+    @staticmethod
+    def row_debt(row, now=None):
+        """Deuda de una fila: la guardada para días pasados, en vivo para hoy."""
+        now = now or AttendanceService._now()
+        if row.date == now.date():
+            return AttendanceService._live_debt(row, now)
+        return row.debt_s
+
+    @staticmethod
+    def debts_between(user_ids, start_date, end_date, now=None):
+        """Deuda en segundos por usuario: suma de los días pasados + el día de hoy en vivo (dos consultas)."""
+        user_ids = list(user_ids)
+        now = now or AttendanceService._now()
+        today = now.date()
+        debts = {uid: 0.0 for uid in user_ids}
+        if not user_ids:
+            return debts
+
+        past = db.session.query(
+            DailyAttendance.user_id, func.sum(DailyAttendance.debt_s)
+        ).filter(
+            DailyAttendance.user_id.in_(user_ids),
+            DailyAttendance.date >= start_date.date(),
+            DailyAttendance.date <= end_date.date(),
+            DailyAttendance.date < today
+        ).group_by(DailyAttendance.user_id).all()
+        for uid, total in past:
+            debts[uid] += float(total or 0.0)
+
+        if start_date.date() <= today <= end_date.date():
+            rows = DailyAttendance.query.filter(
+                DailyAttendance.user_id.in_(user_ids),
+                DailyAttendance.date == today
+            ).all()
+            for row in rows:
+                debts[row.user_id] += AttendanceService.row_debt(row, now)
+        return debts
+
+    @staticmethod
+    def rebuild(user_ids=None, since=None):
+        """
+        Recalcula DailyAttendance desde TimeLog (relleno inicial o reparación).
+        since (date) limita los días reconstruidos; los intervalos que empiezan antes no se tocan.
+        Devuelve el número de filas escritas.
+        """
+        start = datetime.combine(since, time()) if since else None
+        df = TimeDebtService.load_logs(start_date=start, user_ids=user_ids)
+
+        query = DailyAttendance.query
+        if user_ids is not None:
+            query = query.filter(DailyAttendance.user_id.in_(list(user_ids)))
+        if since is not None:
+            query = query.filter(DailyAttendance.date >= since)
+        query.delete(synchronize_session=False)
+
+        rows = []
+        if not df.empty:
+            daily = TimeDebtService.daily_rollup(df)
+            daily['debt_s'] = daily['late_s'] + daily['early_s'] + daily['excess_s']
+            for rec in daily.itertuples(index=False):
+                first_active = None if pd.isna(rec.first_active) else rec.first_active.to_pydatetime()
+                rows.append({
+                    'user_id': int(rec.user_id),
+                    'date': rec.day.date(),
+                    'active_s': float(rec.active_s),
+                    'break_s': float(rec.break_s),
+                    'lunch_s': float(rec.lunch_s),
+                    'first_active': first_active,
+                    'last_event': rec.last_event.to_pydatetime(),
+                    'last_status': rec.last_status,
+                    'debt_s': float(rec.debt_s),
+                })
+        if rows:
+            db.session.bulk_insert_mappings(DailyAttendance, rows)
+        db.session.commit()
+        return len(rows)
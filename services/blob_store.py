@@ -0,0 +1,164 @@
+import os
+import hashlib
+from flask import current_app
+from sqlalchemy import event, update
+from sqlalchemy.orm import Session
+from models import db, Blob, StoredFile
+from services.sql_utils import dialect_insert
+
+# Subfolder under UPLOAD_FOLDER for each kind of stored file
+FILE_KINDS = {
+    'chat': 'chat_files',
+    'training': 'trainings',
+    'comunicado': 'comunicados',
+    'payroll': 'payrolls',
+    'profile': 'profile_pics',
+}
+
+READ_BLOCK = 64 * 1024
+# session.info key: blob links created in the current transaction, undone if it rolls back
+PENDING_LINKS = 'blob_store_links'
+
+
+@event.listens_for(Session, 'after_commit')
+def _keep_links(session):
+    session.info.pop(PENDING_LINKS, None)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _drop_links(session):
+    """Un blob cuya fila no llegó a guardarse no debe quedar en disco (salvo que otro ya lo reemplazó)."""
+    for target, inode in session.info.pop(PENDING_LINKS, ()):
+        try:
+            if os.stat(target).st_ino == inode:
+                os.remove(target)
+        except FileNotFoundError:
+            pass
+
+
+def _link(source, target):
+    """Enlace duro atómico: target pasa a ser source de una vez, sin ventana sin archivo."""
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    tmp = f"{target}.{os.getpid()}.link"
+    os.link(source, tmp)
+    os.replace(tmp, target)
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(READ_BLOCK), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class BlobStore:
+    """
+    Almacén deduplicado por contenido. Cada contenido se guarda una sola vez en
+    UPLOAD_FOLDER/blobs/<ab>/<cd>/<sha256> y los archivos que usan los modelos
+    quedan como enlaces duros a ese blob, así las rutas existentes siguen funcionando.
+    """
+
+    @staticmethod
+    def blob_path(sha256: str) -> str:
+        return os.path.join(current_app.config['UPLOAD_FOLDER'], 'blobs', sha256[:2], sha256[2:4], sha256)
+
+    @staticmethod
+    def logical_path(kind: str, filename: str) -> str:
+        return os.path.join(current_app.config['UPLOAD_FOLDER'], FILE_KINDS[kind], filename)
+
+    @staticmethod
+    def ingest(kind: str, filename: str, sha256: str | None = None) -> int:
+        """
+        Registra un archivo recién guardado en su carpeta habitual. Si el contenido ya
+        existía, el archivo se reemplaza por un enlace al blob. No hace commit.
+        La fila del blob se inserta con ON CONFLICT DO NOTHING: entre dos subidas
+        simultáneas del mismo contenido solo la que la insertó crea el enlace (la otra
+        espera su commit en PostgreSQL). Si la transacción se deshace, el enlace creado
+        se borra. Retorna los bytes liberados.
+        """
+        path = BlobStore.logical_path(kind, filename)
+        sha256 = sha256 or file_sha256(path)
+        size = os.path.getsize(path)
+        target = BlobStore.blob_path(sha256)
+        freed = 0
+
+        stmt = dialect_insert(Blob)
+        if stmt is not None:
+            stmt = stmt.values(sha256=sha256, size=size, ref_count=0).on_conflict_do_nothing(index_elements=['sha256'])
+            created = db.session.execute(stmt).rowcount == 1
+        else:
+            created = db.session.get(Blob, sha256) is None
+            if created:
+                db.session.add(Blob(sha256=sha256, size=size, ref_count=0))
+                db.session.flush()
+
+        if created or not os.path.exists(target):
+            _link(path, target)
+            if created:
+                db.session.info.setdefault(PENDING_LINKS, []).append((target, os.stat(target).st_ino))
+        elif not os.path.samefile(path, target):
+            # Same content already stored: point this name at the existing blob
+            _link(target, path)
+            freed = size
+
+        stored = StoredFile.query.filter_by(kind=kind, filename=filename).first()
+        if stored is None:
+            db.session.add(StoredFile(kind=kind, filename=filename, blob_sha256=sha256))
+        elif stored.blob_sha256 != sha256:
+            BlobStore._decrement(stored.blob_sha256)
+            stored.blob_sha256 = sha256
+        else:
+            return freed
+        # In SQL, not read-modify-write: concurrent ingests of the same blob must all count
+        db.session.execute(update(Blob).where(Blob.sha256 == sha256).values(ref_count=Blob.ref_count + 1))
+        return freed
+
+    @staticmethod
+    def release(kind: str, filename: str) -> None:
+        """
+        Borra un archivo que ya no usa ningún registro (su nombre en la carpeta y su referencia);
+        el blob se elimina al llegar a cero. No hace commit.
+        """
+        path = BlobStore.logical_path(kind, filename)
+        if os.path.exists(path):
+            os.remove(path)
+        stored = StoredFile.query.filter_by(kind=kind, filename=filename).first()
+        if stored is None:
+            return
+        sha256 = stored.blob_sha256
+        db.session.delete(stored)
+        BlobStore._decrement(sha256)
+
+    @staticmethod
+    def _decrement(sha256: str) -> None:
+        blob = db.session.get(Blob, sha256)
+        if blob is None:
+            return
+        blob.ref_count = max((blob.ref_count or 0) - 1, 0)
+        if blob.ref_count == 0:
+            path = BlobStore.blob_path(sha256)
+            if os.path.exists(path):
+                os.remove(path)
+            db.session.delete(blob)
+
+    @staticmethod
+    def dedupe_tree() -> tuple[int, int]:
+        """
+        Migra en sitio todo lo que ya está en las carpetas de subida.
+        Retorna (archivos procesados, bytes liberados).
+        """
+        processed = 0
+        freed = 0
+        for kind, subdir in FILE_KINDS.items():
+            directory = os.path.join(current_app.config['UPLOAD_FOLDER'], subdir)
+            if not os.path.isdir(directory):
+                continue
+            for filename in sorted(os.listdir(directory)):
+                if filename.endswith(('.dedupe', '.link')) or not os.path.isfile(os.path.join(directory, filename)):
+                    continue
+                freed += BlobStore.ingest(kind, filename)
+                processed += 1
+                # Commit per file so an interrupted run can simply be restarted
+                db.session.commit()
+        return processed, freed
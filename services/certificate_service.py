@@ -0,0 +1,132 @@
+import hashlib
+import json
+import os
+import shutil
+from flask import render_template, current_app
+from models import User, Job
+from services.payroll_service import html_to_pdf, evict_lru
+from services.job_queue import JobQueue
+
+CERTIFICATE_TEMPLATE = 'employee/certificate_template.html'
+# Campos del empleado que aparecen en el certificado; solo un cambio en ellos invalida el PDF
+CERTIFICATE_FIELDS = ('nombre', 'cargo', 'fecha_ingreso', 'salario', 'tipo_contrato')
+
+_template_version = None
+
+
+class CertificateService:
+    """
+    Certificado laboral en PDF; se genera en el worker de trabajos (ver services/job_handlers.py)
+    y se guarda en una caché en disco por huella de contenido: sha256 de los campos del
+    certificado + la versión de la plantilla. Las descargas repetidas salen del archivo.
+    La caché vive en CERTIFICATE_CACHE_FOLDER, fuera de static/: solo se entrega por
+    employee.download_certificate. Se acota a CERTIFICATE_CACHE_MAX_BYTES expulsando lo menos usado (mtime).
+    """
+
+    @staticmethod
+    def certificate_context(user) -> dict:
+        return {
+            'nombre': user.nombre,
+            'cargo': user.cargo,
+            'fecha_ingreso': user.fecha_ingreso.strftime('%d of %B, %Y'), # Format as needed
+            'salario': f"${user.salario:,.2f}",
+            'tipo_contrato': user.tipo_contrato
+        }
+
+    @staticmethod
+    def render_pdf(user) -> bytes | None:
+        html_content = render_template(CERTIFICATE_TEMPLATE, **CertificateService.certificate_context(user))
+        return html_to_pdf(html_content)
+
+    @staticmethod
+    def download_name(user) -> str:
+        return f"Certificado_Laboral_{user.nombre}.pdf"
+
+    # --- Cache ---
+
+    @staticmethod
+    def template_version() -> str:
+        """Hash del código de la plantilla (cambiarla invalida todos los certificados)."""
+        global _template_version
+        if _template_version is None:
+            source, _, _ = current_app.jinja_env.loader.get_source(current_app.jinja_env, CERTIFICATE_TEMPLATE)
+            _template_version = hashlib.sha256(source.encode('utf-8')).hexdigest()[:16]
+        return _template_version
+
+    @staticmethod
+    def fingerprint(user) -> str:
+        fields = {name: str(getattr(user, name)) for name in CERTIFICATE_FIELDS}
+        raw = json.dumps({'fields': fields, 'template': CertificateService.template_version()}, sort_keys=True)
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+    @staticmethod
+    def cache_dir() -> str:
+        path = current_app.config['CERTIFICATE_CACHE_FOLDER']
+        os.makedirs(path, exist_ok=True)
+        return path
+
+    @staticmethod
+    def purge_legacy_cache() -> bool:
+        """Borra la caché antigua en static/uploads/certificates (servida sin autenticación)."""
+        legacy = os.path.join(current_app.config['UPLOAD_FOLDER'], 'certificates')
+        if not os.path.isdir(legacy):
+            return False
+        shutil.rmtree(legacy)
+        return True
+
+    @staticmethod
+    def cache_path(fingerprint: str) -> str:
+        return os.path.join(CertificateService.cache_dir(), f"{fingerprint}.pdf")
+
+    @staticmethod
+    def cached(user) -> str | None:
+        """Ruta del PDF en caché para el estado actual del empleado (y lo marca como usado) o None."""
+        path = CertificateService.cache_path(CertificateService.fingerprint(user))
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return path
+
+    @staticmethod
+    def invalidate(fingerprint: str) -> None:
+        try:
+            os.remove(CertificateService.cache_path(fingerprint))
+        except FileNotFoundError:
+            pass
+
+    @staticmethod
+    def evict(max_bytes: int) -> int:
+        """Borra los certificados menos usados hasta quedar bajo max_bytes. Devuelve cuántos borró."""
+        return evict_lru(CertificateService.cache_dir(), max_bytes)
+
+    @staticmethod
+    def generate(user_id: int) -> dict:
+        """Renderiza el certificado a la caché (escritura atómica) y aplica el límite de tamaño."""
+        user = User.query.get(user_id)
+        if user is None:
+            raise ValueError('Empleado no encontrado')
+        fingerprint = CertificateService.fingerprint(user)
+        path = CertificateService.cache_path(fingerprint)
+        if not os.path.exists(path):
+            pdf_content = CertificateService.render_pdf(user)
+            if not pdf_content:
+                raise RuntimeError('xhtml2pdf no pudo generar el certificado')
+            tmp_path = f"{path}.tmp"
+            with open(tmp_path, 'wb') as f:
+                f.write(pdf_content)
+            os.replace(tmp_path, path)
+            CertificateService.evict(current_app.config['CERTIFICATE_CACHE_MAX_BYTES'])
+        return {'fingerprint': fingerprint}
+
+    @staticmethod
+    def enqueue(user_id: int):
+        """Encola el certificado; si ya hay uno pendiente para este empleado, devuelve ese."""
+        pending = Job.query.filter(
+            Job.kind == 'certificate',
+            Job.user_id == user_id,
+            Job.status.in_(('queued', 'running'))
+        ).first()
+        if pending:
+            return pending
+        return JobQueue.enqueue('certificate', {'user_id': user_id}, user_id=user_id)
@@ -0,0 +1,145 @@
+import time
+from flask import current_app
+from sqlalchemy import and_, or_, case, cast, func, literal, select, String
+from sqlalchemy.orm import aliased
+from models import db, Message, Group, User, ConversationReadState, ConversationListVersion, group_members
+from services.sql_utils import dialect_insert
+
+SNIPPET_LENGTH = 80
+
+# In-process cache: user_id -> {(page, per_page): (payload, version, expires_at)}
+_cache = {}
+
+
+class ConversationService:
+    @staticmethod
+    def conversation_key_expr(user_id: int):
+        """Clave de conversación de cada fila de Message, igual a ReadStateService.dm_key/group_key."""
+        other = case((Message.sender_id == user_id, Message.recipient_id), else_=Message.sender_id)
+        low = case((other < user_id, other), else_=literal(user_id))
+        high = case((other < user_id, literal(user_id)), else_=other)
+        return case(
+            (Message.group_id != None, literal('group:') + cast(Message.group_id, String)),
+            else_=literal('dm:') + cast(low, String) + literal(':') + cast(high, String)
+        )
+
+    @staticmethod
+    def query_page(user_id: int, page: int, per_page: int) -> tuple[list[dict], bool]:
+        """
+        Conversaciones del usuario ordenadas por actividad reciente, con el último mensaje y
+        los no leídos de cada una, en una sola consulta con funciones de ventana.
+        """
+        conv_key = ConversationService.conversation_key_expr(user_id)
+        peer_id = case(
+            (Message.group_id != None, None),
+            (Message.sender_id == user_id, Message.recipient_id),
+            else_=Message.sender_id
+        )
+        my_groups = select(group_members.c.group_id).where(group_members.c.user_id == user_id)
+        last_read = func.coalesce(ConversationReadState.last_read_message_id, 0)
+
+        ranked = db.session.query(
+            conv_key.label('conversation_key'),
+            Message.group_id.label('group_id'),
+            peer_id.label('peer_id'),
+            Message.id.label('message_id'),
+            Message.sender_id.label('sender_id'),
+            Message.content.label('content'),
+            Message.filename.label('filename'),
+            Message.timestamp.label('timestamp'),
+            func.row_number().over(
+                partition_by=conv_key,
+                order_by=(Message.timestamp.desc(), Message.id.desc())
+            ).label('rn'),
+            func.sum(case(
+                (and_(Message.id > last_read, Message.sender_id != user_id), 1),
+                else_=0
+            )).over(partition_by=conv_key).label('unread_count')
+        ).outerjoin(
+            ConversationReadState,
+            and_(ConversationReadState.user_id == user_id, ConversationReadState.conversation_key == conv_key)
+        ).filter(or_(
+            Message.group_id.in_(my_groups),
+            and_(Message.group_id == None, or_(Message.sender_id == user_id, Message.recipient_id == user_id))
+        )).subquery()
+
+        peer = aliased(User)
+        rows = db.session.query(ranked, peer.nombre.label('peer_name'), Group.name.label('group_name')).outerjoin(
+            peer, peer.id == ranked.c.peer_id
+        ).outerjoin(
+            Group, Group.id == ranked.c.group_id
+        ).filter(
+            ranked.c.rn == 1
+        ).order_by(
+            ranked.c.timestamp.desc(), ranked.c.message_id.desc()
+        ).offset((page - 1) * per_page).limit(per_page + 1).all()
+
+        has_more = len(rows) > per_page
+        conversations = []
+        for row in rows[:per_page]:
+            snippet = (row.content or '')[:SNIPPET_LENGTH] if row.content else ('Adjunto' if row.filename else '')
+            conversations.append({
+                'conversation_key': row.conversation_key,
+                'type': 'group' if row.group_id else 'user',
+                'id': row.group_id or row.peer_id,
+                'name': row.group_name if row.group_id else row.peer_name,
+                'last_message': {
+                    'id': row.message_id,
+                    'sender_id': row.sender_id,
+                    'snippet': snippet,
+                    'timestamp': row.timestamp.isoformat(),
+                    'is_me': row.sender_id == user_id
+                },
+                'unread_count': int(row.unread_count or 0)
+            })
+        return conversations, has_more
+
+    @staticmethod
+    def version(user_id: int) -> int:
+        return db.session.query(ConversationListVersion.version).filter_by(user_id=user_id).scalar() or 0
+
+    @staticmethod
+    def list_for_user(user_id: int, page: int = 1, per_page: int = 20) -> dict:
+        """
+        Igual que query_page(), servido desde el caché del proceso mientras la versión del
+        usuario en la BD no cambie (invalidate() la sube desde cualquier worker) y no venza
+        el TTL, que solo acota lo que no pasa por invalidate() (p. ej. un cambio de nombre).
+        """
+        now = time.monotonic()
+        version = ConversationService.version(user_id)
+        user_cache = _cache.setdefault(user_id, {})
+        cached = user_cache.get((page, per_page))
+        if cached and cached[1] == version and cached[2] > now:
+            return cached[0]
+
+        conversations, has_more = ConversationService.query_page(user_id, page, per_page)
+        payload = {'conversations': conversations, 'page': page, 'has_more': has_more}
+        user_cache[(page, per_page)] = (payload, version, now + current_app.config.get('CONVERSATIONS_CACHE_TTL', 60))
+        return payload
+
+    @staticmethod
+    def invalidate(user_ids) -> None:
+        """
+        Sube la versión de la lista de cada usuario. No hace commit: va en la misma
+        transacción que el cambio, así ningún worker cachea la lista vieja con la versión nueva.
+        """
+        user_ids = sorted({int(uid) for uid in user_ids})
+        if not user_ids:
+            return
+        stmt = dialect_insert(ConversationListVersion)
+        if stmt is not None:
+            stmt = stmt.values([{'user_id': uid, 'version': 1} for uid in user_ids])
+            stmt = stmt.on_conflict_do_update(
+                index_elements=['user_id'],
+                set_={'version': ConversationListVersion.version + 1}
+            )
+            db.session.execute(stmt)
+        else:
+            existing = {row.user_id: row for row in ConversationListVersion.query.filter(ConversationListVersion.user_id.in_(user_ids))}
+            for uid in user_ids:
+                if uid in existing:
+                    existing[uid].version += 1
+                else:
+                    db.session.add(ConversationListVersion(user_id=uid, version=1))
+        for uid in user_ids:
+            _cache.pop(uid, None)
@@ -0,0 +1,109 @@
+import csv
+import io
+import os
+import tempfile
+import time
+from openpyxl import Workbook
+from sqlalchemy import select
+from models import db, User, DailyAttendance, get_bogota_time
+from services.attendance_service import AttendanceService
+from services.time_log_service import TimeLogService
+
+# Filas por lote: tamaño del cursor del servidor y cada cuánto se cede el control
+STREAM_BATCH = 1000
+FILE_CHUNK = 64 * 1024
+
+EXPORT_REPORTS = {
+    'logs': ['Empleado', 'Email', 'Fecha', 'Hora', 'Estado', 'Duración (min)', 'Exceso (min)'],
+    'daily': ['Empleado', 'Email', 'Fecha', 'Primer Activo', 'Último Registro',
+              'Activo (h)', 'Break (min)', 'Almuerzo (min)', 'Deuda (min)'],
+}
+
+
+class ExportService:
+    """Exportes de asistencia que leen con cursor del servidor y escriben fila a fila (memoria constante)."""
+
+    @staticmethod
+    def _stream(query):
+        return db.session.execute(query.execution_options(stream_results=True, yield_per=STREAM_BATCH))
+
+    @staticmethod
+    def log_rows(start, end):
+        """Cada cambio de estado del rango con su duración (LEAD en la base de datos)."""
+        _, sub = TimeLogService.durations_query(start=start)
+        query = select(sub, User.nombre, User.email).join(User, User.id == sub.c.user_id).where(
+            sub.c.timestamp <= end
+        ).order_by(sub.c.user_id, sub.c.timestamp, sub.c.id)
+
+        now = get_bogota_time().replace(tzinfo=None)
+        for row in ExportService._stream(query):
+            seconds = TimeLogService.duration_seconds(row, now)
+            excess = TimeLogService.excess_seconds(row.new_status, seconds)
+            yield [
+                row.nombre, row.email,
+                row.timestamp.strftime('%Y-%m-%d'), row.timestamp.strftime('%H:%M:%S'),
+                row.new_status, round(seconds / 60, 1), round(excess / 60, 1)
+            ]
+
+    @staticmethod
+    def daily_rows(start, end):
+        """Una fila por empleado y día desde DailyAttendance, con la deuda del día."""
+        query = select(DailyAttendance, User.nombre, User.email).join(
+            User, User.id == DailyAttendance.user_id
+        ).where(
+            DailyAttendance.date >= start.date(),
+            DailyAttendance.date <= end.date()
+        ).order_by(DailyAttendance.user_id, DailyAttendance.date)
+
+        now = get_bogota_time().replace(tzinfo=None)
+        for att, nombre, email in ExportService._stream(query):
+            yield [
+                nombre, email, att.date.isoformat(),
+                att.first_active.strftime('%H:%M:%S') if att.first_active else '',
+                att.last_event.strftime('%H:%M:%S') if att.last_event else '',
+                round(att.active_s / 3600, 2), round(att.break_s / 60, 1), round(att.lunch_s / 60, 1),
+                round(AttendanceService.row_debt(att, now) / 60, 1)
+            ]
+
+    @staticmethod
+    def iter_csv(header, rows):
+        """CSV en trozos de STREAM_BATCH filas (con BOM para que Excel respete los acentos)."""
+        buf = io.StringIO()
+        writer = csv.writer(buf)
+        buf.write('\ufeff')
+        writer.writerow(header)
+        for i, row in enumerate(rows, 1):
+            writer.writerow(row)
+            if i % STREAM_BATCH == 0:
+                yield buf.getvalue()
+                buf.seek(0)
+                buf.truncate(0)
+        yield buf.getvalue()
+
+    @staticmethod
+    def iter_xlsx(header, rows, title='Asistencia'):
+        """
+        XLSX con openpyxl en modo write-only (las filas van a disco, no a memoria).
+        El zip solo se puede cerrar al final, así que se envía el archivo temporal por trozos.
+        """
+        wb = Workbook(write_only=True)
+        ws = wb.create_sheet(title=title)
+        ws.append(header)
+        for i, row in enumerate(rows, 1):
+            ws.append(row)
+            if i % STREAM_BATCH == 0:
+                # Con eventlet.monkey_patch, time.sleep(0) cede el hub a las demás conexiones
+                time.sleep(0)
+
+        fd, path = tempfile.mkstemp(suffix='.xlsx')
+        os.close(fd)
+        try:
+            wb.save(path)
+            with open(path, 'rb') as f:
+                while True:
+                    chunk = f.read(FILE_CHUNK)
+                    if not chunk:
+                        break
+                    yield chunk
+        finally:
+            os.remove(path)
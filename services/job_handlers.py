@@ -0,0 +1,54 @@
+"""Handlers de la cola de trabajos; se importan al arrancar `flask run-jobs`."""
+from services.job_queue import job_handler, JobQueue
+from services.payroll_service import PayrollService
+from services.certificate_service import CertificateService
+
+
+@job_handler('payroll')
+def run_payroll(job, payload):
+    # A retry after a commit that did go through (worker died before complete) must not duplicate it;
+    # the admin route already refuses a second payroll for the same period
+    if PayrollService.existing_user_ids(payload['mes'], payload['anio'], payload['periodo'], [payload['user_id']]):
+        return {'user_id': payload['user_id']}
+    success = PayrollService.create_payroll_record(
+        user_id=payload['user_id'],
+        mes=payload['mes'],
+        anio=payload['anio'],
+        periodo=payload['periodo'],
+        financial_data=payload['financial_data']
+    )
+    if not success:
+        raise RuntimeError('Error al generar el PDF o guardar el registro')
+    return {'user_id': payload['user_id']}
+
+
+@job_handler('payroll_batch')
+def run_payroll_batch(job, payload):
+    def progress(user_id, ok, error, done, total):
+        JobQueue.report(job, done=done, total=total, user_id=user_id, ok=ok, error=error)
+
+    result = PayrollService.run_batch(
+        payload['mes'], payload['anio'], payload['periodo'], payload['rows'], progress=progress
+    )
+    return result
+
+
+@job_handler('payroll_render')
+def run_payroll_render(job, payload):
+    def progress(user_id, ok, error, done, total):
+        JobQueue.report(job, done=done, total=total, user_id=user_id, ok=ok, error=error)
+
+    return PayrollService.render_pending(payload['mes'], payload['anio'], payload['periodo'], progress=progress)
+
+
+@job_handler('payroll_sign')
+def run_payroll_sign(job, payload):
+    def progress(user_id, ok, error, done, total):
+        JobQueue.report(job, done=done, total=total, user_id=user_id, ok=ok, error=error)
+
+    return PayrollService.sign_period(payload['mes'], payload['anio'], payload['periodo'], progress=progress)
+
+
+@job_handler('certificate')
+def run_certificate(job, payload):
+    return CertificateService.generate(payload['user_id'])
@@ -0,0 +1,219 @@
+import json
+import os
+import socket
+import time
+import uuid
+from datetime import timedelta
+from flask import current_app
+from sqlalchemy import update
+from models import db, Job, get_bogota_time
+
+# kind -> handler(job, payload) -> result (JSON serializable)
+HANDLERS = {}
+
+FINAL_STATUSES = ('done', 'failed')
+
+
+def job_handler(kind):
+    """Registra la función que ejecuta los trabajos de tipo `kind`."""
+    def decorator(fn):
+        HANDLERS[kind] = fn
+        return fn
+    return decorator
+
+
+class JobQueue:
+    """
+    Cola de trabajos respaldada por la tabla `job`. La web encola y responde de inmediato;
+    `flask run-jobs` reclama y ejecuta. El progreso se guarda en la fila (para consultar
+    por HTTP) y se publica por Socket.IO al usuario que encoló (requiere SOCKETIO_MESSAGE_QUEUE
+    para salir del proceso del worker).
+    """
+
+    @staticmethod
+    def _now():
+        return get_bogota_time().replace(tzinfo=None)
+
+    @staticmethod
+    def enqueue(kind, payload, user_id=None, max_attempts=None):
+        job = Job(
+            id=str(uuid.uuid4()),
+            kind=kind,
+            payload=json.dumps(payload),
+            status='queued',
+            attempts=0,
+            max_attempts=max_attempts or current_app.config.get('JOB_MAX_ATTEMPTS', 3),
+            user_id=user_id,
+            run_after=JobQueue._now()
+        )
+        db.session.add(job)
+        db.session.commit()
+        return job
+
+    @staticmethod
+    def to_dict(job):
+        return {
+            'job_id': job.id,
+            'kind': job.kind,
+            'status': job.status,
+            'attempts': job.attempts,
+            'progress': json.loads(job.progress) if job.progress else None,
+            'result': json.loads(job.result) if job.result else None,
+            'error': job.error
+        }
+
+    @staticmethod
+    def claim(worker_id):
+        """
+        Toma el siguiente trabajo listo. En PostgreSQL el candidato se bloquea con
+        FOR UPDATE SKIP LOCKED, así varios workers no se estorban; en SQLite (sin bloqueos
+        de fila) el UPDATE condicionado a status='queued' decide quién se lo queda.
+        """
+        now = JobQueue._now()
+        candidate = db.session.query(Job.id).filter(
+            Job.status == 'queued',
+            Job.run_after <= now
+        ).order_by(Job.run_after, Job.created_at).limit(1).with_for_update(skip_locked=True).scalar()
+        if candidate is None:
+            db.session.rollback()
+            return None
+
+        claimed = db.session.execute(
+            update(Job).where(Job.id == candidate, Job.status == 'queued').values(
+                status='running',
+                attempts=Job.attempts + 1,
+                locked_by=worker_id,
+                locked_at=now,
+                updated_at=now
+            )
+        ).rowcount
+        db.session.commit()
+        if claimed != 1:
+            return None
+        return db.session.get(Job, candidate)
+
+    @staticmethod
+    def _emit(job, event, data):
+        from extensions import socketio
+        from services.status_roster import ADMINS_ROOM
+        room = str(job.user_id) if job.user_id else ADMINS_ROOM
+        try:
+            socketio.emit(event, data, to=room)
+        except Exception:
+            # Progress is also stored on the row; a lost event only delays the UI until it polls
+            current_app.logger.exception("JobQueue emit error (job %s)", job.id)
+
+    @staticmethod
+    def report(job, done=None, total=None, message=None, **detail):
+        """
+        Guarda y publica el progreso de un trabajo en curso ('job_progress'). También renueva
+        locked_at: un trabajo que sigue reportando no es 'stale' aunque dure más que JOB_STALE_SECONDS.
+        """
+        progress = {'done': done, 'total': total, 'message': message, **detail}
+        job.progress = json.dumps(progress)
+        job.locked_at = JobQueue._now()
+        db.session.commit()
+        JobQueue._emit(job, 'job_progress', {'job_id': job.id, 'kind': job.kind, 'status': job.status, 'progress': progress})
+
+    @staticmethod
+    def complete(job, result):
+        job.status = 'done'
+        job.result = json.dumps(result)
+        job.error = None
+        job.locked_by = None
+        db.session.commit()
+        JobQueue._emit(job, 'job_done', JobQueue.to_dict(job))
+
+    @staticmethod
+    def fail(job, error):
+        """Reintenta con espera exponencial (10s, 20s, 40s...) hasta max_attempts; después queda 'failed'."""
+        job.error = error
+        job.locked_by = None
+        if job.attempts < job.max_attempts:
+            job.status = 'queued'
+            job.run_after = JobQueue._now() + timedelta(seconds=10 * 2 ** (job.attempts - 1))
+            db.session.commit()
+            JobQueue._emit(job, 'job_progress', JobQueue.to_dict(job))
+        else:
+            job.status = 'failed'
+            db.session.commit()
+            JobQueue._emit(job, 'job_done', JobQueue.to_dict(job))
+
+    @staticmethod
+    def execute(job):
+        job_id = job.id
+        handler = HANDLERS.get(job.kind)
+        if handler is None:
+            job.attempts = job.max_attempts
+            JobQueue.fail(job, f"Tipo de trabajo desconocido: {job.kind}")
+            return
+        try:
+            result = handler(job, json.loads(job.payload or '{}'))
+        except Exception as e:
+            db.session.rollback()
+            JobQueue.fail(db.session.get(Job, job_id), f"{type(e).__name__}: {e}")
+        else:
+            JobQueue.complete(job, result)
+
+    @staticmethod
+    def requeue_stale(max_age_seconds):
+        """
+        Devuelve a la cola los trabajos 'running' de un worker que murió a medias. Los que ya
+        agotaron max_attempts quedan 'failed': un trabajo que tumba al worker no se reintenta para siempre.
+        """
+        cutoff = JobQueue._now() - timedelta(seconds=max_age_seconds)
+        stale = Job.query.filter(Job.status == 'running', Job.locked_at < cutoff).with_for_update(skip_locked=True).all()
+        failed = []
+        for job in stale:
+            job.locked_by = None
+            if job.attempts >= job.max_attempts:
+                job.status = 'failed'
+                job.error = job.error or 'El worker se detuvo sin terminar el trabajo'
+                failed.append(job)
+            else:
+                job.status = 'queued'
+        db.session.commit()
+        for job in failed:
+            JobQueue._emit(job, 'job_done', JobQueue.to_dict(job))
+        return len(stale)
+
+    @staticmethod
+    def purge(days):
+        """Borra trabajos terminados hace más de `days` días, con los archivos que dejaron (result['file'])."""
+        cutoff = JobQueue._now() - timedelta(days=days)
+        jobs = Job.query.filter(Job.status.in_(FINAL_STATUSES), Job.updated_at < cutoff).all()
+        upload_folder = current_app.config['UPLOAD_FOLDER']
+        for job in jobs:
+            result = json.loads(job.result) if job.result else None
+            if isinstance(result, dict) and result.get('file'):
+                path = os.path.join(upload_folder, result['file'])
+                if os.path.exists(path):
+                    os.remove(path)
+            db.session.delete(job)
+        db.session.commit()
+        return len(jobs)
+
+    @staticmethod
+    def run_worker(worker_id=None, poll_interval=None, once=False):
+        """Bucle del worker: reclama, ejecuta y duerme cuando no hay trabajo. once=True vacía la cola y sale."""
+        import services.job_handlers  # noqa: F401 -- registers the handlers
+
+        worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}"
+        poll_interval = poll_interval or current_app.config.get('JOB_POLL_INTERVAL', 1.0)
+        stale_seconds = current_app.config.get('JOB_STALE_SECONDS', 900)
+        last_sweep = 0.0
+        while True:
+            if time.monotonic() - last_sweep > 60:
+                JobQueue.requeue_stale(stale_seconds)
+                last_sweep = time.monotonic()
+
+            job = JobQueue.claim(worker_id)
+            if job is None:
+                db.session.remove()
+                if once:
+                    return
+                time.sleep(poll_interval)
+                continue
+
+            JobQueue.execute(job)
+            db.session.remove()
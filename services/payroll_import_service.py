@@ -0,0 +1,138 @@
+import os
+import unicodedata
+import numpy as np
+import pandas as pd
+from sqlalchemy import insert
+from models import db, PayrollDoc, User, get_bogota_time
+from services.payroll_service import PayrollService, FINANCIAL_FIELDS
+
+IMPORT_EXTENSIONS = {'.xlsx', '.csv'}
+
+# Encabezados alternativos aceptados en el registro (ya normalizados)
+COLUMN_ALIASES = {
+    'correo': 'email',
+    'salario': 'salario_base',
+    'auxilio': 'auxilio_transporte',
+    'dias': 'dias_injustificados',
+    'descuento_dias': 'valor_descuento_dias',
+    'salud': 'aporte_salud',
+    'pension': 'aporte_pension',
+    'otros': 'otros_descuentos',
+}
+
+# Columnas que, si faltan o vienen vacías, se derivan como en el formulario individual
+DERIVED_FIELDS = ('valor_descuento_dias', 'aporte_salud', 'aporte_pension')
+
+
+class PayrollImportError(Exception):
+    def __init__(self, message, errors=None):
+        super().__init__(message)
+        self.message = message
+        self.errors = errors or []
+
+
+def normalize_header(name) -> str:
+    text = unicodedata.normalize('NFKD', str(name)).encode('ascii', 'ignore').decode('ascii')
+    text = text.strip().lower().replace(' ', '_').replace('-', '_')
+    return COLUMN_ALIASES.get(text, text)
+
+
+class PayrollImportService:
+    """
+    Importa un registro de nómina (XLSX/CSV, una fila por empleado) de una sola vez:
+    validación con pandas, cálculo de totales por columnas y un solo INSERT masivo.
+    Los PDF no se generan aquí (filename queda en NULL hasta el render diferido).
+    """
+
+    @staticmethod
+    def read_register(file_storage) -> pd.DataFrame:
+        ext = os.path.splitext(file_storage.filename or '')[1].lower()
+        if ext not in IMPORT_EXTENSIONS:
+            raise PayrollImportError('El archivo debe ser .xlsx o .csv')
+        try:
+            if ext == '.xlsx':
+                df = pd.read_excel(file_storage.stream, engine='openpyxl', dtype=object)
+            else:
+                df = pd.read_csv(file_storage.stream, dtype=object, encoding='utf-8-sig', sep=None, engine='python')
+        except Exception as e:
+            raise PayrollImportError(f'No se pudo leer el archivo: {e}')
+        df.columns = [normalize_header(c) for c in df.columns]
+        return df.dropna(how='all')
+
+    @staticmethod
+    def validate(df: pd.DataFrame, mes: str, anio: int, periodo: str) -> pd.DataFrame:
+        """
+        Devuelve el DataFrame listo para insertar (user_id + FINANCIAL_FIELDS + neto_pagar) o lanza
+        PayrollImportError con la lista de errores por fila (número de fila como en la hoja).
+        """
+        if df.empty:
+            raise PayrollImportError('El archivo no tiene filas')
+        if 'email' not in df.columns and 'user_id' not in df.columns:
+            raise PayrollImportError('Falta la columna "email" (o "user_id") para identificar al empleado')
+        if 'salario_base' not in df.columns:
+            raise PayrollImportError('Falta la columna "salario_base"')
+
+        errors = []
+        sheet_row = pd.Series(df.index + 2, index=df.index)  # +1 encabezado, +1 base 1
+
+        def flag(mask, message):
+            for row in sheet_row[mask]:
+                errors.append({'fila': int(row), 'error': message})
+
+        # Empleado: por email (sin distinguir mayúsculas) o por id
+        employees = db.session.query(User.id, User.email).filter(User.rol != 'Admin').all()
+        if 'email' in df.columns:
+            by_email = {email.lower(): uid for uid, email in employees if email}
+            keys = df['email'].astype(str).str.strip().str.lower()
+            df['user_id'] = keys.map(by_email)
+            flag(df['user_id'].isna(), 'Empleado no encontrado')
+        else:
+            ids = pd.to_numeric(df['user_id'], errors='coerce')
+            df['user_id'] = ids.where(ids.isin([uid for uid, _ in employees]))
+            flag(df['user_id'].isna(), 'Empleado no encontrado')
+
+        # Números: vacíos -> 0, texto no numérico o negativos -> error
+        for field in FINANCIAL_FIELDS:
+            if field not in df.columns:
+                df[field] = np.nan if field in DERIVED_FIELDS else 0
+                continue
+            raw = df[field]
+            values = pd.to_numeric(raw, errors='coerce')
+            flag(values.isna() & raw.notna() & (raw.astype(str).str.strip() != ''), f'"{field}" no es un número')
+            flag(values < 0, f'"{field}" no puede ser negativo')
+            df[field] = values if field in DERIVED_FIELDS else values.fillna(0)
+        flag(df['salario_base'] <= 0, 'El salario base debe ser mayor que 0')
+        flag(df['dias_injustificados'] % 1 != 0, 'Los días injustificados deben ser un número entero')
+
+        # Derivados que faltan: salario/30 por día y aportes del 4% (igual que build_financial_data)
+        df['valor_descuento_dias'] = df['valor_descuento_dias'].fillna((df['salario_base'] / 30 * df['dias_injustificados']).round(2))
+        df['aporte_salud'] = df['aporte_salud'].fillna((df['salario_base'] * 0.04).round(2))
+        df['aporte_pension'] = df['aporte_pension'].fillna((df['salario_base'] * 0.04).round(2))
+
+        # Duplicados dentro del archivo y contra nóminas ya existentes del período
+        known = df['user_id'].notna()
+        flag(known & df['user_id'].duplicated(keep=False), 'El empleado aparece más de una vez')
+        existing = {uid for (uid,) in db.session.query(PayrollDoc.user_id).filter_by(mes=mes, anio=anio, periodo=periodo)}
+        flag(known & df['user_id'].isin(existing), 'Ya existe una nómina de este empleado para el período')
+
+        if errors:
+            errors.sort(key=lambda e: e['fila'])
+            raise PayrollImportError(f'{len(errors)} errores en el archivo; no se importó nada', errors)
+
+        df['user_id'] = df['user_id'].astype(int)
+        df['dias_injustificados'] = df['dias_injustificados'].astype(int)
+        _, _, df['neto_pagar'] = PayrollService.calculate_net_pay_many(df)
+        return df[['user_id', *FINANCIAL_FIELDS, 'neto_pagar']]
+
+    @staticmethod
+    def import_register(file_storage, mes: str, anio: int, periodo: str) -> int:
+        """Lee, valida e inserta todas las filas en una sola transacción. Devuelve cuántas nóminas creó."""
+        df = PayrollImportService.validate(PayrollImportService.read_register(file_storage), mes, anio, periodo)
+        now = get_bogota_time()
+        rows = [
+            {**record, 'mes': mes, 'anio': anio, 'periodo': periodo, 'filename': None, 'created_at': now}
+            for record in df.to_dict('records')
+        ]
+        db.session.execute(insert(PayrollDoc), rows)
+        db.session.commit()
+        return len(rows)
@@ -1,12 +1,261 @@
 from io import BytesIO
 from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from contextlib import contextmanager
+from collections import Counter
+import hashlib
+import json
+import multiprocessing
+import shutil
+import threading
+import time
+import zipfile
 import pytz
+from eventlet import tpool
 from flask import render_template, current_app
 from xhtml2pdf import pisa
-from models import db, PayrollDoc, User
+from pypdf import PdfReader, PdfWriter
+from pyhanko.keys import load_certs_from_pemder_data, load_private_key_from_pemder_data
+from pyhanko.pdf_utils.incremental_writer import IncrementalPdfFileWriter
+from pyhanko.pdf_utils.reader import PdfFileReader
+from pyhanko.sign import signers
+from pyhanko_certvalidator.registry import SimpleCertificateStore
+from models import db, PayrollDoc, User, get_bogota_time
+from services.blob_store import BlobStore
+from services.job_queue import JobQueue
 from werkzeug.utils import secure_filename
 import os
 
+# Campos de PayrollDoc que vienen del formulario / registro de nómina
+FINANCIAL_FIELDS = (
+    'salario_base', 'auxilio_transporte', 'bonificaciones', 'dias_injustificados',
+    'valor_descuento_dias', 'aporte_salud', 'aporte_pension', 'otros_descuentos'
+)
+
+MONTHS = ('Enero', 'Febrero', 'Marzo', 'Abril', 'Mayo', 'Junio', 'Julio', 'Agosto', 'Septiembre', 'Octubre', 'Noviembre', 'Diciembre')
+PERIODS = ('Primera Quincena', 'Segunda Quincena')
+
+PAYROLL_TEMPLATE = 'admin/pdf_template.html'
+# Campos del empleado que imprime la plantilla; cambiarlos invalida los PDF en caché
+PAYROLL_USER_FIELDS = ('nombre', 'cargo')
+# Trozo de lectura al copiar cada PDF dentro del ZIP del período
+BUNDLE_CHUNK = 64 * 1024
+# run_batch confirma y reporta los registros de a este número (progreso visible sin un commit por fila)
+BATCH_COMMIT_EVERY = 25
+# Un .lock de render más viejo que esto se considera abandonado (proceso muerto a medias)
+RENDER_LOCK_STALE_SECONDS = 120
+# evict_lru no borra lo usado hace menos de esto: la ruta puede estar recién devuelta y aún sin abrir
+EVICT_GRACE_SECONDS = 30
+
+SIGNATURE_FIELD = 'FirmaNomina'
+SIGNATURE_REASON = 'Desprendible de nómina'
+
+_template_version = None
+# Firmante del proceso de firma (uno por proceso del pool, ver _init_signer)
+_signer = None
+# Single-flight dentro del proceso: clave de caché -> [Lock, cuántos la esperan]
+_inflight = {}
+_inflight_guard = threading.Lock()
+
+# Estilos específicos para xhtml2pdf (movidos aquí para limpiar el linter del IDE)
+PDF_STYLES = """
+<style>
+@page {
+    size: letter;
+    margin: 2cm;
+    @frame footer_frame {
+        -pdf-frame-content: footerContent;
+        bottom: 1cm;
+        margin-left: 2cm;
+        margin-right: 2cm;
+        height: 1cm;
+    }
+}
+</style>
+"""
+
+
+def html_to_pdf(html_content: str) -> bytes | None:
+    pdf = BytesIO()
+    pisa_status = pisa.CreatePDF(BytesIO(html_content.encode('utf-8')), dest=pdf)
+    if pisa_status.err:
+        return None
+    return pdf.getvalue()
+
+
+def render_pdf_file(html_content: str, path: str) -> None:
+    """
+    Tarea del pool de procesos: solo pisa (CPU) y la escritura del archivo.
+    Recibe HTML ya renderizado para no necesitar contexto de Flask ni sesión de BD en el hijo.
+    """
+    pdf_content = html_to_pdf(html_content)
+    if not pdf_content:
+        raise RuntimeError('xhtml2pdf no pudo generar el PDF')
+    with open(path, 'wb') as f:
+        f.write(pdf_content)
+
+
+def _init_signer(material: dict) -> None:
+    """
+    Inicializador del pool de firma: arma el firmante (llave, certificado y cadena) una vez
+    por proceso, con los bytes que el padre leyó una sola vez para todo el lote.
+    """
+    global _signer
+    signing_key = load_private_key_from_pemder_data(material['key'], passphrase=material['passphrase'])
+    signing_cert = next(iter(load_certs_from_pemder_data(material['cert'])))
+    chain = list(load_certs_from_pemder_data(material['chain'])) if material['chain'] else []
+    _signer = signers.SimpleSigner(
+        signing_cert=signing_cert,
+        signing_key=signing_key,
+        cert_registry=SimpleCertificateStore.from_certs([signing_cert, *chain])
+    )
+
+
+def sign_pdf_file(path: str, signed_path: str) -> tuple[str, str]:
+    """
+    Tarea del pool de firma: agrega la firma como revisión incremental y la escribe en
+    `signed_path` (el original no se toca hasta que la BD apunta al firmado). Si `path` ya
+    trae la firma (un intento anterior lo firmó en sitio), no se vuelve a firmar.
+    Devuelve (ruta del PDF firmado, sha256).
+    """
+    with open(path, 'rb') as f:
+        source = f.read()
+    reader = PdfFileReader(BytesIO(source), strict=False)
+    if any(sig.field_name == SIGNATURE_FIELD for sig in reader.embedded_signatures):
+        return path, hashlib.sha256(source).hexdigest()
+
+    output = BytesIO()
+    signers.sign_pdf(
+        IncrementalPdfFileWriter(BytesIO(source), strict=False),
+        signers.PdfSignatureMetadata(field_name=SIGNATURE_FIELD, reason=SIGNATURE_REASON, md_algorithm='sha256'),
+        signer=_signer,
+        output=output
+    )
+    data = output.getvalue()
+    tmp_path = f"{signed_path}.signing"
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, signed_path)
+    return signed_path, hashlib.sha256(data).hexdigest()
+
+
+def merge_pdf_files(parts: list[tuple], path: str) -> None:
+    """
+    Une los PDF en uno solo con un marcador por parte. parts: [(ruta, título), ...]. Se abre
+    un PDF a la vez y sus páginas se copian al escritor antes de pasar al siguiente.
+    Sin Flask ni BD: corre en eventlet.tpool.
+    """
+    writer = PdfWriter()
+    for part_path, title in parts:
+        first_page = len(writer.pages)
+        with PdfReader(part_path) as reader:
+            for page in reader.pages:
+                writer.add_page(page)
+        writer.add_outline_item(title, first_page)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        writer.write(f)
+    os.replace(tmp_path, path)
+
+
+def evict_lru(directory: str, max_bytes: int, grace_seconds: float = EVICT_GRACE_SECONDS) -> int:
+    """
+    Borra los PDF menos usados (mtime) de `directory` hasta quedar bajo max_bytes. Devuelve
+    cuántos borró. Respeta los usados en los últimos `grace_seconds` aunque sobre espacio.
+    """
+    entries = []
+    total = 0
+    with os.scandir(directory) as it:
+        for entry in it:
+            if entry.is_file() and entry.name.endswith('.pdf'):
+                st = entry.stat()
+                entries.append((st.st_mtime, st.st_size, entry.path))
+                total += st.st_size
+    recent = time.time() - grace_seconds
+    removed = 0
+    for mtime, size, path in sorted(entries):
+        if total <= max_bytes or mtime > recent:
+            break
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        total -= size
+        removed += 1
+    return removed
+
+
+class _ZipStream:
+    """
+    Destino de zipfile sin tell/seek: así zipfile escribe cada entrada con descriptor de datos
+    y nunca vuelve atrás. Acumula lo escrito hasta que el generador lo entrega.
+    """
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self) -> bytes:
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+
+@contextmanager
+def _single_flight(key: str):
+    """Serializa a quienes piden la misma clave en este proceso; el primero renderiza, el resto espera."""
+    with _inflight_guard:
+        entry = _inflight.setdefault(key, [threading.Lock(), 0])
+        entry[1] += 1
+    try:
+        with entry[0]:
+            yield
+    finally:
+        with _inflight_guard:
+            entry[1] -= 1
+            if not entry[1]:
+                del _inflight[key]
+
+
+@contextmanager
+def _render_lock(path: str):
+    """
+    Lo mismo entre workers de gunicorn: un `<path>.lock` creado con O_EXCL. Quien no lo
+    obtiene espera a que aparezca el PDF (o a que el lock quede viejo). Sale sin el lock si
+    el PDF ya existe; el que entra debe volver a comprobarlo.
+    """
+    lock_path = f"{path}.lock"
+    while True:
+        try:
+            fd = os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            break
+        except FileExistsError:
+            if os.path.exists(path):
+                yield
+                return
+            try:
+                if time.time() - os.path.getmtime(lock_path) > RENDER_LOCK_STALE_SECONDS:
+                    os.remove(lock_path)
+                    continue
+            except FileNotFoundError:
+                continue
+            time.sleep(0.2)
+    try:
+        yield
+    finally:
+        os.close(fd)
+        try:
+            os.remove(lock_path)
+        except FileNotFoundError:
+            pass
+
+
 class PayrollService:
     @staticmethod
     def calculate_net_pay(
@@ -28,52 +277,47 @@ class PayrollService:
         return total_devengado, total_deducido, neto_pagar
 
     @staticmethod
-    def generate_payroll_pdf(context: dict) -> bytes | None:
+    def calculate_net_pay_many(df):
         """
-        Genera el PDF de la nómina usando xhtml2pdf.
+        Versión por arreglos de calculate_net_pay: las mismas sumas aplicadas a columnas
+        completas de un DataFrame. Devuelve (total_devengado, total_deducido, neto_pagar) como Series.
         """
-        # Estilos específicos para xhtml2pdf (movidos aquí para limpiar el linter del IDE)
-        pdf_styles = """
-        <style>
-        @page {
-            size: letter;
-            margin: 2cm;
-            @frame footer_frame {
-                -pdf-frame-content: footerContent;
-                bottom: 1cm;
-                margin-left: 2cm;
-                margin-right: 2cm;
-                height: 1cm;
-            }
-        }
-        </style>
-        """
-        context['pdf_styles'] = pdf_styles
-        html_content = render_template('admin/pdf_template.html', **context)
-        
-        pdf = BytesIO()
-        pisa_status = pisa.CreatePDF(BytesIO(html_content.encode('utf-8')), dest=pdf)
-        
-        if pisa_status.err:
-            return None
-        return pdf.getvalue()
+        return PayrollService.calculate_net_pay(
+            df['salario_base'],
+            df['auxilio_transporte'],
+            df['bonificaciones'],
+            df['valor_descuento_dias'],
+            df['aporte_salud'],
+            df['aporte_pension'],
+            df['otros_descuentos']
+        )
 
     @staticmethod
-    def create_payroll_record(
-        user_id: int,
-        mes: str,
-        anio: int,
-        periodo: str,
-        financial_data: dict
-    ) -> bool:
+    def build_financial_data(
+        salario_base: float,
+        auxilio_transporte: float = 0.0,
+        bonificaciones: float = 0.0,
+        dias_injustificados: int = 0,
+        otros_descuentos: float = 0.0
+    ) -> dict:
         """
-        Crea el registro de nómina en la base de datos y guarda el archivo PDF.
+        Completa los campos derivados igual que el formulario de nómina:
+        descuento por días = salario/30 por día y aportes de salud y pensión del 4% cada uno.
         """
-        user = User.query.get(user_id)
-        if not user:
-            return False
+        aporte = round(salario_base * 0.04, 2)
+        return {
+            'salario_base': salario_base,
+            'auxilio_transporte': auxilio_transporte,
+            'bonificaciones': bonificaciones,
+            'dias_injustificados': dias_injustificados,
+            'valor_descuento_dias': round(salario_base / 30 * dias_injustificados, 2),
+            'aporte_salud': aporte,
+            'aporte_pension': aporte,
+            'otros_descuentos': otros_descuentos
+        }
 
-        # Calculate totals
+    @staticmethod
+    def build_context(user, mes: str, anio: int, periodo: str, financial_data: dict, generated_at=None) -> dict:
         total_devengado, total_deducido, neto_pagar = PayrollService.calculate_net_pay(
             financial_data['salario_base'],
             financial_data['auxilio_transporte'],
@@ -83,9 +327,7 @@ class PayrollService:
             financial_data['aporte_pension'],
             financial_data['otros_descuentos']
         )
-
-        # Prepare context for PDF
-        context = {
+        return {
             'user': user,
             'mes': mes,
             'anio': anio,
@@ -94,22 +336,69 @@ class PayrollService:
             'total_devengado': total_devengado,
             'total_deducido': total_deducido,
             'neto_pagar': neto_pagar,
-            'generated_at': datetime.now(pytz.timezone('America/Bogota'))
+            'generated_at': generated_at or datetime.now(pytz.timezone('America/Bogota'))
         }
 
-        # Generate PDF
-        pdf_content = PayrollService.generate_payroll_pdf(context)
-        if not pdf_content:
-            return False
-
-        # Save PDF File
+    @staticmethod
+    def payroll_filename(user_id: int, mes: str, periodo: str, anio: int) -> str:
         periodo_slug = "Q1" if periodo == "Primera Quincena" else "Q2"
-        filename = secure_filename(f"payroll_{user_id}_{mes}_{periodo_slug}_{anio}_{int(datetime.now().timestamp())}.pdf")
+        return secure_filename(f"payroll_{user_id}_{mes}_{periodo_slug}_{anio}_{int(datetime.now().timestamp())}.pdf")
+
+    @staticmethod
+    def payroll_dir() -> str:
         save_path = os.path.join(current_app.config['UPLOAD_FOLDER'], 'payrolls')
         os.makedirs(save_path, exist_ok=True)
-        
-        with open(os.path.join(save_path, filename), 'wb') as f:
-            f.write(pdf_content)
+        return save_path
+
+    @staticmethod
+    def render_payroll_html(context: dict) -> str:
+        context['pdf_styles'] = PDF_STYLES
+        return render_template(PAYROLL_TEMPLATE, **context)
+
+    @staticmethod
+    def generate_payroll_pdf(context: dict) -> bytes | None:
+        """
+        Genera el PDF de la nómina usando xhtml2pdf.
+        """
+        return html_to_pdf(PayrollService.render_payroll_html(context))
+
+    @staticmethod
+    def existing_user_ids(mes: str, anio: int, periodo: str, user_ids=None) -> set:
+        """Empleados (de user_ids, o todos) que ya tienen nómina para el período."""
+        query = db.session.query(PayrollDoc.user_id).filter_by(mes=mes, anio=anio, periodo=periodo)
+        if user_ids is not None:
+            query = query.filter(PayrollDoc.user_id.in_(list(user_ids)))
+        return {user_id for (user_id,) in query}
+
+    @staticmethod
+    def create_payroll_record(
+        user_id: int,
+        mes: str,
+        anio: int,
+        periodo: str,
+        financial_data: dict
+    ) -> bool:
+        """
+        Crea el registro de nómina en la base de datos y guarda el archivo PDF.
+        """
+        user = User.query.get(user_id)
+        if not user:
+            return False
+
+        context = PayrollService.build_context(user, mes, anio, periodo, financial_data)
+
+        filename = None
+        if not PayrollService.lazy_render():
+            # Generate PDF
+            pdf_content = PayrollService.generate_payroll_pdf(context)
+            if not pdf_content:
+                return False
+
+            # Save PDF File
+            filename = PayrollService.payroll_filename(user_id, mes, periodo, anio)
+            with open(os.path.join(PayrollService.payroll_dir(), filename), 'wb') as f:
+                f.write(pdf_content)
+            BlobStore.ingest('payroll', filename)
 
         # Save to DB
         new_payroll = PayrollDoc(
@@ -119,9 +408,551 @@ class PayrollService:
             periodo=periodo,
             filename=filename,
             **financial_data,
-            neto_pagar=neto_pagar
+            neto_pagar=context['neto_pagar']
         )
         db.session.add(new_payroll)
         db.session.commit()
         
         return True
+
+    @staticmethod
+    def render_many(items: list[tuple], max_workers: int | None = None):
+        """
+        Genera muchos PDF en un ProcessPoolExecutor. items: [(key, html, filename), ...].
+        Produce (key, None) o (key, error) a medida que terminan; los que salen bien ya
+        quedan guardados en payrolls/. Registrarlos en el almacén de blobs queda para
+        después del commit de sus registros (ver ingest_rendered).
+        """
+        if not items:
+            return
+        save_path = PayrollService.payroll_dir()
+        workers = max_workers or current_app.config.get('PAYROLL_WORKERS') or os.cpu_count()
+        # spawn: los hijos no heredan el hub de eventlet ni las conexiones de BD del padre
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn')) as pool:
+            futures = {
+                pool.submit(render_pdf_file, html, os.path.join(save_path, filename)): key
+                for key, html, filename in items
+            }
+            for future in as_completed(futures):
+                key = futures[future]
+                try:
+                    future.result()
+                except Exception as e:
+                    yield key, str(e)
+                    continue
+                yield key, None
+
+    @staticmethod
+    def commit_rendered(filenames: list[str]) -> None:
+        """
+        Commit de los registros que apuntan a PDF recién generados. Si falla, los PDF se
+        borran (nadie los referencia) y el error sigue; si sale bien, se registran en el
+        almacén de blobs.
+        """
+        try:
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            save_path = PayrollService.payroll_dir()
+            for filename in filenames:
+                try:
+                    os.remove(os.path.join(save_path, filename))
+                except FileNotFoundError:
+                    pass
+            raise
+        for filename in filenames:
+            BlobStore.ingest('payroll', filename)
+        db.session.commit()
+
+    @staticmethod
+    def run_batch(mes: str, anio: int, periodo: str, rows: list[dict], progress=None, max_workers: int | None = None) -> dict:
+        """
+        Nómina de muchos empleados a la vez. rows: [{'user_id': ..., **financial_data}, ...].
+
+        El HTML se renderiza aquí (Jinja, rápido) y pisa corre en un ProcessPoolExecutor,
+        así el worker web no se congela mientras se generan los PDF. Los PayrollDoc de los
+        que salieron bien se guardan de a BATCH_COMMIT_EVERY y cada grupo se reporta como
+        correcto solo después de su commit (si un grupo falla, sus filas quedan como error y
+        sus PDF se borran). Un empleado repetido en rows se rechaza en todas sus filas, y
+        también el que ya tiene nómina del período (igual que la importación).
+        En modo 'lazy' (PAYROLL_RENDER_MODE) no se genera ningún PDF: solo los registros.
+        progress(user_id, ok, error, done, total) se llama por cada empleado terminado.
+        Returns: {'total', 'ok': [user_id, ...], 'failed': [{'user_id', 'error'}, ...]}
+        """
+        total = len(rows)
+        result = {'total': total, 'ok': [], 'failed': []}
+        done = 0
+
+        def report(user_id, error=None):
+            nonlocal done
+            done += 1
+            if error:
+                result['failed'].append({'user_id': user_id, 'error': error})
+            else:
+                result['ok'].append(user_id)
+            if progress:
+                progress(user_id, error is None, error, done, total)
+
+        user_ids = [row['user_id'] for row in rows]
+        counts = Counter(user_ids)
+        users = {u.id: u for u in User.query.filter(User.id.in_(user_ids)).all()}
+        existing = PayrollService.existing_user_ids(mes, anio, periodo, user_ids)
+
+        lazy = PayrollService.lazy_render()
+        jobs = []
+        for row in rows:
+            if counts[row['user_id']] > 1:
+                report(row['user_id'], 'El empleado aparece más de una vez en el lote')
+                continue
+            if row['user_id'] in existing:
+                report(row['user_id'], 'Ya existe una nómina de este empleado para el período')
+                continue
+            user = users.get(row['user_id'])
+            if user is None:
+                report(row['user_id'], 'Empleado no encontrado')
+                continue
+            financial_data = {k: v for k, v in row.items() if k != 'user_id'}
+            context = PayrollService.build_context(user, mes, anio, periodo, financial_data)
+            if lazy:
+                # Solo el registro; el PDF se genera en su primera descarga
+                jobs.append((user.id, None, financial_data, context['neto_pagar'], None))
+                continue
+            filename = PayrollService.payroll_filename(user.id, mes, periodo, anio)
+            jobs.append((user.id, filename, financial_data, context['neto_pagar'], PayrollService.render_payroll_html(context)))
+
+        if lazy:
+            rendered = ((user_id, None) for user_id, _, _, _, _ in jobs)
+        else:
+            rendered = PayrollService.render_many(
+                [(user_id, html, filename) for user_id, filename, _, _, html in jobs], max_workers
+            )
+        details = {user_id: (filename, financial_data, neto) for user_id, filename, financial_data, neto, _ in jobs}
+        # Docs stay out of the session until their chunk is committed: progress() commits too
+        pending = []
+
+        def flush():
+            if not pending:
+                return
+            db.session.add_all(pending)
+            try:
+                PayrollService.commit_rendered([doc.filename for doc in pending if doc.filename])
+            except Exception as e:
+                for doc in pending:
+                    report(doc.user_id, f"No se pudo guardar: {e}")
+            else:
+                for doc in pending:
+                    report(doc.user_id)
+            pending.clear()
+
+        for user_id, error in rendered:
+            if error:
+                report(user_id, error)
+                continue
+            filename, financial_data, neto = details[user_id]
+            pending.append(PayrollDoc(
+                user_id=user_id,
+                mes=mes,
+                anio=anio,
+                periodo=periodo,
+                filename=filename,
+                **financial_data,
+                neto_pagar=neto
+            ))
+            if len(pending) >= BATCH_COMMIT_EVERY:
+                flush()
+        flush()
+        return result
+
+    @staticmethod
+    def enqueue_payroll(user_id: int, mes: str, anio: int, periodo: str, financial_data: dict, requested_by: int | None = None):
+        """Encola create_payroll_record para el worker de trabajos y devuelve el Job de inmediato."""
+        return JobQueue.enqueue('payroll', {
+            'user_id': user_id, 'mes': mes, 'anio': anio, 'periodo': periodo, 'financial_data': financial_data
+        }, user_id=requested_by)
+
+    @staticmethod
+    def enqueue_batch(mes: str, anio: int, periodo: str, rows: list[dict], requested_by: int | None = None):
+        """
+        Encola run_batch. Un solo intento: un reintento volvería a generar los PDF de los
+        que ya salieron bien; se relanza a mano con los que fallaron.
+        """
+        return JobQueue.enqueue('payroll_batch', {
+            'mes': mes, 'anio': anio, 'periodo': periodo, 'rows': rows
+        }, user_id=requested_by, max_attempts=1)
+
+    @staticmethod
+    def render_pending(mes: str, anio: int, periodo: str, progress=None, max_workers: int | None = None) -> dict:
+        """
+        Genera los PDF de las nóminas del período que aún no tienen archivo (importadas en bloque).
+        Los nombres de archivo se guardan con un solo commit al final.
+        """
+        docs = PayrollDoc.query.filter_by(mes=mes, anio=anio, periodo=periodo, filename=None).all()
+        users = {u.id: u for u in User.query.filter(User.id.in_({d.user_id for d in docs})).all()}
+        total = len(docs)
+        result = {'total': total, 'ok': [], 'failed': []}
+
+        items = []
+        filenames = {}
+        for doc in docs:
+            financial_data = {field: getattr(doc, field) for field in FINANCIAL_FIELDS}
+            context = PayrollService.build_context(users[doc.user_id], mes, anio, periodo, financial_data)
+            filenames[doc.id] = PayrollService.payroll_filename(doc.user_id, mes, periodo, anio)
+            items.append((doc.id, PayrollService.render_payroll_html(context), filenames[doc.id]))
+
+        by_id = {doc.id: doc for doc in docs}
+        done = 0
+        rendered = []
+        for doc_id, error in PayrollService.render_many(items, max_workers):
+            doc = by_id[doc_id]
+            if error:
+                done += 1
+                result['failed'].append({'user_id': doc.user_id, 'error': error})
+                if progress:
+                    progress(doc.user_id, False, error, done, total)
+                continue
+            doc.filename = filenames[doc_id]
+            rendered.append(doc)
+
+        PayrollService.commit_rendered([doc.filename for doc in rendered])
+        for doc in rendered:
+            done += 1
+            result['ok'].append(doc.user_id)
+            if progress:
+                progress(doc.user_id, True, None, done, total)
+        return result
+
+    @staticmethod
+    def enqueue_render_pending(mes: str, anio: int, periodo: str, requested_by: int | None = None):
+        """Encola render_pending; reintentar es seguro porque solo toma las que siguen sin archivo."""
+        return JobQueue.enqueue('payroll_render', {
+            'mes': mes, 'anio': anio, 'periodo': periodo
+        }, user_id=requested_by)
+
+    # --- Render on demand ---
+
+    @staticmethod
+    def lazy_render() -> bool:
+        """PAYROLL_RENDER_MODE='lazy': PayrollDoc es la fuente de verdad y el PDF se genera al descargarlo."""
+        return current_app.config.get('PAYROLL_RENDER_MODE') == 'lazy'
+
+    @staticmethod
+    def template_version() -> str:
+        """Hash del código de la plantilla del PDF (cambiarla invalida los PDF en caché)."""
+        global _template_version
+        if _template_version is None:
+            source, _, _ = current_app.jinja_env.loader.get_source(current_app.jinja_env, PAYROLL_TEMPLATE)
+            _template_version = hashlib.sha256(source.encode('utf-8')).hexdigest()[:16]
+        return _template_version
+
+    @staticmethod
+    def user_version(user) -> str:
+        """Huella de los campos del empleado que imprime el PDF más la versión de la plantilla."""
+        fields = {name: str(getattr(user, name)) for name in PAYROLL_USER_FIELDS}
+        raw = json.dumps({'fields': fields, 'template': PayrollService.template_version()}, sort_keys=True)
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()[:16]
+
+    @staticmethod
+    def cache_dir() -> str:
+        path = current_app.config['PAYROLL_CACHE_FOLDER']
+        os.makedirs(path, exist_ok=True)
+        return path
+
+    @staticmethod
+    def purge_legacy_cache() -> bool:
+        """Borra la caché antigua en static/uploads/payroll_cache (servida sin autenticación)."""
+        legacy = os.path.join(current_app.config['UPLOAD_FOLDER'], 'payroll_cache')
+        if not os.path.isdir(legacy):
+            return False
+        shutil.rmtree(legacy)
+        return True
+
+    @staticmethod
+    def cache_path(doc, user) -> str:
+        return os.path.join(PayrollService.cache_dir(), f"{doc.id}_{PayrollService.user_version(user)}.pdf")
+
+    @staticmethod
+    def stored_path(doc) -> str | None:
+        """Archivo generado al crear la nómina (modo 'eager' o anterior al modo 'lazy'), si existe."""
+        if not doc.filename:
+            return None
+        path = os.path.join(current_app.config['UPLOAD_FOLDER'], 'payrolls', doc.filename)
+        return path if os.path.exists(path) else None
+
+    @staticmethod
+    def download_name(doc) -> str:
+        if doc.filename:
+            return doc.filename
+        periodo_slug = "Q1" if doc.periodo == "Primera Quincena" else "Q2"
+        return secure_filename(f"nomina_{doc.mes}_{periodo_slug}_{doc.anio}.pdf")
+
+    @staticmethod
+    def render_doc_html(doc, user) -> str:
+        """HTML del PDF con lo guardado en PayrollDoc (fecha de generación = creación del registro)."""
+        financial_data = {field: getattr(doc, field) for field in FINANCIAL_FIELDS}
+        context = PayrollService.build_context(
+            user, doc.mes, doc.anio, doc.periodo, financial_data, generated_at=doc.created_at
+        )
+        return PayrollService.render_payroll_html(context)
+
+    @staticmethod
+    def pdf_path(doc) -> str:
+        """
+        Ruta del PDF de la nómina para descargar. Los archivos guardados al crearla cuentan
+        como entradas ya calientes; si no hay, sale de la caché de render (LRU por mtime,
+        acotada a PAYROLL_CACHE_MAX_BYTES) y, si tampoco está, se genera una sola vez aunque
+        lleguen varias descargas a la vez (en este proceso y entre workers). La clave incluye
+        nombre y cargo del empleado, que la plantilla imprime. pisa corre en eventlet.tpool
+        para no detener el hub del worker web mientras tanto.
+        """
+        stored = PayrollService.stored_path(doc)
+        if stored:
+            return stored
+
+        user = db.session.get(User, doc.user_id)
+        path = PayrollService.cache_path(doc, user)
+        try:
+            os.utime(path)
+            return path
+        except FileNotFoundError:
+            pass
+
+        with _single_flight(path), _render_lock(path):
+            if not os.path.exists(path):
+                html_content = PayrollService.render_doc_html(doc, user)
+                tmp_path = f"{path}.tmp"
+                tpool.execute(render_pdf_file, html_content, tmp_path)
+                os.replace(tmp_path, path)
+                evict_lru(PayrollService.cache_dir(), current_app.config['PAYROLL_CACHE_MAX_BYTES'])
+        return path
+
+    # --- Period bundle ---
+
+    @staticmethod
+    def period_docs(mes: str, anio: int, periodo: str):
+        return db.session.query(PayrollDoc, User.nombre).join(User, User.id == PayrollDoc.user_id).filter(
+            PayrollDoc.mes == mes,
+            PayrollDoc.anio == anio,
+            PayrollDoc.periodo == periodo
+        ).order_by(User.nombre, PayrollDoc.id)
+
+    @staticmethod
+    def bundle_name(mes: str, anio: int, periodo: str) -> str:
+        periodo_slug = "Q1" if periodo == "Primera Quincena" else "Q2"
+        return secure_filename(f"nominas_{mes}_{periodo_slug}_{anio}.zip")
+
+    @staticmethod
+    def iter_bundle(mes: str, anio: int, periodo: str):
+        """
+        ZIP con todos los PDF del período, generado mientras se envía. Las entradas van sin
+        comprimir (ZIP_STORED; los PDF ya vienen comprimidos) y cada trozo leído sale de
+        inmediato, así la memoria no crece con el tamaño del archivo (solo el directorio
+        central, unos bytes por PDF). Los PDF se toman de PayrollService.pdf_path.
+        """
+        stream = _ZipStream()
+        with zipfile.ZipFile(stream, 'w', compression=zipfile.ZIP_STORED) as zf:
+            for doc, nombre in PayrollService.period_docs(mes, anio, periodo).yield_per(200):
+                try:
+                    path = PayrollService.pdf_path(doc)
+                except Exception:
+                    current_app.logger.exception("Payroll bundle: doc %s skipped", doc.id)
+                    continue
+                info = zipfile.ZipInfo(
+                    secure_filename(f"{nombre}_{doc.id}.pdf"),
+                    date_time=(doc.created_at or datetime.now()).timetuple()[:6]
+                )
+                info.compress_type = zipfile.ZIP_STORED
+                info.file_size = os.path.getsize(path)
+                with open(path, 'rb') as src, zf.open(info, 'w') as dest:
+                    while True:
+                        chunk = src.read(BUNDLE_CHUNK)
+                        if not chunk:
+                            break
+                        dest.write(chunk)
+                        yield stream.drain()
+                yield stream.drain()
+        yield stream.drain()
+
+    # --- Yearly statement ---
+
+    @staticmethod
+    def period_order(doc) -> tuple:
+        month = MONTHS.index(doc.mes) if doc.mes in MONTHS else len(MONTHS)
+        period = PERIODS.index(doc.periodo) if doc.periodo in PERIODS else len(PERIODS)
+        return month, period, doc.id
+
+    @staticmethod
+    def statement_path(user, anio: int, docs: list) -> str:
+        """
+        Ruta en caché del consolidado; cambia cuando aparece una nómina nueva (cantidad e id
+        máximo), se firma una o cambian los datos del empleado que imprimen los PDF.
+        """
+        signed = sum(1 for doc in docs if doc.signature_digest)
+        version = f"{len(docs)}_{max(doc.id for doc in docs)}_{signed}_{PayrollService.user_version(user)}"
+        return os.path.join(PayrollService.cache_dir(), f"statement_{user.id}_{anio}_{version}.pdf")
+
+    @staticmethod
+    def statement_download_name(user, anio: int) -> str:
+        return secure_filename(f"nominas_{user.nombre}_{anio}.pdf")
+
+    @staticmethod
+    def build_statement(docs: list, path: str) -> None:
+        """Une los PDF del año con un marcador por período; la unión (pypdf) corre en eventlet.tpool."""
+        parts = [(PayrollService.pdf_path(doc), f"{doc.mes} - {doc.periodo}") for doc in docs]
+        tpool.execute(merge_pdf_files, parts, path)
+
+    @staticmethod
+    def statement(user_id: int, anio: int) -> str | None:
+        """
+        PDF con todas las nóminas del empleado en el año, en orden de período, o None si no hay.
+        Queda en la caché de render hasta que aparece una nómina nueva de ese año (y las
+        versiones anteriores se borran al generar la nueva).
+        """
+        docs = sorted(PayrollDoc.query.filter_by(user_id=user_id, anio=anio).all(), key=PayrollService.period_order)
+        if not docs:
+            return None
+
+        path = PayrollService.statement_path(db.session.get(User, user_id), anio, docs)
+        try:
+            os.utime(path)
+            return path
+        except FileNotFoundError:
+            pass
+
+        with _single_flight(path), _render_lock(path):
+            if not os.path.exists(path):
+                PayrollService.build_statement(docs, path)
+                prefix = f"statement_{user_id}_{anio}_"
+                with os.scandir(PayrollService.cache_dir()) as it:
+                    stale = [e.path for e in it if e.name.startswith(prefix) and e.name.endswith('.pdf') and e.path != path]
+                for old in stale:
+                    try:
+                        os.remove(old)
+                    except FileNotFoundError:
+                        pass
+                evict_lru(PayrollService.cache_dir(), current_app.config['PAYROLL_CACHE_MAX_BYTES'])
+        return path
+
+    # --- Digital signature ---
+
+    @staticmethod
+    def signing_material() -> dict:
+        """Lee una sola vez por lote la llave, el certificado y la cadena configurados (PAYROLL_SIGNING_*)."""
+        config = current_app.config
+        if not config.get('PAYROLL_SIGNING_KEY') or not config.get('PAYROLL_SIGNING_CERT'):
+            raise RuntimeError('La firma de nóminas no está configurada (PAYROLL_SIGNING_KEY y PAYROLL_SIGNING_CERT)')
+
+        def read(path):
+            with open(path, 'rb') as f:
+                return f.read()
+
+        passphrase = config.get('PAYROLL_SIGNING_PASSPHRASE')
+        return {
+            'key': read(config['PAYROLL_SIGNING_KEY']),
+            'cert': read(config['PAYROLL_SIGNING_CERT']),
+            'chain': read(config['PAYROLL_SIGNING_CHAIN']) if config.get('PAYROLL_SIGNING_CHAIN') else None,
+            'passphrase': passphrase.encode('utf-8') if passphrase else None
+        }
+
+    @staticmethod
+    def signed_filename(filename: str) -> str:
+        """Nombre del PDF firmado; fijo por archivo, así un reintento sobrescribe el del intento fallido."""
+        root, ext = os.path.splitext(filename)
+        return f"{root}_firmada{ext}"
+
+    @staticmethod
+    def sign_many(items: list[tuple], material: dict, max_workers: int | None = None):
+        """
+        Firma muchos PDF de payrolls/ en un ProcessPoolExecutor. items: [(key, filename), ...].
+        El firmante se arma en el inicializador de cada proceso, no por documento.
+        Produce (key, nombre del firmado, sha256, None) o (key, None, None, error). Ni la BD
+        ni el almacén de blobs cambian aquí.
+        """
+        if not items:
+            return
+        save_path = PayrollService.payroll_dir()
+        workers = max_workers or current_app.config.get('PAYROLL_WORKERS') or os.cpu_count()
+        workers = min(workers, len(items))
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=_init_signer,
+            initargs=(material,)
+        ) as pool:
+            futures = {
+                pool.submit(
+                    sign_pdf_file,
+                    os.path.join(save_path, filename),
+                    os.path.join(save_path, PayrollService.signed_filename(filename))
+                ): key
+                for key, filename in items
+            }
+            for future in as_completed(futures):
+                key = futures[future]
+                try:
+                    signed_path, digest = future.result()
+                except Exception as e:
+                    yield key, None, None, str(e)
+                    continue
+                yield key, os.path.basename(signed_path), digest, None
+
+    @staticmethod
+    def sign_period(mes: str, anio: int, periodo: str, progress=None, max_workers: int | None = None) -> dict:
+        """
+        Firma las nóminas del período que aún no están firmadas. Las que no tienen archivo
+        (importadas o modo 'lazy') se generan antes, porque la firma se guarda en el PDF de
+        payrolls/, que después sirven download_payroll, el ZIP y el consolidado anual.
+        Cada firmada se confirma por separado: PayrollDoc pasa al archivo nuevo con su sha256
+        en un mismo commit y solo después se libera el original. Un reintento tras una caída
+        retoma las que siguen sin firma (sign_pdf_file reconoce las ya firmadas en sitio).
+        Returns: {'total', 'ok': [user_id, ...], 'failed': [{'user_id', 'error'}, ...]}
+        """
+        material = PayrollService.signing_material()
+        PayrollService.render_pending(mes, anio, periodo, max_workers=max_workers)
+
+        docs = PayrollDoc.query.filter(
+            PayrollDoc.mes == mes,
+            PayrollDoc.anio == anio,
+            PayrollDoc.periodo == periodo,
+            PayrollDoc.filename.isnot(None),
+            PayrollDoc.signature_digest.is_(None)
+        ).all()
+        by_id = {doc.id: doc for doc in docs}
+        total = len(docs)
+        result = {'total': total, 'ok': [], 'failed': []}
+        now = get_bogota_time().replace(tzinfo=None)
+
+        done = 0
+        items = [(doc.id, doc.filename) for doc in docs]
+        for doc_id, signed, digest, error in PayrollService.sign_many(items, material, max_workers):
+            done += 1
+            doc = by_id[doc_id]
+            if not error:
+                original = doc.filename
+                try:
+                    BlobStore.ingest('payroll', signed, sha256=digest)
+                    doc.filename = signed
+                    doc.signature_digest = digest
+                    doc.signed_at = now
+                    db.session.commit()
+                except Exception as e:
+                    db.session.rollback()
+                    error = f"{type(e).__name__}: {e}"
+                else:
+                    if signed != original:
+                        BlobStore.release('payroll', original)
+                        db.session.commit()
+            if error:
+                result['failed'].append({'user_id': doc.user_id, 'error': error})
+            else:
+                result['ok'].append(doc.user_id)
+            if progress:
+                progress(doc.user_id, error is None, error, done, total)
+
+        return result
+
+    @staticmethod
+    def enqueue_sign(mes: str, anio: int, periodo: str, requested_by: int | None = None):
+        """Encola sign_period; reintentar es seguro porque solo toma las que siguen sin firma."""
+        return JobQueue.enqueue('payroll_sign', {
+            'mes': mes, 'anio': anio, 'periodo': periodo
+        }, user_id=requested_by)
@@ -0,0 +1,313 @@
+import socket
+import threading
+import time
+from datetime import timedelta
+from sqlalchemy import func, or_
+from models import db, PresenceConnection, VideoParticipant, VideoRoom, get_bogota_time
+from services.sql_utils import dialect_insert
+
+
+class MemoryPresenceBackend:
+    """
+    Registro en memoria del proceso. Sirve para un solo worker y como
+    sustituto local en desarrollo.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._connections = {}  # user_id -> set(sid)
+        # Call sessions: both directions so a disconnect only touches the sid's own rooms
+        self._video_rooms = {}  # room_id -> {sid: user_id}
+        self._sid_rooms = {}  # sid -> set(room_id)
+        self._room_activity = {}  # room_id -> last join/leave (monotonic)
+
+    def add_connection(self, user_id, sid):
+        with self._lock:
+            sids = self._connections.setdefault(user_id, set())
+            was_offline = not sids
+            sids.add(sid)
+            return was_offline
+
+    def remove_connection(self, user_id, sid):
+        with self._lock:
+            sids = self._connections.get(user_id)
+            if not sids:
+                return False
+            sids.discard(sid)
+            if not sids:
+                del self._connections[user_id]
+                return True
+            return False
+
+    def online_user_ids(self):
+        with self._lock:
+            return list(self._connections.keys())
+
+    def join_video_room(self, room_id, sid, user_id, max_participants):
+        """Cupo verificado y registro en un solo paso bajo el lock. None si la sala está llena."""
+        with self._lock:
+            members = self._video_rooms.get(room_id, {})
+            if sid not in members and len(members) >= max_participants:
+                return None
+            self._video_rooms[room_id] = members
+            members[sid] = user_id
+            self._sid_rooms.setdefault(sid, set()).add(room_id)
+            self._room_activity[room_id] = time.monotonic()
+            return [peer for peer in members if peer != sid]
+
+    def _remove_from_room(self, room_id, sid):
+        members = self._video_rooms.get(room_id)
+        if members is None or sid not in members:
+            return False
+        del members[sid]
+        self._room_activity[room_id] = time.monotonic()
+        if not members:
+            del self._video_rooms[room_id]
+            self._room_activity.pop(room_id, None)
+        rooms = self._sid_rooms.get(sid)
+        if rooms is not None:
+            rooms.discard(room_id)
+            if not rooms:
+                del self._sid_rooms[sid]
+        return True
+
+    def leave_video_room(self, room_id, sid):
+        with self._lock:
+            return self._remove_from_room(room_id, sid)
+
+    def leave_all_video_rooms(self, sid):
+        """O(salas del socket): usa el índice inverso sid -> salas."""
+        with self._lock:
+            left = []
+            for room_id in list(self._sid_rooms.get(sid, ())):
+                if self._remove_from_room(room_id, sid):
+                    left.append(room_id)
+            return left
+
+    def room_occupancy(self):
+        with self._lock:
+            return {room_id: len(members) for room_id, members in self._video_rooms.items()}
+
+    def heartbeat(self, ttl_seconds):
+        """Sin filas compartidas que expirar: los sockets mueren con el proceso."""
+        return []
+
+    def expire_video_rooms(self, max_idle_seconds):
+        """Cierra salas sin altas ni bajas durante max_idle_seconds (sockets que murieron sin desconectar)."""
+        cutoff = time.monotonic() - max_idle_seconds
+        with self._lock:
+            expired = [room_id for room_id, last in self._room_activity.items() if last < cutoff]
+            for room_id in expired:
+                for sid in list(self._video_rooms.get(room_id, {})):
+                    self._remove_from_room(room_id, sid)
+                self._video_rooms.pop(room_id, None)
+                self._room_activity.pop(room_id, None)
+            return expired
+
+
+class SqlPresenceBackend:
+    """
+    Registro compartido en tablas SQL, visible para todos los workers y
+    nodos que usan la misma base de datos.
+    """
+
+    def __init__(self, node_id=None):
+        # Identifies this host so its rows can be purged after a restart. A recreated container
+        # gets a new hostname, so the rows of the old one are left to expire by heartbeat
+        self.node_id = node_id or socket.gethostname()
+
+    def add_connection(self, user_id, sid):
+        was_offline = not db.session.query(PresenceConnection.query.filter_by(user_id=user_id).exists()).scalar()
+        now = get_bogota_time()
+        db.session.merge(PresenceConnection(sid=sid, user_id=user_id, node_id=self.node_id, connected_at=now, last_seen=now))
+        db.session.commit()
+        return was_offline
+
+    def remove_connection(self, user_id, sid):
+        PresenceConnection.query.filter_by(sid=sid).delete()
+        db.session.commit()
+        return not db.session.query(PresenceConnection.query.filter_by(user_id=user_id).exists()).scalar()
+
+    def online_user_ids(self):
+        return [uid for (uid,) in db.session.query(PresenceConnection.user_id).distinct().all()]
+
+    def _touch_room(self, room_id):
+        """Upsert de la fila de la sala; bloquea la sala hasta el commit (serializa los ingresos)."""
+        now = get_bogota_time()
+        stmt = dialect_insert(VideoRoom)
+        if stmt is not None:
+            stmt = stmt.values(room_id=room_id, last_activity=now)
+            stmt = stmt.on_conflict_do_update(index_elements=['room_id'], set_={'last_activity': now})
+            db.session.execute(stmt)
+        else:
+            db.session.merge(VideoRoom(room_id=room_id, last_activity=now))
+        VideoRoom.query.filter_by(room_id=room_id).with_for_update().one()
+
+    def join_video_room(self, room_id, sid, user_id, max_participants):
+        self._touch_room(room_id)
+        members = VideoParticipant.query.filter_by(room_id=room_id).all()
+        if sid not in {m.sid for m in members} and len(members) >= max_participants:
+            db.session.rollback()
+            return None
+        db.session.merge(VideoParticipant(room_id=room_id, sid=sid, user_id=user_id, joined_at=get_bogota_time()))
+        db.session.commit()
+        return [m.sid for m in members if m.sid != sid]
+
+    def _drop_empty_rooms(self, room_ids):
+        for room_id in room_ids:
+            if not db.session.query(VideoParticipant.query.filter_by(room_id=room_id).exists()).scalar():
+                VideoRoom.query.filter_by(room_id=room_id).delete()
+
+    def leave_video_room(self, room_id, sid):
+        deleted = VideoParticipant.query.filter_by(room_id=room_id, sid=sid).delete()
+        if deleted:
+            VideoRoom.query.filter_by(room_id=room_id).update({'last_activity': get_bogota_time()})
+            self._drop_empty_rooms([room_id])
+        db.session.commit()
+        return deleted > 0
+
+    def leave_all_video_rooms(self, sid):
+        # Index lookup on video_participant.sid: proportional to the socket's own rooms
+        room_ids = [room_id for (room_id,) in db.session.query(VideoParticipant.room_id).filter_by(sid=sid).all()]
+        if room_ids:
+            VideoParticipant.query.filter_by(sid=sid).delete()
+            self._drop_empty_rooms(room_ids)
+            db.session.commit()
+        return room_ids
+
+    def room_occupancy(self):
+        rows = db.session.query(VideoParticipant.room_id, func.count(VideoParticipant.sid)).group_by(VideoParticipant.room_id).all()
+        return {room_id: count for room_id, count in rows}
+
+    def expire_video_rooms(self, max_idle_seconds):
+        cutoff = (get_bogota_time() - timedelta(seconds=max_idle_seconds)).replace(tzinfo=None)
+        expired = [room_id for (room_id,) in db.session.query(VideoRoom.room_id).filter(VideoRoom.last_activity < cutoff).all()]
+        if expired:
+            VideoParticipant.query.filter(VideoParticipant.room_id.in_(expired)).delete(synchronize_session=False)
+            VideoRoom.query.filter(VideoRoom.room_id.in_(expired)).delete(synchronize_session=False)
+            db.session.commit()
+        return expired
+
+    def heartbeat(self, ttl_seconds):
+        """
+        Renueva last_seen de los sockets de este nodo y borra los de cualquier nodo que no
+        renovó en ttl_seconds (nodo caído o contenedor recreado con otro nombre), con sus
+        puestos en salas de video. Retorna los usuarios que quedaron sin ningún socket.
+        """
+        now = get_bogota_time()
+        PresenceConnection.query.filter_by(node_id=self.node_id).update({'last_seen': now}, synchronize_session=False)
+
+        cutoff = (now - timedelta(seconds=ttl_seconds)).replace(tzinfo=None)
+        stale = db.session.query(PresenceConnection.sid, PresenceConnection.user_id).filter(
+            or_(PresenceConnection.last_seen == None, PresenceConnection.last_seen < cutoff)
+        ).all()
+        if not stale:
+            db.session.commit()
+            return []
+
+        stale_sids = [sid for sid, _ in stale]
+        room_ids = [room_id for (room_id,) in db.session.query(VideoParticipant.room_id).filter(
+            VideoParticipant.sid.in_(stale_sids)
+        ).distinct().all()]
+        VideoParticipant.query.filter(VideoParticipant.sid.in_(stale_sids)).delete(synchronize_session=False)
+        PresenceConnection.query.filter(PresenceConnection.sid.in_(stale_sids)).delete(synchronize_session=False)
+        self._drop_empty_rooms(room_ids)
+
+        user_ids = {user_id for _, user_id in stale}
+        still_online = {uid for (uid,) in db.session.query(PresenceConnection.user_id).filter(
+            PresenceConnection.user_id.in_(user_ids)
+        ).distinct().all()}
+        db.session.commit()
+        return sorted(user_ids - still_online)
+
+    def purge_node(self):
+        """Elimina las filas de este nodo (llamar al arrancar, antes de aceptar sockets)."""
+        stale_sids = db.session.query(PresenceConnection.sid).filter(PresenceConnection.node_id == self.node_id)
+        stale_rooms = db.session.query(VideoParticipant.room_id).filter(VideoParticipant.sid.in_(stale_sids)).distinct()
+        room_ids = [room_id for (room_id,) in stale_rooms.all()]
+        VideoParticipant.query.filter(VideoParticipant.sid.in_(stale_sids)).delete(synchronize_session=False)
+        PresenceConnection.query.filter_by(node_id=self.node_id).delete(synchronize_session=False)
+        self._drop_empty_rooms(room_ids)
+        db.session.commit()
+
+
+BACKENDS = {
+    'memory': MemoryPresenceBackend,
+    'sql': SqlPresenceBackend,
+}
+
+
+class PresenceRegistry:
+    """
+    Fachada sobre el backend configurado en PRESENCE_BACKEND ('memory' o 'sql').
+    Se inicializa con init_app() igual que las demás extensiones.
+    """
+
+    # Seconds between sweeps for abandoned video rooms
+    SWEEP_INTERVAL = 60
+    # Sockets not renewed for this many heartbeats are considered gone
+    HEARTBEAT_MISSES = 3
+
+    def __init__(self, app=None, socketio=None):
+        self.backend = MemoryPresenceBackend()
+        self.video_room_idle_ttl = 4 * 3600
+        self.heartbeat_interval = 30.0
+        self.app = None
+        self.socketio = None
+        self._last_sweep = 0.0
+        self._started = False
+        self._start_lock = threading.Lock()
+        if app is not None:
+            self.init_app(app, socketio)
+
+    def init_app(self, app, socketio=None):
+        name = app.config.get('PRESENCE_BACKEND', 'memory')
+        self.video_room_idle_ttl = app.config.get('VIDEO_ROOM_IDLE_TTL', self.video_room_idle_ttl)
+        self.heartbeat_interval = float(app.config.get('PRESENCE_HEARTBEAT_SECONDS', self.heartbeat_interval))
+        self.app = app
+        self.socketio = socketio
+        if name not in BACKENDS:
+            raise ValueError(f"PRESENCE_BACKEND desconocido: {name}")
+        if name == 'sql':
+            self.backend = SqlPresenceBackend(app.config.get('PRESENCE_NODE_ID'))
+        else:
+            self.backend = MemoryPresenceBackend()
+
+    def add_connection(self, user_id, sid):
+        self._ensure_started()
+        return self.backend.add_connection(user_id, sid)
+
+    def _ensure_started(self):
+        """Arranca el latido del backend SQL en este worker (una sola vez)."""
+        if self._started or self.socketio is None or not isinstance(self.backend, SqlPresenceBackend):
+            return
+        with self._start_lock:
+            if self._started:
+                return
+            self._started = True
+        self.socketio.start_background_task(self._run)
+
+    def _run(self):
+        from extensions import realtime
+        while True:
+            try:
+                with self.app.app_context():
+                    went_offline = self.backend.heartbeat(self.heartbeat_interval * self.HEARTBEAT_MISSES)
+                    db.session.remove()
+                for user_id in went_offline:
+                    realtime.status_changed(user_id, 'offline')
+            except Exception:
+                # Never let the loop die; the next heartbeat retries
+                self.app.logger.exception("PresenceRegistry heartbeat error")
+            self.socketio.sleep(self.heartbeat_interval)
+
+    def sweep_video_rooms(self):
+        """Expira salas abandonadas, como máximo una vez cada SWEEP_INTERVAL segundos."""
+        now = time.monotonic()
+        if now - self._last_sweep < self.SWEEP_INTERVAL:
+            return []
+        self._last_sweep = now
+        return self.backend.expire_video_rooms(self.video_room_idle_ttl)
+
+    def __getattr__(self, name):
+        return getattr(self.backend, name)
@@ -0,0 +1,157 @@
+from sqlalchemy import and_, case, cast, func, literal, String
+from sqlalchemy.exc import IntegrityError
+from models import db, Message, ConversationReadState, User, get_bogota_time, group_members
+from services.sql_utils import dialect_insert
+
+
+class ReadStateService:
+    @staticmethod
+    def dm_key(user_a: int, user_b: int) -> str:
+        """Clave estable de un chat directo, independiente de quién envía."""
+        low, high = sorted((int(user_a), int(user_b)))
+        return f"dm:{low}:{high}"
+
+    @staticmethod
+    def group_key(group_id: int) -> str:
+        return f"group:{int(group_id)}"
+
+    @staticmethod
+    def get_watermark(user_id: int, conversation_key: str) -> int:
+        last_read = db.session.query(ConversationReadState.last_read_message_id).filter_by(
+            user_id=user_id, conversation_key=conversation_key
+        ).scalar()
+        return last_read or 0
+
+    @staticmethod
+    def conversation_filter(user_id: int, conversation_key: str):
+        """Condición SQL para los mensajes de otros participantes en la conversación."""
+        kind, _, rest = conversation_key.partition(':')
+        if kind == 'group':
+            return and_(Message.group_id == int(rest), Message.sender_id != user_id)
+        low, high = (int(x) for x in rest.split(':'))
+        peer_id = high if low == user_id else low
+        return and_(Message.recipient_id == user_id, Message.sender_id == peer_id, Message.group_id == None)
+
+    @staticmethod
+    def mark_read(user_id: int, conversation_key: str, message_id: int) -> int:
+        """
+        Mueve la marca de lectura hasta message_id. Nunca retrocede.
+        El avance es un único UPDATE condicionado a la marca que se leyó (compare-and-set):
+        si otra petición la movió entre medio, el UPDATE no toca filas y se vuelve a leer,
+        así dos lecturas concurrentes no cuentan dos veces los mismos mensajes.
+        Retorna cuántos mensajes pasaron a leídos (para el contador de no leídos).
+        No hace commit; el llamador controla la transacción.
+        """
+        if not message_id:
+            return 0
+
+        while True:
+            last_read = db.session.query(ConversationReadState.last_read_message_id).filter_by(
+                user_id=user_id, conversation_key=conversation_key
+            ).scalar()
+            if last_read is not None and message_id <= last_read:
+                return 0
+            newly_read = db.session.query(func.count(Message.id)).filter(
+                ReadStateService.conversation_filter(user_id, conversation_key),
+                Message.id > (last_read or 0),
+                Message.id <= message_id
+            ).scalar() or 0
+
+            if last_read is None:
+                claimed = ReadStateService._insert_watermark(user_id, conversation_key, message_id)
+            else:
+                claimed = ConversationReadState.query.filter_by(
+                    user_id=user_id, conversation_key=conversation_key, last_read_message_id=last_read
+                ).update(
+                    {'last_read_message_id': message_id, 'updated_at': get_bogota_time()},
+                    synchronize_session=False
+                )
+            if claimed:
+                return newly_read
+
+    @staticmethod
+    def _insert_watermark(user_id: int, conversation_key: str, message_id: int) -> int:
+        """Crea la primera marca de la conversación. Retorna 0 si otra petición la creó antes."""
+        values = {
+            'user_id': user_id,
+            'conversation_key': conversation_key,
+            'last_read_message_id': message_id,
+            'updated_at': get_bogota_time()
+        }
+        stmt = dialect_insert(ConversationReadState)
+        if stmt is not None:
+            stmt = stmt.values(**values).on_conflict_do_nothing(index_elements=['user_id', 'conversation_key'])
+            return db.session.execute(stmt).rowcount
+
+        # Fallback for other dialects
+        try:
+            with db.session.begin_nested():
+                db.session.add(ConversationReadState(**values))
+        except IntegrityError:
+            return 0
+        return 1
+
+    @staticmethod
+    def unread_in_dm(user_id: int, peer_id: int) -> int:
+        """Mensajes de peer_id hacia user_id posteriores a la marca (rango sobre ix_message_inbox_id)."""
+        last_read = ReadStateService.get_watermark(user_id, ReadStateService.dm_key(user_id, peer_id))
+        return db.session.query(func.count(Message.id)).filter(
+            Message.recipient_id == user_id,
+            Message.sender_id == peer_id,
+            Message.group_id == None,
+            Message.id > last_read
+        ).scalar()
+
+    @staticmethod
+    def unread_in_group(user_id: int, group_id: int) -> int:
+        """Mensajes del grupo posteriores a la marca (rango sobre ix_message_group_id_id)."""
+        last_read = ReadStateService.get_watermark(user_id, ReadStateService.group_key(group_id))
+        return db.session.query(func.count(Message.id)).filter(
+            Message.group_id == group_id,
+            Message.sender_id != user_id,
+            Message.id > last_read
+        ).scalar()
+
+    @staticmethod
+    def total_unread(user_id: int) -> int:
+        """
+        Total de no leídos (directos + grupos) para el badge de la barra de navegación.
+        Se parte de las conversaciones (cada posible contacto y cada grupo del usuario), se
+        cruzan con su marca de lectura y solo se cuentan los mensajes con id > marca: un
+        rango por conversación sobre ix_message_inbox_id / ix_message_group_id_id.
+        """
+        # DM key for each peer, built the same way as dm_key()
+        low = case((User.id < user_id, User.id), else_=literal(user_id))
+        high = case((User.id < user_id, literal(user_id)), else_=User.id)
+        dm_key_expr = literal('dm:') + cast(low, String) + literal(':') + cast(high, String)
+        dm_unread = db.session.query(func.count(Message.id)).select_from(User).outerjoin(
+            ConversationReadState,
+            and_(ConversationReadState.user_id == user_id, ConversationReadState.conversation_key == dm_key_expr)
+        ).join(
+            Message,
+            and_(
+                Message.recipient_id == user_id,
+                Message.sender_id == User.id,
+                Message.group_id == None,
+                Message.id > func.coalesce(ConversationReadState.last_read_message_id, 0)
+            )
+        ).filter(User.id != user_id).scalar()
+
+        group_key_expr = literal('group:') + cast(group_members.c.group_id, String)
+        group_unread = db.session.query(func.count(Message.id)).select_from(group_members).outerjoin(
+            ConversationReadState,
+            and_(ConversationReadState.user_id == user_id, ConversationReadState.conversation_key == group_key_expr)
+        ).join(
+            Message,
+            and_(
+                Message.group_id == group_members.c.group_id,
+                Message.sender_id != user_id,
+                Message.id > func.coalesce(ConversationReadState.last_read_message_id, 0)
+            )
+        ).filter(group_members.c.user_id == user_id).scalar()
+
+        return (dm_unread or 0) + (group_unread or 0)
+
+    @staticmethod
+    def delete_conversation(conversation_key: str) -> None:
+        ConversationReadState.query.filter_by(conversation_key=conversation_key).delete()
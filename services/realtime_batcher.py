@@ -0,0 +1,100 @@
+import logging
+import time
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class RealtimeBatcher:
+    """
+    Acota el fan-out de eventos efímeros de Socket.IO:
+    - typing: un solo 'typing' al empezar una ráfaga y un solo 'stop_typing' al terminar
+      (explícito o por inactividad), sin importar cuántas teclas se envíen.
+    - presencia: los cambios online/offline se acumulan y se emiten como un único
+      'user_status_batch' cada PRESENCE_BATCH_TICK segundos.
+    """
+
+    def __init__(self):
+        self.socketio = None
+        self.tick = 2.0
+        self.typing_timeout = 5.0
+        self._lock = threading.Lock()
+        self._typing = {}  # (room, user_id) -> {'sid', 'payload', 'expires'}
+        self._pending_status = {}  # user_id -> 'online' | 'offline'
+        self._last_status = {}  # user_id -> last status broadcast
+        self._started = False
+
+    def init_app(self, app, socketio):
+        self.socketio = socketio
+        self.tick = float(app.config.get('PRESENCE_BATCH_TICK', 2.0))
+        self.typing_timeout = float(app.config.get('TYPING_TIMEOUT', 5.0))
+
+    def _ensure_started(self):
+        if self._started:
+            return
+        with self._lock:
+            if self._started:
+                return
+            self._started = True
+        self.socketio.start_background_task(self._run)
+
+    def _run(self):
+        while True:
+            self.socketio.sleep(self.tick)
+            try:
+                self.flush()
+            except Exception:
+                # Never let the loop die; the next tick retries
+                logger.exception("RealtimeBatcher flush error")
+
+    # --- Typing ---
+
+    def typing_started(self, room, user_id, sid, payload):
+        """Emite 'typing' solo si el usuario no estaba ya escribiendo en la sala."""
+        self._ensure_started()
+        key = (room, user_id)
+        with self._lock:
+            is_new = key not in self._typing
+            self._typing[key] = {
+                'sid': sid,
+                'payload': payload,
+                'expires': time.monotonic() + self.typing_timeout
+            }
+        if is_new:
+            self.socketio.emit('typing', payload, room=room, skip_sid=sid)
+
+    def typing_stopped(self, room, user_id, payload):
+        """Emite 'stop_typing' solo si había una ráfaga abierta."""
+        with self._lock:
+            state = self._typing.pop((room, user_id), None)
+        if state:
+            self.socketio.emit('stop_typing', payload, room=room, skip_sid=state['sid'])
+
+    # --- Presence ---
+
+    def status_changed(self, user_id, status):
+        self._ensure_started()
+        with self._lock:
+            self._pending_status[user_id] = status
+
+    def flush(self):
+        now = time.monotonic()
+        with self._lock:
+            expired = [(key, state) for key, state in self._typing.items() if state['expires'] <= now]
+            for key, _ in expired:
+                del self._typing[key]
+
+            changes = []
+            for user_id, status in self._pending_status.items():
+                # A disconnect+reconnect inside one tick collapses to no change
+                if self._last_status.get(user_id) != status:
+                    self._last_status[user_id] = status
+                    changes.append({'user_id': user_id, 'status': status})
+            self._pending_status = {}
+
+        for (room, user_id), state in expired:
+            payload = {'sender_id': user_id, 'group_id': state['payload'].get('group_id')}
+            self.socketio.emit('stop_typing', payload, room=room, skip_sid=state['sid'])
+
+        if changes:
+            self.socketio.emit('user_status_batch', {'changes': changes})
@@ -0,0 +1,89 @@
+import re
+from sqlalchemy import and_, or_, select, text
+from models import db, Message, group_members
+
+# Spanish stemming in Postgres; accent-insensitive tokens in SQLite
+PG_TS_CONFIG = 'spanish'
+
+POSTGRES_DDL = [
+    f"""ALTER TABLE message ADD COLUMN IF NOT EXISTS search_vector tsvector
+        GENERATED ALWAYS AS (to_tsvector('{PG_TS_CONFIG}', coalesce(content, ''))) STORED""",
+    "CREATE INDEX IF NOT EXISTS ix_message_search_vector ON message USING GIN (search_vector)",
+]
+
+# External-content FTS5 table kept in sync by triggers (inserts, edits and deletes, incl. group deletion)
+SQLITE_DDL = [
+    """CREATE VIRTUAL TABLE IF NOT EXISTS message_fts USING fts5(
+        content, content='message', content_rowid='id', tokenize='unicode61 remove_diacritics 2')""",
+    """CREATE TRIGGER IF NOT EXISTS message_fts_ai AFTER INSERT ON message BEGIN
+        INSERT INTO message_fts(rowid, content) VALUES (new.id, new.content);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS message_fts_ad AFTER DELETE ON message BEGIN
+        INSERT INTO message_fts(message_fts, rowid, content) VALUES ('delete', old.id, old.content);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS message_fts_au AFTER UPDATE OF content ON message BEGIN
+        INSERT INTO message_fts(message_fts, rowid, content) VALUES ('delete', old.id, old.content);
+        INSERT INTO message_fts(rowid, content) VALUES (new.id, new.content);
+    END""",
+]
+
+
+class SearchService:
+    @staticmethod
+    def dialect() -> str:
+        return db.session.get_bind().dialect.name
+
+    @staticmethod
+    def ensure_index() -> None:
+        """Crea el índice invertido si no existe (idempotente). Llamar al arrancar o desde la migración."""
+        dialect = SearchService.dialect()
+        if dialect == 'postgresql':
+            for ddl in POSTGRES_DDL:
+                db.session.execute(text(ddl))
+        elif dialect == 'sqlite':
+            existed = db.session.execute(text(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'message_fts'"
+            )).scalar()
+            for ddl in SQLITE_DDL:
+                db.session.execute(text(ddl))
+            if not existed:
+                # Index the messages that existed before the table
+                db.session.execute(text("INSERT INTO message_fts(message_fts) VALUES ('rebuild')"))
+        db.session.commit()
+
+    @staticmethod
+    def fts5_query(term: str) -> str:
+        """Convierte el texto del usuario en una consulta FTS5 segura: cada palabra como prefijo."""
+        words = re.findall(r'\w+', term, flags=re.UNICODE)
+        return ' '.join(f'"{w}"*' for w in words)
+
+    @staticmethod
+    def search(user_id: int, term: str, limit: int = 20, before_id: int | None = None) -> list[Message]:
+        """
+        Busca en los mensajes que el usuario puede ver: grupos de los que es miembro
+        y chats directos en los que participa. Más recientes primero.
+        """
+        my_groups = select(group_members.c.group_id).where(group_members.c.user_id == user_id)
+        query = Message.query.filter(or_(
+            Message.group_id.in_(my_groups),
+            and_(Message.group_id == None, or_(Message.sender_id == user_id, Message.recipient_id == user_id))
+        ))
+
+        dialect = SearchService.dialect()
+        if dialect == 'postgresql':
+            query = query.filter(
+                text(f"message.search_vector @@ websearch_to_tsquery('{PG_TS_CONFIG}', :term)")
+            ).params(term=term)
+        elif dialect == 'sqlite':
+            match = SearchService.fts5_query(term)
+            if not match:
+                return []
+            query = query.filter(
+                Message.id.in_(text("SELECT rowid FROM message_fts WHERE message_fts MATCH :term"))
+            ).params(term=match)
+        else:
+            query = query.filter(Message.content.ilike(f"%{term}%"))
+
+        if before_id:
+            query = query.filter(Message.id < before_id)
+        return query.order_by(Message.id.desc()).limit(limit).all()
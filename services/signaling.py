@@ -0,0 +1,155 @@
+import time
+import threading
+from collections import OrderedDict, deque
+
+
+class SignalingTelemetry:
+    """
+    Buffer circular en memoria con los eventos de señalización WebRTC y contadores por sala.
+    Permite ver en qué se va el tiempo de establecimiento de una llamada. Las salas y los
+    ingresos pendientes vienen del cliente (room_id, sid), así que ambos se acotan como LRU.
+    """
+
+    def __init__(self, size=2000, max_rooms=500):
+        self._lock = threading.Lock()
+        self._events = deque(maxlen=size)
+        self.max_rooms = max_rooms
+        self._rooms = OrderedDict()  # room_id -> counters (least recently used first)
+        self._joined_at = OrderedDict()  # (room_id, sid) -> wall time of join_video_room
+
+    def resize(self, size, max_rooms=None):
+        with self._lock:
+            self._events = deque(self._events, maxlen=size)
+            if max_rooms:
+                self.max_rooms = max_rooms
+                self._trim()
+
+    def _trim(self):
+        while len(self._rooms) > self.max_rooms:
+            self._rooms.popitem(last=False)
+        # A join that never connects or leaves (e.g. a lost disconnect) must not stay forever
+        while len(self._joined_at) > self.max_rooms * 8:
+            self._joined_at.popitem(last=False)
+
+    def _room(self, room_id):
+        counters = self._rooms.get(room_id)
+        if counters is None:
+            counters = self._rooms[room_id] = {
+                'joins': 0, 'offers': 0, 'answers': 0, 'candidates_in': 0,
+                'batches_out': 0, 'connected': 0, 'latency_ms_total': 0.0
+            }
+            self._trim()
+        else:
+            self._rooms.move_to_end(room_id)
+        return counters
+
+    def record(self, room_id, event_type, **data):
+        if not isinstance(room_id, str) or not room_id:
+            return
+        now = time.time()
+        with self._lock:
+            counters = self._room(room_id)
+            if event_type == 'join':
+                counters['joins'] += 1
+                self._joined_at[(room_id, data.get('sid'))] = now
+                self._trim()
+            elif event_type == 'offer':
+                counters['offers'] += 1
+            elif event_type == 'answer':
+                counters['answers'] += 1
+            elif event_type == 'candidates':
+                counters['candidates_in'] += data.get('count', 1)
+            elif event_type == 'batch_out':
+                counters['batches_out'] += 1
+            elif event_type == 'connected':
+                joined = self._joined_at.get((room_id, data.get('sid')))
+                if joined is not None:
+                    data['latency_ms'] = round((now - joined) * 1000)
+                    counters['connected'] += 1
+                    counters['latency_ms_total'] += data['latency_ms']
+            elif event_type == 'leave':
+                self._joined_at.pop((room_id, data.get('sid')), None)
+            self._events.append({'ts': now, 'room_id': room_id, 'type': event_type, **data})
+
+    def snapshot(self, room_id=None, limit=200):
+        """Contadores por sala (con latencia promedio ingreso->conectado) y los últimos eventos."""
+        with self._lock:
+            rooms = {}
+            for rid, counters in self._rooms.items():
+                if room_id and rid != room_id:
+                    continue
+                stats = dict(counters)
+                connected = stats.pop('latency_ms_total')
+                stats['avg_join_to_connected_ms'] = round(connected / stats['connected']) if stats['connected'] else None
+                rooms[rid] = stats
+            events = [e for e in self._events if not room_id or e['room_id'] == room_id]
+        return {'rooms': rooms, 'events': events[-limit:]}
+
+
+class SignalRelay:
+    """
+    Reenvío de señales WebRTC. Las SDP (offer/answer) pasan de inmediato; los candidatos ICE
+    se acumulan por (emisor, destino) durante una ventana corta y salen en un solo 'signal_received'.
+    """
+
+    def __init__(self):
+        self.socketio = None
+        self.window = 0.05
+        self.telemetry = SignalingTelemetry()
+        self._lock = threading.Lock()
+        self._pending = {}  # (sender_sid, target_sid) -> {'candidates': [...], 'meta': {...}}
+
+    def init_app(self, app, socketio):
+        self.socketio = socketio
+        self.window = app.config.get('SIGNAL_BATCH_WINDOW_MS', 50) / 1000.0
+        self.telemetry.resize(
+            app.config.get('SIGNALING_TELEMETRY_SIZE', 2000),
+            app.config.get('SIGNALING_TELEMETRY_MAX_ROOMS', 500)
+        )
+
+    def relay(self, room_id, sender_sid, target_sid, payload, meta):
+        """meta: datos del emisor que acompañan la señal (sender_db_id, sender_name)."""
+        candidates = list(payload.get('candidates') or [])
+        if payload.get('candidate'):
+            candidates.append(payload['candidate'])
+
+        if candidates:
+            self.telemetry.record(room_id, 'candidates', sid=sender_sid, count=len(candidates))
+            key = (sender_sid, target_sid)
+            with self._lock:
+                pending = self._pending.get(key)
+                is_new = pending is None
+                if is_new:
+                    pending = self._pending[key] = {'candidates': [], 'meta': meta, 'room_id': room_id}
+                pending['candidates'].extend(candidates)
+            if is_new:
+                self.socketio.start_background_task(self._flush_later, key)
+
+        sdp = payload.get('sdp')
+        if sdp:
+            sdp_type = sdp.get('type') if isinstance(sdp, dict) else None
+            if sdp_type in ('offer', 'answer'):
+                self.telemetry.record(room_id, sdp_type, sid=sender_sid, target=target_sid)
+            # Keep ordering: candidates already queued for this pair go out first
+            self._flush((sender_sid, target_sid))
+            self._emit(target_sid, sender_sid, {'sdp': sdp}, meta)
+
+    def _flush_later(self, key):
+        self.socketio.sleep(self.window)
+        self._flush(key)
+
+    def _flush(self, key):
+        with self._lock:
+            pending = self._pending.pop(key, None)
+        if not pending:
+            return
+        sender_sid, target_sid = key
+        self.telemetry.record(pending['room_id'], 'batch_out', sid=sender_sid, count=len(pending['candidates']))
+        self._emit(target_sid, sender_sid, {'candidates': pending['candidates']}, pending['meta'])
+
+    def _emit(self, target_sid, sender_sid, payload, meta):
+        self.socketio.emit('signal_received', {
+            'sender': sender_sid,
+            'payload': payload,
+            **meta
+        }, room=target_sid)
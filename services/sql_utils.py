@@ -0,0 +1,16 @@
+from models import db
+
+
+def dialect_insert(model):
+    """
+    Devuelve un INSERT con soporte de ON CONFLICT para el motor actual
+    (PostgreSQL en producción, SQLite en local) o None si el motor no lo soporta.
+    """
+    dialect = db.session.get_bind().dialect.name
+    if dialect == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    elif dialect == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        return None
+    return insert(model)
@@ -0,0 +1,136 @@
+import threading
+import time
+from collections import deque
+from sqlalchemy import func
+from models import db, User, TimeLog
+from services.attendance_service import AttendanceService
+
+ADMINS_ROOM = 'admins'
+RECENT_SIZE = 50
+# TimeLog ids re-read on every catch-up, so a change committed out of id order is not skipped
+CATCHUP_OVERLAP = 200
+
+
+class StatusRoster:
+    """
+    Tablero de tiempos en memoria: estado actual y desde cuándo por empleado, más los
+    últimos RECENT_SIZE cambios. Se siembra desde la BD (tres consultas) y después se pone
+    al día leyendo TimeLog por id (id > último aplicado, un rango sobre la clave primaria).
+
+    TimeLog es el registro de cambios compartido: cada worker se pone al día antes de servir
+    el tablero y antes de publicar un cambio, así un worker que no atendió el cambio no sirve
+    un tablero atrasado. Los cambios se publican a la sala 'admins' (con varios workers, por
+    la cola de Socket.IO). ROSTER_RESEED_SECONDS queda como red de seguridad (altas y
+    ediciones de empleados también fuerzan la re-siembra).
+    """
+
+    def __init__(self):
+        self.socketio = None
+        self.reseed_seconds = 300.0
+        self._lock = threading.Lock()
+        self._entries = {}  # user_id -> {'id', 'nombre', 'cargo', 'foto_perfil', 'current_status', 'since'}
+        self._recent = deque(maxlen=RECENT_SIZE)
+        self._seeded_at = None
+        self._seed_log_id = 0  # Every TimeLog up to this id is reflected in the seed
+        self._last_log_id = 0
+        self._applied = set()  # TimeLog ids applied after the seed (pruned to the overlap window)
+
+    def init_app(self, app, socketio):
+        self.socketio = socketio
+        self.reseed_seconds = float(app.config.get('ROSTER_RESEED_SECONDS', 300))
+
+    @staticmethod
+    def _entry(user):
+        return {'id': user.id, 'nombre': user.nombre, 'cargo': user.cargo, 'foto_perfil': user.foto_perfil}
+
+    @staticmethod
+    def _change(log, nombre):
+        return {'id': log.id, 'user_id': log.user_id, 'nombre': nombre, 'new_status': log.new_status, 'timestamp': log.timestamp}
+
+    def _seed(self):
+        seed_log_id = db.session.query(func.max(TimeLog.id)).scalar() or 0
+        employees = User.query.filter(User.rol != 'Admin').all()
+        last_change = dict(
+            db.session.query(TimeLog.user_id, func.max(TimeLog.timestamp)).filter(
+                TimeLog.id <= seed_log_id
+            ).group_by(TimeLog.user_id).all()
+        )
+        recent = db.session.query(TimeLog, User.nombre).join(User, User.id == TimeLog.user_id).filter(
+            TimeLog.id <= seed_log_id
+        ).order_by(TimeLog.timestamp.desc(), TimeLog.id.desc()).limit(RECENT_SIZE).all()
+
+        entries = {}
+        for emp in employees:
+            entries[emp.id] = {
+                **self._entry(emp),
+                'current_status': emp.current_status or 'Inactivo',
+                'since': last_change.get(emp.id),
+            }
+        with self._lock:
+            self._entries = entries
+            self._recent = deque((self._change(log, nombre) for log, nombre in reversed(recent)), maxlen=RECENT_SIZE)
+            self._seed_log_id = self._last_log_id = seed_log_id
+            self._applied = set()
+            self._seeded_at = time.monotonic()
+
+    def _ensure_seeded(self):
+        seeded_at = self._seeded_at
+        if seeded_at is None or time.monotonic() - seeded_at > self.reseed_seconds:
+            self._seed()
+
+    def _catch_up(self):
+        """Aplica los TimeLog que este worker todavía no vio (de cualquier worker)."""
+        floor = max(self._seed_log_id, self._last_log_id - CATCHUP_OVERLAP)
+        rows = db.session.query(TimeLog, User).join(User, User.id == TimeLog.user_id).filter(
+            TimeLog.id > floor,
+            User.rol != 'Admin'
+        ).order_by(TimeLog.id).all()
+        if not rows:
+            return
+
+        with self._lock:
+            for log, user in rows:
+                if log.id <= self._seed_log_id or log.id in self._applied:
+                    continue
+                self._applied.add(log.id)
+                self._last_log_id = max(self._last_log_id, log.id)
+                entry = self._entries.get(user.id)
+                if entry is None:
+                    entry = self._entries[user.id] = {**self._entry(user), 'since': None}
+                if entry.get('since') is None or log.timestamp >= entry['since']:
+                    entry['current_status'] = log.new_status
+                    entry['since'] = log.timestamp
+                self._recent.append(self._change(log, user.nombre))
+            cutoff = self._last_log_id - CATCHUP_OVERLAP
+            self._applied = {log_id for log_id in self._applied if log_id > cutoff}
+
+    def invalidate(self):
+        """Fuerza a re-sembrar en la próxima lectura (altas y ediciones de empleados)."""
+        self._seeded_at = None
+
+    def snapshot(self):
+        """(empleados ordenados por nombre, cambios recientes del más nuevo al más viejo), como copias."""
+        self._ensure_seeded()
+        self._catch_up()
+        with self._lock:
+            employees = sorted((dict(e) for e in self._entries.values()), key=lambda e: e['nombre'] or '')
+            recent = [dict(r) for r in reversed(self._recent)]
+        return employees, recent
+
+    def status_changed(self, user, status, since):
+        """Pone el tablero al día (el cambio ya está en TimeLog) y lo publica a los admins. Llamar después del commit."""
+        if user.rol == 'Admin':
+            return
+        self._ensure_seeded()
+        self._catch_up()
+
+        start_date, end_date = AttendanceService.fortnight_range()
+        debt_s = AttendanceService.debts_between([user.id], start_date, end_date)[user.id]
+        if self.socketio is not None:
+            self.socketio.emit('time_status', {
+                'user_id': user.id,
+                'nombre': user.nombre,
+                'status': status,
+                'since': since.isoformat(),
+                'debt_seconds': debt_s
+            }, to=ADMINS_ROOM)
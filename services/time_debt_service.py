@@ -0,0 +1,97 @@
+import numpy as np
+import pandas as pd
+from models import db, TimeLog, get_bogota_time
+
+# Daily rules (shared with AttendanceService)
+START_LIMIT = pd.Timedelta(hours=8, minutes=30)
+END_LIMIT = pd.Timedelta(hours=16, minutes=30)
+BREAK_ALLOWANCE = 15 * 60
+LUNCH_ALLOWANCE = 60 * 60
+
+
+class TimeDebtService:
+    @staticmethod
+    def load_logs(start_date=None, end_date=None, user_ids=None) -> pd.DataFrame:
+        """Una sola consulta por rango para todos los empleados (o los indicados)."""
+        query = db.session.query(TimeLog.user_id, TimeLog.new_status, TimeLog.timestamp)
+        if start_date is not None:
+            query = query.filter(TimeLog.timestamp >= start_date)
+        if end_date is not None:
+            query = query.filter(TimeLog.timestamp <= end_date)
+        if user_ids is not None:
+            query = query.filter(TimeLog.user_id.in_(list(user_ids)))
+        rows = query.order_by(TimeLog.user_id, TimeLog.timestamp, TimeLog.id).all()
+        df = pd.DataFrame(rows, columns=['user_id', 'new_status', 'timestamp'])
+        if not df.empty:
+            df['timestamp'] = pd.to_datetime(df['timestamp'])
+            if df['timestamp'].dt.tz is not None:
+                df['timestamp'] = df['timestamp'].dt.tz_localize(None)
+        return df
+
+    @staticmethod
+    def add_durations(df: pd.DataFrame, now=None) -> pd.DataFrame:
+        """
+        Duración de cada estado = siguiente registro del mismo usuario - este registro.
+        El último registro cuenta hasta ahora solo si es de hoy y no es 'Inactivo'
+        (con now=None se deja abierto, en 0).
+        """
+        df = df.copy()
+        next_ts = df.groupby('user_id', sort=False)['timestamp'].shift(-1)
+        duration = (next_ts - df['timestamp']).dt.total_seconds()
+
+        is_last = next_ts.isna()
+        if now is None:
+            df['duration_seconds'] = np.where(is_last, 0.0, duration)
+            return df
+        open_today = is_last & (df['timestamp'].dt.date == now.date()) & (df['new_status'] != 'Inactivo')
+        until_now = (pd.Timestamp(now) - df['timestamp']).dt.total_seconds()
+        df['duration_seconds'] = np.where(open_today, until_now, np.where(is_last, 0.0, duration))
+        return df
+
+    @staticmethod
+    def daily_rollup(df: pd.DataFrame, now=None) -> pd.DataFrame:
+        """
+        Una fila por (usuario, día) con segundos por estado, primer 'Activo', último registro
+        y los componentes de deuda: llegada tarde (primer 'Activo' > 8:30), salida temprana
+        (último registro < 16:30), exceso de break (> 15m/día) y de almuerzo (> 60m/día).
+        """
+        df = TimeDebtService.add_durations(df, now)
+        df['day'] = df['timestamp'].dt.normalize()
+        df['active_s'] = np.where(df['new_status'] == 'Activo', df['duration_seconds'], 0.0)
+        df['break_s'] = np.where(df['new_status'] == 'En Break', df['duration_seconds'], 0.0)
+        df['lunch_s'] = np.where(df['new_status'] == 'En Almuerzo', df['duration_seconds'], 0.0)
+        df['active_ts'] = df['timestamp'].where(df['new_status'] == 'Activo')
+
+        daily = df.groupby(['user_id', 'day'], sort=False).agg(
+            first_active=('active_ts', 'min'),
+            last_event=('timestamp', 'max'),
+            last_status=('new_status', 'last'),
+            active_s=('active_s', 'sum'),
+            break_s=('break_s', 'sum'),
+            lunch_s=('lunch_s', 'sum')
+        ).reset_index()
+
+        daily['late_s'] = (daily['first_active'] - (daily['day'] + START_LIMIT)).dt.total_seconds().clip(lower=0).fillna(0)
+        daily['early_s'] = ((daily['day'] + END_LIMIT) - daily['last_event']).dt.total_seconds().clip(lower=0)
+        daily['excess_s'] = (daily['break_s'] - BREAK_ALLOWANCE).clip(lower=0) + (daily['lunch_s'] - LUNCH_ALLOWANCE).clip(lower=0)
+        return daily
+
+    @staticmethod
+    def compute_debt_seconds(df: pd.DataFrame, now) -> pd.Series:
+        """Deuda total por usuario (segundos) para todos a la vez. La salida temprana solo aplica a días pasados."""
+        if df.empty:
+            return pd.Series(dtype=float)
+
+        daily = TimeDebtService.daily_rollup(df, now)
+        is_past = daily['day'] < pd.Timestamp(now.date())
+        daily['debt_s'] = daily['late_s'] + daily['early_s'].where(is_past, 0.0) + daily['excess_s']
+        return daily.groupby('user_id')['debt_s'].sum()
+
+    @staticmethod
+    def fortnight_debts(user_ids, start_date, end_date) -> dict:
+        """Deuda de la quincena en segundos para cada usuario (0 si no tiene registros)."""
+        user_ids = list(user_ids)
+        now = get_bogota_time().replace(tzinfo=None)
+        df = TimeDebtService.load_logs(start_date, end_date, user_ids)
+        debts = TimeDebtService.compute_debt_seconds(df, now)
+        return {uid: float(debts.get(uid, 0.0)) for uid in user_ids}
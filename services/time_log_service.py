@@ -0,0 +1,124 @@
+import base64
+import binascii
+from datetime import datetime
+from sqlalchemy import and_, func, or_, select
+from models import db, TimeLog, get_bogota_time
+
+# Excesos visibles en el historial (mismas reglas que la deuda diaria)
+EXCESS_RULES = {
+    'En Break': 15 * 60,
+    'En Almuerzo': 60 * 60,
+}
+
+
+class TimeLogService:
+    """Duraciones de TimeLog calculadas en la base de datos con una ventana (LEAD/LAG) sobre cada usuario."""
+
+    @staticmethod
+    def durations_query(user_ids=None, start=None, end=None, upto=None, newest_first=False):
+        """
+        Subconsulta reutilizable: id, user_id, new_status, timestamp y next_timestamp
+        (LEAD(timestamp) OVER (PARTITION BY user_id ORDER BY timestamp, id)).
+
+        newest_first=True calcula lo mismo como LAG(timestamp) OVER (... ORDER BY timestamp DESC,
+        id DESC): la ventana va en el orden de una lectura del más reciente al más antiguo, así
+        el plan recorre el índice (user_id, timestamp, id) hacia atrás y un LIMIT afuera corta
+        el recorrido en vez de materializar todo el historial del usuario.
+
+        start/upto se aplican dentro de la ventana (el siguiente registro siempre es más nuevo,
+        así que acotar por abajo no cambia el resultado, y upto es inclusivo para que el registro
+        del cursor siga siendo el siguiente del primero de la página); end se aplica afuera para
+        que el último registro del rango conserve el siguiente aunque caiga fuera.
+        """
+        if newest_first:
+            next_ts = func.lag(TimeLog.timestamp, type_=TimeLog.timestamp.type).over(
+                partition_by=TimeLog.user_id,
+                order_by=(TimeLog.timestamp.desc(), TimeLog.id.desc())
+            )
+        else:
+            next_ts = func.lead(TimeLog.timestamp, type_=TimeLog.timestamp.type).over(
+                partition_by=TimeLog.user_id,
+                order_by=(TimeLog.timestamp, TimeLog.id)
+            )
+        inner = select(
+            TimeLog.id, TimeLog.user_id, TimeLog.new_status, TimeLog.timestamp,
+            next_ts.label('next_timestamp')
+        )
+        if user_ids is not None:
+            inner = inner.where(TimeLog.user_id.in_(list(user_ids)))
+        if start is not None:
+            inner = inner.where(TimeLog.timestamp >= start)
+        if upto is not None:
+            inner = inner.where(TimeLog.timestamp <= upto)
+        sub = inner.subquery('log_durations')
+
+        query = select(sub)
+        if end is not None:
+            query = query.where(sub.c.timestamp <= end)
+        return query, sub
+
+    @staticmethod
+    def duration_seconds(row, now):
+        """Hasta el siguiente registro; el último cuenta hasta ahora solo si es de hoy y no es 'Inactivo'."""
+        if row.next_timestamp is not None:
+            return (row.next_timestamp - row.timestamp).total_seconds()
+        if row.timestamp.date() == now.date() and row.new_status != 'Inactivo':
+            return max((now - row.timestamp).total_seconds(), 0.0)
+        return 0.0
+
+    @staticmethod
+    def excess_seconds(status, seconds):
+        allowance = EXCESS_RULES.get(status)
+        if allowance is None:
+            return 0.0
+        return max(seconds - allowance, 0.0)
+
+    @staticmethod
+    def encode_cursor(row):
+        raw = f"{row.timestamp.isoformat()}|{row.id}"
+        return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii')
+
+    @staticmethod
+    def decode_cursor(cursor):
+        """Returns (timestamp, id) or None if the cursor is malformed."""
+        try:
+            raw = base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8')
+            ts_str, log_id = raw.split('|')
+            return datetime.fromisoformat(ts_str), int(log_id)
+        except (ValueError, UnicodeError, binascii.Error):
+            return None
+
+    @staticmethod
+    def history_page(user_id, start=None, end=None, cursor=None, limit=50):
+        """
+        Una página del historial, del más reciente al más antiguo, con keyset sobre (timestamp, id).
+        Devuelve (rows, next_cursor); cada row trae duration_seconds y excess_seconds.
+        """
+        before = TimeLogService.decode_cursor(cursor) if cursor else None
+        query, sub = TimeLogService.durations_query(
+            user_ids=[user_id], start=start, end=end, upto=before[0] if before else None, newest_first=True
+        )
+        if before:
+            before_ts, before_id = before
+            query = query.where(or_(
+                sub.c.timestamp < before_ts,
+                and_(sub.c.timestamp == before_ts, sub.c.id < before_id)
+            ))
+        query = query.order_by(sub.c.timestamp.desc(), sub.c.id.desc()).limit(limit + 1)
+        rows = db.session.execute(query).all()
+
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = TimeLogService.encode_cursor(rows[-1])
+
+        now = get_bogota_time().replace(tzinfo=None)
+        page = []
+        for row in rows:
+            seconds = TimeLogService.duration_seconds(row, now)
+            page.append({
+                'row': row,
+                'duration_seconds': seconds,
+                'excess_seconds': TimeLogService.excess_seconds(row.new_status, seconds),
+            })
+        return page, next_cursor
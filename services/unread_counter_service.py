@@ -0,0 +1,72 @@
+from sqlalchemy import case
+from models import db, UnreadCounter, User
+from services.read_state_service import ReadStateService
+from services.sql_utils import dialect_insert
+
+
+class UnreadCounterService:
+    @staticmethod
+    def get(user_id: int) -> int:
+        """
+        Lectura O(1) del contador para el badge de la barra de navegación: una fila por
+        clave primaria, siempre al día entre workers. No escribe (se llama al renderizar):
+        las filas se crean con el usuario y con `flask rebuild-unread-counters`; sin fila,
+        se calcula desde las marcas de lectura.
+        """
+        count = db.session.query(UnreadCounter.count).filter_by(user_id=user_id).scalar()
+        if count is None:
+            return ReadStateService.total_unread(user_id)
+        return count
+
+    @staticmethod
+    def increment(user_ids, amount: int = 1) -> None:
+        """
+        Suma amount al contador de cada usuario con un solo UPDATE. No hace commit.
+        Solo toca las filas que ya existen: un usuario sin contador lo obtiene con
+        rebuild_user(), que ya incluye este mensaje.
+        """
+        user_ids = list({int(uid) for uid in user_ids})
+        if not user_ids or amount <= 0:
+            return
+
+        UnreadCounter.query.filter(UnreadCounter.user_id.in_(user_ids)).update(
+            {'count': UnreadCounter.count + amount},
+            synchronize_session=False
+        )
+
+    @staticmethod
+    def decrement(user_id: int, amount: int) -> None:
+        """Resta amount sin bajar de cero. No hace commit."""
+        if amount <= 0:
+            return
+        UnreadCounter.query.filter_by(user_id=user_id).update(
+            {'count': case((UnreadCounter.count > amount, UnreadCounter.count - amount), else_=0)},
+            synchronize_session=False
+        )
+
+    @staticmethod
+    def rebuild_user(user_id: int) -> int:
+        """Recalcula el contador desde las marcas de lectura. No hace commit."""
+        count = ReadStateService.total_unread(user_id)
+
+        stmt = dialect_insert(UnreadCounter)
+        if stmt is not None:
+            stmt = stmt.values(user_id=user_id, count=count)
+            stmt = stmt.on_conflict_do_update(index_elements=['user_id'], set_={'count': stmt.excluded.count})
+            db.session.execute(stmt)
+        else:
+            counter = db.session.get(UnreadCounter, user_id)
+            if counter is None:
+                db.session.add(UnreadCounter(user_id=user_id, count=count))
+            else:
+                counter.count = count
+        return count
+
+    @staticmethod
+    def rebuild_all() -> int:
+        """Corrige la deriva de todos los contadores. Retorna cuántos usuarios se procesaron."""
+        user_ids = [uid for (uid,) in db.session.query(User.id).all()]
+        for uid in user_ids:
+            UnreadCounterService.rebuild_user(uid)
+        db.session.commit()
+        return len(user_ids)
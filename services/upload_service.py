@@ -0,0 +1,166 @@
+import os
+import uuid
+import hashlib
+import shutil
+from datetime import timedelta
+from eventlet import tpool
+from flask import current_app
+from models import db, UploadSession, get_bogota_time
+from services.blob_store import BlobStore, file_sha256
+
+# Destination subfolder under UPLOAD_FOLDER for each purpose
+UPLOAD_PURPOSES = {
+    'chat': 'chat_files',
+    'training': 'trainings',
+    'comunicado': 'comunicados',
+}
+
+READ_BLOCK = 64 * 1024
+
+
+class UploadError(Exception):
+    def __init__(self, message, status_code=400):
+        super().__init__(message)
+        self.message = message
+        self.status_code = status_code
+
+
+class UploadService:
+    @staticmethod
+    def temp_path(session: UploadSession) -> str:
+        tmp_dir = current_app.config['UPLOAD_TMP_FOLDER']
+        os.makedirs(tmp_dir, exist_ok=True)
+        return os.path.join(tmp_dir, f"{session.id}.part")
+
+    @staticmethod
+    def create_session(user_id: int, filename: str, total_size: int, purpose: str, sha256: str | None = None) -> UploadSession:
+        """Abre una sesión de subida. El archivo se recibe luego por partes con write_chunk()."""
+        if purpose not in UPLOAD_PURPOSES:
+            raise UploadError('Destino de subida inválido')
+        if not filename or total_size is None or total_size <= 0:
+            raise UploadError('Nombre y tamaño del archivo requeridos')
+        if total_size > current_app.config['MAX_CONTENT_LENGTH']:
+            raise UploadError('El archivo supera el tamaño máximo permitido', 413)
+
+        session = UploadSession(
+            id=str(uuid.uuid4()),
+            user_id=user_id,
+            purpose=purpose,
+            filename=filename,
+            total_size=total_size,
+            received_bytes=0,
+            expected_sha256=sha256.lower() if sha256 else None
+        )
+        db.session.add(session)
+        db.session.commit()
+
+        # Empty temp file so resumes can always open it in r+b mode
+        open(UploadService.temp_path(session), 'wb').close()
+        return session
+
+    @staticmethod
+    def get_session(upload_id: str, user_id: int) -> UploadSession:
+        session = UploadSession.query.get(upload_id)
+        if session is None or session.user_id != user_id:
+            raise UploadError('Sesión de subida no encontrada', 404)
+        return session
+
+    @staticmethod
+    def write_chunk(session: UploadSession, offset: int, stream, chunk_sha256: str | None = None) -> int:
+        """
+        Escribe una parte en el archivo temporal a partir de offset, leyendo el stream por bloques.
+        offset debe ser <= bytes ya recibidos (se permite reenviar la última parte).
+        Retorna el nuevo offset.
+        """
+        if session.status != 'uploading':
+            raise UploadError('La subida ya fue completada', 409)
+        if offset is None or offset < 0 or offset > session.received_bytes:
+            raise UploadError(f'Offset inválido, se esperaba {session.received_bytes}', 409)
+
+        chunk_size = current_app.config['UPLOAD_CHUNK_SIZE']
+        digest = hashlib.sha256()
+        written = 0
+        path = UploadService.temp_path(session)
+
+        with open(path, 'r+b') as f:
+            f.seek(offset)
+            f.truncate()
+            try:
+                while True:
+                    block = stream.read(READ_BLOCK)
+                    if not block:
+                        break
+                    written += len(block)
+                    if written > chunk_size or offset + written > session.total_size:
+                        raise UploadError('La parte excede el tamaño permitido', 413)
+                    digest.update(block)
+                    f.write(block)
+
+                if chunk_sha256 and digest.hexdigest() != chunk_sha256.lower():
+                    raise UploadError('Checksum de la parte no coincide', 422)
+            except Exception:
+                # Everything from offset on was discarded: the client must resume from here
+                f.truncate(offset)
+                session.received_bytes = offset
+                db.session.commit()
+                raise
+
+        session.received_bytes = offset + written
+        db.session.commit()
+        return session.received_bytes
+
+    @staticmethod
+    def complete(session: UploadSession) -> str:
+        """
+        Verifica tamaño y SHA-256 del archivo completo. Retorna el digest. El hash (hasta
+        MAX_CONTENT_LENGTH de lectura) corre en eventlet.tpool para no detener el hub.
+        """
+        if session.status == 'complete':
+            return session.sha256
+        if session.received_bytes != session.total_size:
+            raise UploadError(f'Subida incompleta ({session.received_bytes}/{session.total_size} bytes)', 409)
+
+        sha256 = tpool.execute(file_sha256, UploadService.temp_path(session))
+
+        if session.expected_sha256 and sha256 != session.expected_sha256:
+            raise UploadError('Checksum del archivo no coincide', 422)
+
+        session.sha256 = sha256
+        session.status = 'complete'
+        db.session.commit()
+        return sha256
+
+    @staticmethod
+    def claim(upload_id: str, user_id: int, purpose: str, final_filename: str) -> str:
+        """
+        Entrega un archivo ya verificado a su carpeta definitiva en UPLOAD_FOLDER
+        (la misma que usaba file.save()) y cierra la sesión. Retorna final_filename.
+        """
+        session = UploadService.get_session(upload_id, user_id)
+        if session.purpose != purpose:
+            raise UploadError('La subida no corresponde a este destino')
+        if session.status != 'complete':
+            UploadService.complete(session)
+
+        save_path = os.path.join(current_app.config['UPLOAD_FOLDER'], UPLOAD_PURPOSES[purpose])
+        os.makedirs(save_path, exist_ok=True)
+        shutil.move(UploadService.temp_path(session), os.path.join(save_path, final_filename))
+        BlobStore.ingest(purpose, final_filename, sha256=session.sha256)
+
+        db.session.delete(session)
+        db.session.commit()
+        return final_filename
+
+    @staticmethod
+    def purge_expired() -> int:
+        """Elimina sesiones abandonadas y sus archivos temporales."""
+        max_age = timedelta(hours=current_app.config['UPLOAD_SESSION_MAX_AGE_HOURS'])
+        cutoff = (get_bogota_time() - max_age).replace(tzinfo=None)
+        expired = UploadSession.query.filter(UploadSession.updated_at < cutoff).all()
+        for session in expired:
+            path = UploadService.temp_path(session)
+            if os.path.exists(path):
+                os.remove(path)
+            db.session.delete(session)
+        db.session.commit()
+        return len(expired)
@@ -0,0 +1,148 @@
+// Resumable chunked uploads against /uploads/sessions.
+// ChunkedUpload.upload(file, purpose, onProgress) -> Promise<upload_id>
+(function () {
+    const MAX_RETRIES = 5;
+
+    const HASH_READ_SIZE = 4 * 1024 * 1024;
+
+    async function sha256Hex(buffer) {
+        if (!window.crypto || !crypto.subtle) return null; // Only available on HTTPS/localhost
+        const hash = await crypto.subtle.digest('SHA-256', buffer);
+        return Array.from(new Uint8Array(hash)).map(b => b.toString(16).padStart(2, '0')).join('');
+    }
+
+    // Incremental SHA-256: crypto.subtle has no streaming API and whole files can be up to
+    // MAX_CONTENT_LENGTH, so the file digest is built block by block without loading it at once
+    const K = new Uint32Array([
+        0x428a2f98, 0x71374491, 0xb5c0fbcf, 0xe9b5dba5, 0x3956c25b, 0x59f111f1, 0x923f82a4, 0xab1c5ed5,
+        0xd807aa98, 0x12835b01, 0x243185be, 0x550c7dc3, 0x72be5d74, 0x80deb1fe, 0x9bdc06a7, 0xc19bf174,
+        0xe49b69c1, 0xefbe4786, 0x0fc19dc6, 0x240ca1cc, 0x2de92c6f, 0x4a7484aa, 0x5cb0a9dc, 0x76f988da,
+        0x983e5152, 0xa831c66d, 0xb00327c8, 0xbf597fc7, 0xc6e00bf3, 0xd5a79147, 0x06ca6351, 0x14292967,
+        0x27b70a85, 0x2e1b2138, 0x4d2c6dfc, 0x53380d13, 0x650a7354, 0x766a0abb, 0x81c2c92e, 0x92722c85,
+        0xa2bfe8a1, 0xa81a664b, 0xc24b8b70, 0xc76c51a3, 0xd192e819, 0xd6990624, 0xf40e3585, 0x106aa070,
+        0x19a4c116, 0x1e376c08, 0x2748774c, 0x34b0bcb5, 0x391c0cb3, 0x4ed8aa4a, 0x5b9cca4f, 0x682e6ff3,
+        0x748f82ee, 0x78a5636f, 0x84c87814, 0x8cc70208, 0x90befffa, 0xa4506ceb, 0xbef9a3f7, 0xc67178f2
+    ]);
+
+    class Sha256 {
+        constructor() {
+            this.h = new Uint32Array([
+                0x6a09e667, 0xbb67ae85, 0x3c6ef372, 0xa54ff53a, 0x510e527f, 0x9b05688c, 0x1f83d9ab, 0x5be0cd19
+            ]);
+            this.w = new Uint32Array(64);
+            this.block = new Uint8Array(64);
+            this.blockLength = 0;
+            this.length = 0;
+        }
+
+        compress(bytes, start) {
+            const w = this.w;
+            const h = this.h;
+            for (let i = 0; i < 16; i++) {
+                const j = start + i * 4;
+                w[i] = (bytes[j] << 24) | (bytes[j + 1] << 16) | (bytes[j + 2] << 8) | bytes[j + 3];
+            }
+            for (let i = 16; i < 64; i++) {
+                const a = w[i - 15], b = w[i - 2];
+                const s0 = ((a >>> 7) | (a << 25)) ^ ((a >>> 18) | (a << 14)) ^ (a >>> 3);
+                const s1 = ((b >>> 17) | (b << 15)) ^ ((b >>> 19) | (b << 13)) ^ (b >>> 10);
+                w[i] = (w[i - 16] + s0 + w[i - 7] + s1) | 0;
+            }
+            let a = h[0], b = h[1], c = h[2], d = h[3], e = h[4], f = h[5], g = h[6], hh = h[7];
+            for (let i = 0; i < 64; i++) {
+                const S1 = ((e >>> 6) | (e << 26)) ^ ((e >>> 11) | (e << 21)) ^ ((e >>> 25) | (e << 7));
+                const t1 = (hh + S1 + ((e & f) ^ (~e & g)) + K[i] + w[i]) | 0;
+                const S0 = ((a >>> 2) | (a << 30)) ^ ((a >>> 13) | (a << 19)) ^ ((a >>> 22) | (a << 10));
+                const t2 = (S0 + ((a & b) ^ (a & c) ^ (b & c))) | 0;
+                hh = g; g = f; f = e; e = (d + t1) | 0;
+                d = c; c = b; b = a; a = (t1 + t2) | 0;
+            }
+            h[0] += a; h[1] += b; h[2] += c; h[3] += d; h[4] += e; h[5] += f; h[6] += g; h[7] += hh;
+        }
+
+        update(bytes) {
+            let i = 0;
+            this.length += bytes.length;
+            if (this.blockLength) {
+                while (i < bytes.length && this.blockLength < 64) this.block[this.blockLength++] = bytes[i++];
+                if (this.blockLength < 64) return;
+                this.compress(this.block, 0);
+                this.blockLength = 0;
+            }
+            for (; i + 64 <= bytes.length; i += 64) this.compress(bytes, i);
+            while (i < bytes.length) this.block[this.blockLength++] = bytes[i++];
+        }
+
+        hex() {
+            const bits = this.length * 8;
+            const tail = new Uint8Array(((this.blockLength + 8) >> 6) * 64 + 64 - this.blockLength);
+            tail[0] = 0x80;
+            const view = new DataView(tail.buffer);
+            view.setUint32(tail.length - 8, Math.floor(bits / 0x100000000));
+            view.setUint32(tail.length - 4, bits >>> 0);
+            this.update(tail);
+            return Array.from(this.h).map(x => x.toString(16).padStart(8, '0')).join('');
+        }
+    }
+
+    async function fileSha256(file) {
+        const hasher = new Sha256();
+        for (let offset = 0; offset < file.size; offset += HASH_READ_SIZE) {
+            hasher.update(new Uint8Array(await file.slice(offset, offset + HASH_READ_SIZE).arrayBuffer()));
+        }
+        return hasher.hex();
+    }
+
+    async function json(response) {
+        const data = await response.json();
+        if (!response.ok) throw new Error(data.error || 'Error de subida');
+        return data;
+    }
+
+    async function getOffset(uploadId) {
+        const data = await json(await fetch(`/uploads/sessions/${uploadId}`));
+        return data.offset;
+    }
+
+    async function upload(file, purpose, onProgress) {
+        const session = await json(await fetch('/uploads/sessions', {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            // Whole-file digest, checked by the server when the upload completes
+            body: JSON.stringify({ filename: file.name, size: file.size, purpose: purpose, sha256: await fileSha256(file) })
+        }));
+
+        const uploadId = session.upload_id;
+        const chunkSize = session.chunk_size;
+        let offset = session.offset;
+        let retries = 0;
+
+        while (offset < file.size) {
+            const chunk = await file.slice(offset, offset + chunkSize).arrayBuffer();
+            const headers = { 'Content-Type': 'application/octet-stream' };
+            const digest = await sha256Hex(chunk);
+            if (digest) headers['X-Chunk-SHA256'] = digest;
+
+            try {
+                const data = await json(await fetch(`/uploads/sessions/${uploadId}?offset=${offset}`, {
+                    method: 'PUT',
+                    headers: headers,
+                    body: chunk
+                }));
+                offset = data.offset;
+                retries = 0;
+                if (onProgress) onProgress(offset / file.size);
+            } catch (err) {
+                // Dropped connection or rejected chunk: ask the server where to resume
+                if (++retries > MAX_RETRIES) throw err;
+                await new Promise(resolve => setTimeout(resolve, 1000 * retries));
+                offset = await getOffset(uploadId);
+            }
+        }
+
+        await json(await fetch(`/uploads/sessions/${uploadId}/complete`, { method: 'POST' }));
+        return uploadId;
+    }
+
+    window.ChunkedUpload = { upload: upload };
+})();
@@ -0,0 +1,49 @@
+import os
+import sys
+import tempfile
+from datetime import date
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# The app module builds the app at import time: point it at a throwaway database first
+_db_dir = tempfile.mkdtemp(prefix='chat_mc_tests_')
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(_db_dir, 'test.db')
+
+import app as app_module  # noqa: E402
+from models import db, User  # noqa: E402
+
+
+@pytest.fixture
+def app(tmp_path):
+    flask_app = app_module.app
+    flask_app.config.update(
+        TESTING=True,
+        WTF_CSRF_ENABLED=False,
+        UPLOAD_FOLDER=str(tmp_path / 'uploads'),
+        UPLOAD_TMP_FOLDER=str(tmp_path / 'uploads' / '.incoming'),
+        CACHE_FOLDER=str(tmp_path / 'cache'),
+        CERTIFICATE_CACHE_FOLDER=str(tmp_path / 'cache' / 'certificates'),
+        PAYROLL_CACHE_FOLDER=str(tmp_path / 'cache' / 'payrolls'),
+        PAYROLL_RENDER_MODE='eager',
+    )
+    os.makedirs(flask_app.config['UPLOAD_FOLDER'], exist_ok=True)
+    with flask_app.app_context():
+        db.create_all()
+        yield flask_app
+        db.session.remove()
+        db.drop_all()
+
+
+@pytest.fixture
+def employee(app):
+    user = User(
+        email='empleado@example.com', rol='Empleado', nombre='Ana Pérez', cargo='Analista',
+        fecha_ingreso=date(2024, 2, 1), salario=2000000.0, tipo_contrato='Indefinido'
+    )
+    user.set_password('secreto')
+    db.session.add(user)
+    db.session.commit()
+    return user
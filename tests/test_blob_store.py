@@ -0,0 +1,64 @@
+import os
+
+from models import db, Blob, StoredFile
+from services.blob_store import BlobStore, file_sha256
+
+
+def write(kind, filename, data):
+    path = BlobStore.logical_path(kind, filename)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(data)
+    return path
+
+
+def test_same_content_is_stored_once(app):
+    first = write('chat', 'a.txt', b'contenido')
+    second = write('chat', 'b.txt', b'contenido')
+
+    assert BlobStore.ingest('chat', 'a.txt') == 0
+    assert BlobStore.ingest('chat', 'b.txt') == len(b'contenido')
+    db.session.commit()
+
+    sha256 = file_sha256(first)
+    assert db.session.get(Blob, sha256).ref_count == 2
+    assert os.path.samefile(first, second)
+    assert os.path.samefile(first, BlobStore.blob_path(sha256))
+
+
+def test_reingesting_a_file_does_not_count_twice(app):
+    write('chat', 'a.txt', b'contenido')
+    BlobStore.ingest('chat', 'a.txt')
+    BlobStore.ingest('chat', 'a.txt')
+    db.session.commit()
+
+    assert db.session.get(Blob, file_sha256(BlobStore.logical_path('chat', 'a.txt'))).ref_count == 1
+
+
+def test_rollback_removes_the_new_blob_link(app):
+    path = write('chat', 'a.txt', b'nuevo')
+    target = BlobStore.blob_path(file_sha256(path))
+
+    BlobStore.ingest('chat', 'a.txt')
+    assert os.path.exists(target)
+    db.session.rollback()
+
+    assert not os.path.exists(target)
+    assert os.path.exists(path)
+    assert db.session.get(Blob, file_sha256(path)) is None
+    assert StoredFile.query.count() == 0
+
+
+def test_missing_blob_file_is_restored(app):
+    path = write('chat', 'a.txt', b'contenido')
+    BlobStore.ingest('chat', 'a.txt')
+    db.session.commit()
+    target = BlobStore.blob_path(file_sha256(path))
+    os.remove(target)
+
+    write('chat', 'b.txt', b'contenido')
+    BlobStore.ingest('chat', 'b.txt')
+    db.session.commit()
+
+    assert os.path.exists(target)
+    assert db.session.get(Blob, file_sha256(path)).ref_count == 2
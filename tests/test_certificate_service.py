@@ -0,0 +1,32 @@
+import os
+
+from models import db, Job, User
+from services.certificate_service import CertificateService
+from services.job_queue import JobQueue
+
+
+def test_certificate_cache_is_not_under_static(app, employee):
+    user_id = employee.id
+    job_id = CertificateService.enqueue(user_id).id
+
+    JobQueue.run_worker(worker_id='test', once=True)
+
+    assert db.session.get(Job, job_id).status == 'done'
+    path = CertificateService.cache_path(CertificateService.fingerprint(db.session.get(User, user_id)))
+    assert os.path.exists(path)
+    assert not os.path.realpath(path).startswith(os.path.realpath(app.static_folder))
+    assert not os.path.realpath(path).startswith(os.path.realpath(app.config['UPLOAD_FOLDER']))
+
+
+def test_certificate_download_requires_login(app, employee):
+    client = app.test_client()
+    assert client.get('/employee/download_certificate').status_code == 302
+
+    client.post('/auth/login', data={'email': 'empleado@example.com', 'password': 'secreto'})
+    client.get('/employee/download_certificate')
+    with app.app_context():
+        # Own context: the worker's session cleanup must not detach the client's logged-in user
+        JobQueue.run_worker(worker_id='test', once=True)
+    response = client.get('/employee/download_certificate')
+    assert response.status_code == 200
+    assert response.data.startswith(b'%PDF')
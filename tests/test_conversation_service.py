@@ -0,0 +1,42 @@
+from models import db, Message, User
+from services.conversation_service import ConversationService, _cache
+
+
+def make_peer():
+    peer = User(email='peer@example.com', rol='Empleado', nombre='Peer')
+    peer.set_password('secreto')
+    db.session.add(peer)
+    db.session.commit()
+    return peer
+
+
+def test_list_is_served_from_cache_until_the_version_changes(app, employee):
+    peer = make_peer()
+    db.session.add(Message(sender_id=peer.id, recipient_id=employee.id, content='uno'))
+    db.session.commit()
+    _cache.clear()
+
+    first = ConversationService.list_for_user(employee.id)
+    assert first['conversations'][0]['last_message']['snippet'] == 'uno'
+
+    db.session.add(Message(sender_id=peer.id, recipient_id=employee.id, content='dos'))
+    db.session.commit()
+    assert ConversationService.list_for_user(employee.id) is first
+
+    # Another worker bumps the version: this process must not keep serving its copy
+    ConversationService.invalidate([employee.id])
+    db.session.commit()
+    _cache.setdefault(employee.id, {})[(1, 20)] = (first, 0, float('inf'))
+
+    fresh = ConversationService.list_for_user(employee.id)
+    assert fresh['conversations'][0]['last_message']['snippet'] == 'dos'
+    assert ConversationService.version(employee.id) == 1
+
+
+def test_invalidate_rolls_back_with_the_change(app, employee):
+    ConversationService.invalidate([employee.id, employee.id])
+    db.session.commit()
+    ConversationService.invalidate([employee.id])
+    db.session.rollback()
+
+    assert ConversationService.version(employee.id) == 1
@@ -0,0 +1,80 @@
+import os
+from datetime import timedelta
+
+from models import db, Job, PayrollDoc, User
+from services.job_queue import JobQueue
+from services.payroll_service import PayrollService
+
+FINANCIAL_DATA = PayrollService.build_financial_data(
+    salario_base=2000000.0, auxilio_transporte=162000.0, bonificaciones=0.0,
+    dias_injustificados=0, otros_descuentos=0.0
+)
+
+
+def test_worker_renders_payroll_outside_a_request(app, employee):
+    user_id = employee.id
+    job_id = PayrollService.enqueue_payroll(user_id, 'Enero', 2026, 'Q1', FINANCIAL_DATA).id
+
+    JobQueue.run_worker(worker_id='test', once=True)
+
+    job = db.session.get(Job, job_id)
+    assert job.status == 'done', job.error
+    doc = PayrollDoc.query.filter_by(user_id=user_id).one()
+    assert os.path.exists(os.path.join(app.config['UPLOAD_FOLDER'], 'payrolls', doc.filename))
+
+
+def test_report_keeps_a_long_job_from_going_stale(app):
+    job = JobQueue.enqueue('noop', {})
+    job = JobQueue.claim('test')
+    job.locked_at = JobQueue._now() - timedelta(hours=1)
+    db.session.commit()
+
+    JobQueue.report(job, done=1, total=10)
+
+    assert JobQueue.requeue_stale(60) == 0
+    assert db.session.get(Job, job.id).status == 'running'
+
+
+def test_requeue_stale_fails_jobs_out_of_attempts(app):
+    retry = JobQueue.enqueue('noop', {}, max_attempts=2)
+    exhausted = JobQueue.enqueue('noop', {}, max_attempts=1)
+    for _ in range(2):
+        JobQueue.claim('dead-worker')
+    Job.query.update({Job.locked_at: JobQueue._now() - timedelta(hours=1)})
+    db.session.commit()
+
+    assert JobQueue.requeue_stale(60) == 2
+
+    assert db.session.get(Job, retry.id).status == 'queued'
+    exhausted = db.session.get(Job, exhausted.id)
+    assert exhausted.status == 'failed'
+    assert exhausted.error
+
+
+def test_payroll_retry_does_not_duplicate_a_committed_doc(app, employee):
+    user_id = employee.id
+    job_id = PayrollService.enqueue_payroll(user_id, 'Enero', 2026, 'Q1', FINANCIAL_DATA).id
+    # First attempt committed the doc and the worker died before complete(): the job is back in the queue
+    assert PayrollService.create_payroll_record(user_id, 'Enero', 2026, 'Q1', FINANCIAL_DATA)
+
+    JobQueue.run_worker(worker_id='test', once=True)
+
+    assert db.session.get(Job, job_id).status == 'done'
+    assert PayrollDoc.query.filter_by(user_id=user_id).count() == 1
+
+
+def test_create_payroll_refuses_a_second_payroll_for_the_period(app, employee):
+    admin = User(email='admin@example.com', rol='Admin', nombre='Admin')
+    admin.set_password('secreto')
+    db.session.add(admin)
+    db.session.commit()
+    assert PayrollService.create_payroll_record(employee.id, 'Enero', 2026, 'Primera Quincena', FINANCIAL_DATA)
+
+    client = app.test_client()
+    client.post('/auth/login', data={'email': 'admin@example.com', 'password': 'secreto'})
+    response = client.post('/admin/create_payroll', data={
+        'user_id': employee.id, 'mes': 'Enero', 'anio': 2026, 'periodo': 'Primera Quincena', 'salario_base': 2000000
+    })
+
+    assert response.status_code == 200
+    assert Job.query.count() == 0
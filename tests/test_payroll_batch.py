@@ -0,0 +1,50 @@
+from sqlalchemy import create_engine, text
+
+from models import db, PayrollDoc, User
+from services import payroll_service
+from services.payroll_service import PayrollService
+
+FINANCIAL_DATA = PayrollService.build_financial_data(
+    salario_base=2000000.0, auxilio_transporte=162000.0, bonificaciones=0.0,
+    dias_injustificados=0, otros_descuentos=0.0
+)
+PERIOD = ('Enero', 2026, 'Primera Quincena')
+
+
+def make_users(count):
+    users = [User(email=f'e{i}@example.com', rol='Empleado', nombre=f'Empleado {i}', cargo='Analista') for i in range(count)]
+    db.session.add_all(users)
+    db.session.commit()
+    return [user.id for user in users]
+
+
+def test_run_batch_rejects_employees_that_already_have_the_period(app):
+    first, second = make_users(2)
+    app.config['PAYROLL_RENDER_MODE'] = 'lazy'
+    PayrollService.run_batch(*PERIOD, [{'user_id': first, **FINANCIAL_DATA}])
+
+    result = PayrollService.run_batch(*PERIOD, [{'user_id': first, **FINANCIAL_DATA}, {'user_id': second, **FINANCIAL_DATA}])
+
+    assert result['ok'] == [second]
+    assert result['failed'] == [{'user_id': first, 'error': 'Ya existe una nómina de este empleado para el período'}]
+    assert PayrollDoc.query.filter_by(user_id=first).count() == 1
+
+
+def test_run_batch_reports_each_chunk_after_its_commit(app, monkeypatch):
+    monkeypatch.setattr(payroll_service, 'BATCH_COMMIT_EVERY', 2)
+    app.config['PAYROLL_RENDER_MODE'] = 'lazy'
+    user_ids = make_users(5)
+    # A separate connection only sees what was actually committed
+    engine = create_engine(app.config['SQLALCHEMY_DATABASE_URI'])
+    seen = []
+
+    def progress(user_id, ok, error, done, total):
+        with engine.connect() as conn:
+            committed = conn.execute(text('SELECT COUNT(*) FROM payroll_doc')).scalar()
+        seen.append((done, committed))
+
+    result = PayrollService.run_batch(*PERIOD, [{'user_id': uid, **FINANCIAL_DATA} for uid in user_ids], progress=progress)
+
+    engine.dispose()
+    assert sorted(result['ok']) == sorted(user_ids)
+    assert seen == [(1, 2), (2, 2), (3, 4), (4, 4), (5, 5)]
@@ -0,0 +1,71 @@
+import io
+import os
+import time
+import zipfile
+from unittest import mock
+
+from models import db, PayrollDoc
+from services import payroll_service
+from services.payroll_service import PayrollService, evict_lru
+
+FINANCIAL_DATA = PayrollService.build_financial_data(
+    salario_base=2000000.0, auxilio_transporte=162000.0, bonificaciones=0.0,
+    dias_injustificados=0, otros_descuentos=0.0
+)
+
+
+def make_doc(user, mes='Enero', periodo='Primera Quincena'):
+    doc = PayrollDoc(user_id=user.id, mes=mes, anio=2026, periodo=periodo, filename=None, **FINANCIAL_DATA,
+                     neto_pagar=PayrollService.build_context(user, mes, 2026, periodo, FINANCIAL_DATA)['neto_pagar'])
+    db.session.add(doc)
+    db.session.commit()
+    return doc
+
+
+def test_pdf_path_renders_off_the_hub_and_keys_on_user_fields(app, employee):
+    doc = make_doc(employee)
+
+    with mock.patch.object(payroll_service.tpool, 'execute', wraps=payroll_service.tpool.execute) as execute:
+        first = PayrollService.pdf_path(doc)
+    assert execute.call_args.args[0] is payroll_service.render_pdf_file
+    assert PayrollService.pdf_path(doc) == first
+
+    employee.nombre = 'Ana María Pérez'
+    db.session.commit()
+    renamed = PayrollService.pdf_path(doc)
+    assert renamed != first
+    assert os.path.exists(renamed)
+    assert not renamed.startswith(app.config['UPLOAD_FOLDER'])
+
+
+def test_statement_follows_user_changes(app, employee):
+    make_doc(employee, periodo='Primera Quincena')
+    make_doc(employee, periodo='Segunda Quincena')
+
+    path = PayrollService.statement(employee.id, 2026)
+    assert os.path.exists(path)
+
+    employee.cargo = 'Coordinadora'
+    db.session.commit()
+    assert PayrollService.statement(employee.id, 2026) != path
+
+
+def test_evict_lru_spares_recently_used_files(tmp_path):
+    old, fresh = tmp_path / 'old.pdf', tmp_path / 'fresh.pdf'
+    old.write_bytes(b'x' * 100)
+    fresh.write_bytes(b'x' * 100)
+    an_hour_ago = time.time() - 3600
+    os.utime(old, (an_hour_ago, an_hour_ago))
+
+    assert evict_lru(str(tmp_path), 0) == 1
+    assert not old.exists()
+    assert fresh.exists()
+
+
+def test_bundle_renders_missing_pdfs(app, employee):
+    make_doc(employee)
+    data = b''.join(PayrollService.iter_bundle('Enero', 2026, 'Primera Quincena'))
+
+    with zipfile.ZipFile(io.BytesIO(data)) as zf:
+        (name,) = zf.namelist()
+        assert zf.read(name).startswith(b'%PDF')
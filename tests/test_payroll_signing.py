@@ -0,0 +1,135 @@
+import os
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from cryptography import x509
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from cryptography.x509.oid import NameOID
+from pyhanko.keys import load_cert_from_pemder
+from pyhanko.pdf_utils.reader import PdfFileReader
+from pyhanko.sign.validation import validate_pdf_signature
+from pyhanko_certvalidator import ValidationContext
+
+from models import db, PayrollDoc, StoredFile
+from services import payroll_service
+from services.blob_store import file_sha256
+from services.payroll_service import PayrollService, SIGNATURE_FIELD
+
+FINANCIAL_DATA = PayrollService.build_financial_data(
+    salario_base=2000000.0, auxilio_transporte=162000.0, bonificaciones=0.0,
+    dias_injustificados=0, otros_descuentos=0.0
+)
+PERIOD = ('Enero', 2026, 'Primera Quincena')
+
+
+@pytest.fixture
+def signing_cert(app, tmp_path):
+    """Llave y certificado autofirmado para PAYROLL_SIGNING_KEY / PAYROLL_SIGNING_CERT."""
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, 'Nómina Pruebas')])
+    now = datetime.now(timezone.utc)
+    cert = (
+        x509.CertificateBuilder()
+        .subject_name(name).issuer_name(name)
+        .public_key(key.public_key())
+        .serial_number(x509.random_serial_number())
+        .not_valid_before(now - timedelta(days=1)).not_valid_after(now + timedelta(days=30))
+        .add_extension(x509.BasicConstraints(ca=True, path_length=None), critical=True)
+        .add_extension(x509.KeyUsage(
+            digital_signature=True, content_commitment=True, key_encipherment=False, data_encipherment=False,
+            key_agreement=False, key_cert_sign=True, crl_sign=False, encipher_only=False, decipher_only=False
+        ), critical=True)
+        .sign(key, hashes.SHA256())
+    )
+    key_path, cert_path = tmp_path / 'signing.key', tmp_path / 'signing.crt'
+    key_path.write_bytes(key.private_bytes(
+        serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption()
+    ))
+    cert_path.write_bytes(cert.public_bytes(serialization.Encoding.PEM))
+    app.config.update(PAYROLL_SIGNING_KEY=str(key_path), PAYROLL_SIGNING_CERT=str(cert_path))
+    return str(cert_path)
+
+
+def payroll_file(doc):
+    return os.path.join(PayrollService.payroll_dir(), doc.filename)
+
+
+def assert_valid_signature(path, cert_path):
+    with open(path, 'rb') as f:
+        (signature,) = PdfFileReader(f).embedded_signatures
+        assert signature.field_name == SIGNATURE_FIELD
+        status = validate_pdf_signature(
+            signature, ValidationContext(trust_roots=[load_cert_from_pemder(cert_path)])
+        )
+    assert status.intact and status.valid
+
+
+@pytest.fixture
+def doc(app, employee):
+    assert PayrollService.create_payroll_record(employee.id, *PERIOD, FINANCIAL_DATA)
+    return PayrollDoc.query.one()
+
+
+def test_sign_period_signs_into_a_new_file(app, signing_cert, doc):
+    original = payroll_file(doc)
+
+    result = PayrollService.sign_period(*PERIOD, max_workers=1)
+
+    assert result['failed'] == []
+    doc = db.session.get(PayrollDoc, doc.id)
+    assert doc.filename.endswith('_firmada.pdf')
+    assert doc.signature_digest == file_sha256(payroll_file(doc))
+    assert_valid_signature(payroll_file(doc), signing_cert)
+    assert not os.path.exists(original)
+    assert StoredFile.query.filter_by(kind='payroll').one().filename == doc.filename
+
+    # Nothing left to sign: a second run is a no-op
+    assert PayrollService.sign_period(*PERIOD, max_workers=1)['total'] == 0
+
+
+def test_sign_period_retries_after_a_failed_commit(app, signing_cert, doc):
+    original_name = doc.filename
+    commit = db.session.commit
+    failed = []
+
+    def flaky_commit():
+        # The commit that would record the signature fails once, after the PDF was already signed
+        if not failed and any(isinstance(obj, PayrollDoc) and obj.signature_digest for obj in db.session.dirty):
+            failed.append(True)
+            raise RuntimeError('db down')
+        commit()
+
+    db.session.commit = flaky_commit
+    try:
+        result = PayrollService.sign_period(*PERIOD, max_workers=1)
+    finally:
+        del db.session.commit
+    assert result['ok'] == [] and len(result['failed']) == 1
+
+    doc = db.session.get(PayrollDoc, doc.id)
+    assert doc.filename == original_name and doc.signature_digest is None
+    assert os.path.exists(payroll_file(doc))
+
+    result = PayrollService.sign_period(*PERIOD, max_workers=1)
+
+    assert result['failed'] == []
+    doc = db.session.get(PayrollDoc, doc.id)
+    assert doc.signature_digest == file_sha256(payroll_file(doc))
+    assert_valid_signature(payroll_file(doc), signing_cert)
+
+
+def test_sign_period_records_a_file_already_signed_in_place(app, signing_cert, doc):
+    # A run that signed the file in place and died before committing leaves FirmaNomina filled
+    path = payroll_file(doc)
+    payroll_service._init_signer(PayrollService.signing_material())
+    signed_path, _ = payroll_service.sign_pdf_file(path, path + '.tmp.pdf')
+    os.replace(signed_path, path)
+
+    result = PayrollService.sign_period(*PERIOD, max_workers=1)
+
+    assert result['failed'] == []
+    doc = db.session.get(PayrollDoc, doc.id)
+    assert payroll_file(doc) == path
+    assert doc.signature_digest == file_sha256(path)
+    assert_valid_signature(path, signing_cert)
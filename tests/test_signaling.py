@@ -0,0 +1,30 @@
+from services.signaling import SignalingTelemetry
+
+
+def test_rooms_and_pending_joins_are_bounded():
+    telemetry = SignalingTelemetry(size=10, max_rooms=3)
+    for i in range(100):
+        telemetry.record(f'room-{i}', 'join', sid=f'sid-{i}')
+        telemetry.record(f'room-{i}', 'offer', sid=f'sid-{i}')
+
+    assert list(telemetry.snapshot()['rooms']) == ['room-97', 'room-98', 'room-99']
+    assert len(telemetry._joined_at) <= 3 * 8
+
+
+def test_recently_used_room_survives_eviction():
+    telemetry = SignalingTelemetry(max_rooms=2)
+    telemetry.record('a', 'join', sid='s1')
+    telemetry.record('b', 'join', sid='s2')
+    telemetry.record('a', 'connected', sid='s1')
+    telemetry.record('c', 'join', sid='s3')
+
+    rooms = telemetry.snapshot()['rooms']
+    assert set(rooms) == {'a', 'c'}
+    assert rooms['a']['connected'] == 1
+
+
+def test_ignores_non_string_room_ids():
+    telemetry = SignalingTelemetry()
+    telemetry.record(['not', 'hashable'], 'join', sid='s1')
+    telemetry.record(None, 'connected', sid='s1')
+    assert telemetry.snapshot() == {'rooms': {}, 'events': []}
@@ -0,0 +1,38 @@
+from datetime import datetime
+
+import pandas as pd
+
+from services.time_debt_service import TimeDebtService
+
+
+def logs(*rows):
+    return pd.DataFrame(
+        [(user_id, status, pd.Timestamp(ts)) for user_id, status, ts in rows],
+        columns=['user_id', 'new_status', 'timestamp']
+    )
+
+
+def test_late_start_is_measured_from_each_days_first_activo():
+    df = logs(
+        (1, 'Activo', '2026-03-02 09:00'),   # 30 min late
+        (1, 'Inactivo', '2026-03-02 17:00'),
+        (1, 'Activo', '2026-03-03 08:00'),   # on time
+        (1, 'En Break', '2026-03-03 10:00'),
+        (1, 'Activo', '2026-03-03 10:10'),   # a later 'Activo' the same day does not count as arrival
+        (1, 'Inactivo', '2026-03-03 16:30'),
+    )
+
+    debts = TimeDebtService.compute_debt_seconds(df, now=datetime(2026, 3, 4, 12, 0))
+
+    assert debts[1] == 30 * 60
+
+
+def test_day_without_activo_has_no_late_start():
+    df = logs(
+        (1, 'En Almuerzo', '2026-03-02 12:00'),
+        (1, 'Inactivo', '2026-03-02 16:30'),
+    )
+
+    daily = TimeDebtService.daily_rollup(df, now=datetime(2026, 3, 4, 12, 0))
+
+    assert daily['late_s'].tolist() == [0.0]
@@ -0,0 +1,45 @@
+from models import db, Message, UnreadCounter, User
+from services.unread_counter_service import UnreadCounterService
+
+
+def make_admin():
+    admin = User(email='admin@example.com', rol='Admin', nombre='Admin')
+    admin.set_password('secreto')
+    db.session.add(admin)
+    db.session.commit()
+    return admin
+
+
+def test_get_without_a_row_computes_and_does_not_write(app, employee):
+    sender = make_admin()
+    db.session.add(Message(sender_id=sender.id, recipient_id=employee.id, content='hola'))
+    db.session.commit()
+
+    assert UnreadCounterService.get(employee.id) == 1
+    assert db.session.get(UnreadCounter, employee.id) is None
+    assert not db.session.new and not db.session.dirty
+
+
+def test_increment_is_visible_immediately(app, employee):
+    sender = make_admin()
+    UnreadCounterService.rebuild_user(employee.id)
+    db.session.commit()
+    assert UnreadCounterService.get(employee.id) == 0
+
+    db.session.add(Message(sender_id=sender.id, recipient_id=employee.id, content='hola'))
+    UnreadCounterService.increment([employee.id])
+    db.session.commit()
+
+    assert UnreadCounterService.get(employee.id) == 1
+
+
+def test_create_user_seeds_the_counter(app):
+    make_admin()
+    client = app.test_client()
+    client.post('/auth/login', data={'email': 'admin@example.com', 'password': 'secreto'})
+    client.post('/admin/create_user', data={
+        'email': 'nuevo@example.com', 'nombre': 'Nuevo', 'password': 'x', 'cargo': 'Analista'
+    })
+
+    user = User.query.filter_by(email='nuevo@example.com').one()
+    assert db.session.get(UnreadCounter, user.id).count == 0
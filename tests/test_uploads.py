@@ -0,0 +1,66 @@
+import hashlib
+
+import pytest
+
+from models import db, UploadSession
+
+
+@pytest.fixture
+def client(app, employee):
+    client = app.test_client()
+    client.post('/auth/login', data={'email': 'empleado@example.com', 'password': 'secreto'})
+    return client
+
+
+@pytest.mark.parametrize('size', ['abc', 1.5, None, True, [10], 0, -5])
+def test_create_session_rejects_invalid_sizes(client, size):
+    response = client.post('/uploads/sessions', json={'purpose': 'chat', 'filename': 'a.txt', 'size': size})
+    assert response.status_code == 400
+    assert 'error' in response.get_json()
+
+
+def test_create_session_rejects_bad_checksum(client):
+    response = client.post('/uploads/sessions', json={'purpose': 'chat', 'filename': 'a.txt', 'size': 3, 'sha256': 12})
+    assert response.status_code == 400
+
+
+def test_chunked_upload_round_trip(client):
+    data = b'hola mundo' * 1000
+    sha256 = hashlib.sha256(data).hexdigest()
+    created = client.post('/uploads/sessions', json={
+        'purpose': 'chat', 'filename': 'a.txt', 'size': str(len(data)), 'sha256': sha256
+    })
+    assert created.status_code == 201
+    upload_id = created.get_json()['upload_id']
+
+    put = client.put(f'/uploads/sessions/{upload_id}?offset=0', data=data,
+                     headers={'Content-Type': 'application/octet-stream'})
+    assert put.get_json()['offset'] == len(data)
+
+    completed = client.post(f'/uploads/sessions/{upload_id}/complete')
+    assert completed.status_code == 200
+    assert completed.get_json()['sha256'] == sha256
+
+
+def completed_upload(client, data=b'adjunto'):
+    created = client.post('/uploads/sessions', json={'purpose': 'chat', 'filename': 'a.txt', 'size': len(data)})
+    upload_id = created.get_json()['upload_id']
+    client.put(f'/uploads/sessions/{upload_id}?offset=0', data=data,
+               headers={'Content-Type': 'application/octet-stream'})
+    client.post(f'/uploads/sessions/{upload_id}/complete')
+    return upload_id
+
+
+@pytest.mark.parametrize('form, status', [
+    ({'recipient_id': 'abc'}, 400),
+    ({'group_id': 'x1'}, 400),
+    ({'recipient_id': '9999'}, 404),
+    ({'group_id': '9999'}, 403),
+])
+def test_rejected_send_leaves_the_upload_unclaimed(app, client, form, status):
+    upload_id = completed_upload(client)
+    response = client.post('/chat/send_message', data=dict(form, upload_id=upload_id))
+    assert response.status_code == status
+
+    with app.app_context():
+        assert db.session.get(UploadSession, upload_id) is not None